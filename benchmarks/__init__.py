@@ -0,0 +1,8 @@
+"""Benchmarks for stepik_tours services. Run them as modules, for example: python -m benchmarks.columnar"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stepik_tours.settings')
+django.setup()
@@ -0,0 +1,125 @@
+"""
+Benchmark of inverted indexes with bitmap postings against indexes with sets of tour id:
+bytes per posting entry and throughput of AND, OR and NOT of postings.
+
+    python -m benchmarks.bitmap --count 1000000
+"""
+
+__author__ = 'Artikov A.K.'
+
+import argparse
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from tours.services.bitmap import Bitmap, BitmapIndex
+from .catalog import generate_tours, build_tours, measure
+
+INDEXED_ATTRIBUTES = ('departure', 'nights', 'country', 'stars')
+# Postings of query: attribute name -> values, values of one attribute are united
+QUERIES = (
+    ('AND', {'departure': ['msk'], 'stars': ['5']}),
+    ('AND', {'departure': ['msk'], 'country': ['Куба'], 'stars': ['5']}),
+    ('AND', {'departure': ['kazan'], 'country': ['Пакистан'], 'nights': [7]}),
+    ('OR', {'departure': ['spb', 'nsk', 'ekb']}),
+    ('NOT', {'departure': ['msk']}),
+)
+
+
+def build_set_indexes(tours) -> Dict[str, Dict]:
+    indexes = {attr_name: defaultdict(set) for attr_name in INDEXED_ATTRIBUTES}
+    for tour in tours:
+        for attr_name, index in indexes.items():
+            index[getattr(tour, attr_name)].add(tour.id)
+    return indexes
+
+
+def build_bitmap_indexes(tours, keys: List[int]) -> Dict[str, BitmapIndex]:
+    indexes = {attr_name: BitmapIndex(keys) for attr_name in INDEXED_ATTRIBUTES}
+    for attr_name, index in indexes.items():
+        rows = defaultdict(list)
+        for row, tour in enumerate(tours):
+            rows[getattr(tour, attr_name)].append(row)
+        for value, value_rows in rows.items():
+            index.add(value, Bitmap.construct_from_rows(value_rows))
+    return indexes
+
+
+def get_set_bytes(indexes: Dict[str, Dict]) -> Tuple[int, int]:
+    """Bytes of sets and count of posting entries, int objects of id are shared with tours"""
+    postings = [posting for index in indexes.values() for posting in index.values()]
+    return sum(sys.getsizeof(posting) for posting in postings), sum(len(posting) for posting in postings)
+
+
+def get_bitmap_bytes(indexes: Dict[str, BitmapIndex]) -> int:
+    """Bytes of int objects, which keep bits of postings"""
+    return sum(
+        sys.getsizeof(index.get_bitmap(value).bits) for index in indexes.values() for value in index
+    )
+
+
+def evaluate_sets(indexes, keys: List[int], operation: str, query: dict) -> set:
+    postings = [set().union(*(indexes[attr_name][value] for value in values)) for attr_name, values in query.items()]
+    if operation == 'NOT':
+        return set(keys).difference(postings[0])
+    if operation == 'OR':
+        return postings[0]
+    postings.sort(key=len)
+    result = set(postings[0])
+    for posting in postings[1:]:
+        result.intersection_update(posting)
+    return result
+
+
+def evaluate_bitmaps(indexes, keys: List[int], operation: str, query: dict) -> Bitmap:
+    postings = []
+    for attr_name, values in query.items():
+        posting = Bitmap()
+        for value in values:
+            posting |= indexes[attr_name].get_bitmap(value)
+        postings.append(posting)
+    if operation == 'NOT':
+        return postings[0].complement(len(keys))
+    if operation == 'OR':
+        return postings[0]
+    result = postings[0]
+    for posting in postings[1:]:
+        result &= posting
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=1_000_000, help='count of tours')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tours = build_tours(generate_tours(args.count))
+    keys = [tour.id for tour in tours]
+    set_indexes = build_set_indexes(tours)
+    bitmap_indexes = build_bitmap_indexes(tours, keys)
+
+    set_bytes, entries = get_set_bytes(set_indexes)
+    bitmap_bytes = get_bitmap_bytes(bitmap_indexes)
+    print(f'{args.count} tours, {entries} posting entries')
+    print(f'sets    {set_bytes / 2 ** 20:8.1f} MB  {set_bytes / entries:6.2f} bytes per entry')
+    print(f'bitmaps {bitmap_bytes / 2 ** 20:8.1f} MB  {bitmap_bytes / entries:6.2f} bytes per entry')
+
+    for operation, query in QUERIES:
+        expected = evaluate_sets(set_indexes, keys, operation, query)
+        if {keys[row] for row in evaluate_bitmaps(bitmap_indexes, keys, operation, query)} != expected:
+            raise SystemExit(f'Results for {operation} {query} are different')
+        set_time = measure(lambda: evaluate_sets(set_indexes, keys, operation, query), args.repeat)
+        bitmap_time = measure(lambda: evaluate_bitmaps(bitmap_indexes, keys, operation, query), args.repeat)
+        rows_time = measure(
+            lambda: evaluate_bitmaps(bitmap_indexes, keys, operation, query).get_rows(), args.repeat
+        )
+        print(
+            f'{operation:<4}{str(query):<70} {len(expected):>8} rows  sets {set_time * 1000:8.2f} ms  '
+            f'bitmaps {bitmap_time * 1000:7.3f} ms (x{set_time / bitmap_time:.0f})  '
+            f'with rows {rows_time * 1000:7.2f} ms'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark of rendering of departure page with 1000 tour cards: cards rendered by card template for every tour
+(with and without cached template loader) against cards, which are joined from cache of cards.
+
+    python -m benchmarks.cards --cards 1000
+"""
+
+__author__ = 'Artikov A.K.'
+
+import argparse
+
+from django.conf import settings
+from django.template import Context, Engine
+from django.template.loader import get_template
+from django.test import RequestFactory
+
+from tours.cards import CardCache
+from tours.views import render_cards_page
+from .catalog import generate_tours, build_tours, measure
+
+PAGE_CONTEXT = dict(
+    navigation='',
+    city_departure='Из Москвы',
+    count_tours=1000,
+    min_max_attributes={},
+    sort_links=[],
+    page_number=1,
+    num_pages=1,
+    previous_url=None,
+    next_url=None,
+)
+
+
+def render_page(request, tours, get_cards_html) -> str:
+    """
+    The function renders page of departure, page without cards is rendered by template of settings.
+    :param request: request
+    :param tours: tours for cards
+    :param get_cards_html: function, which returns HTML of cards
+    :return:
+    """
+    page = get_template('tours/departure.html').render(dict(PAGE_CONTEXT, cards='<!-- CARDS -->'), request)
+    head, tail = page.split('<!-- CARDS -->', 1)
+    return head + get_cards_html(tours) + tail
+
+
+def get_uncached_engine() -> Engine:
+    """Engine with loaders, which read and compile template on every lookup"""
+    return Engine(
+        dirs=[str(settings.BASE_DIR / 'templates')],
+        loaders=['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader'],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cards', type=int, default=1000, help='count of cards on page')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    tours = build_tours(generate_tours(args.cards))
+    request = RequestFactory().get('/departure/msk')
+    uncached_engine = get_uncached_engine()
+    card_cache = CardCache(max_size=64 * 1024 * 1024, max_entries=args.cards)
+
+    def render_uncached(page_tours):
+        # Card template is found and compiled for every card as by include without cached loader
+        return ''.join(
+            uncached_engine.get_template('tours/card.html').render(Context({'tour': tour})) for tour in page_tours
+        )
+
+    def render_cached_loader(page_tours):
+        card_template = get_template('tours/card.html')
+        return ''.join(card_template.render({'tour': tour}) for tour in page_tours)
+
+    def render_cold_cache(page_tours):
+        return CardCache(max_size=64 * 1024 * 1024, max_entries=args.cards).get_cards(page_tours)
+
+    expected = render_page(request, tours, render_cached_loader)
+    card_cache.get_cards(tours)
+    if render_page(request, tours, card_cache.get_cards) != expected:
+        raise SystemExit('Pages with cached cards are different')
+    print(f'departure page with {args.cards} cards')
+    results = (
+        ('card template, uncached loader', measure(lambda: render_page(request, tours, render_uncached), args.repeat)),
+        ('card template, cached loader', measure(lambda: render_page(request, tours, render_cached_loader),
+                                                 args.repeat)),
+        ('card cache, first request', measure(lambda: render_page(request, tours, render_cold_cache), args.repeat)),
+        ('card cache', measure(lambda: render_page(request, tours, card_cache.get_cards), args.repeat)),
+        ('card cache, streamed view', measure(
+            lambda: ''.join(render_cards_page(request, 'tours/departure.html', PAGE_CONTEXT, tours)), args.repeat
+        )),
+    )
+    baseline = results[1][1]
+    for name, seconds in results:
+        print(f'{name:<32} {seconds * 1000:9.2f} ms  x{baseline / seconds:.1f}')
+
+
+if __name__ == '__main__':
+    main()
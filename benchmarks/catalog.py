@@ -0,0 +1,89 @@
+"""This module allows generating synthetic catalog, which has the same shape as data.py"""
+
+__author__ = 'Artikov A.K.'
+
+import random
+import time
+from typing import Dict, Callable, List
+
+from tours.data_models import Tour
+
+DEPARTURES = {
+    'msk': 'Из Москвы', 'spb': 'Из Петербурга', 'nsk': 'Из Новосибирска', 'ekb': 'Из Екатеринбурга',
+    'kazan': 'Из Казани',
+}
+# Departures are skewed: most tours start from the biggest cities
+DEPARTURE_WEIGHTS = (50, 25, 10, 10, 5)
+COUNTRIES = ('Куба', 'Вьетнам', 'Индия', 'Тайланд', 'Доминикана', 'Мексика', 'Пакистан')
+COUNTRY_WEIGHTS = (30, 20, 15, 15, 10, 5, 5)
+MONTHS = (
+    'января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+    'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря',
+)
+WORDS = (
+    'отель', 'выглядит', 'уютно', 'построен', 'из', 'красного', 'соснового', 'дерева', 'украшен', 'синими',
+    'камнями', 'высокие', 'округлые', 'окна', 'добавляют', 'общий', 'стиль', 'дома', 'берег', 'море', 'пляж',
+)
+
+
+def generate_departures() -> Dict[str, str]:
+    """
+    The function returns departures in format of data.departures
+    :return:
+    """
+    return dict(DEPARTURES)
+
+
+def generate_tours(count: int, seed: int = 0) -> Dict[int, dict]:
+    """
+    The function returns synthetic tours in format of data.tours
+    :param count: count of tours
+    :param seed: seed for random generator
+    :return:
+    """
+    generator = random.Random(seed)
+    departures = generator.choices(list(DEPARTURES), weights=DEPARTURE_WEIGHTS, k=count)
+    countries = generator.choices(COUNTRIES, weights=COUNTRY_WEIGHTS, k=count)
+    tours = dict()
+    for tour_id in range(1, count + 1):
+        tours[tour_id] = {
+            'title': f'Hotel {tour_id}',
+            'description': ' '.join(generator.choices(WORDS, k=20)),
+            'departure': departures[tour_id - 1],
+            'picture': f'https://images.example.com/{tour_id}.jpg',
+            'price': generator.randrange(20000, 150000, 1000),
+            'stars': str(generator.randint(1, 5)),
+            'country': countries[tour_id - 1],
+            'nights': generator.randint(3, 14),
+            'date': f'{generator.randint(1, 28)} {generator.choice(MONTHS)}',
+        }
+    return tours
+
+
+def build_tours(dict_tours: Dict[int, dict]) -> List[Tour]:
+    """
+    The function returns tour objects for tours in format of data.tours
+    :param dict_tours: tours
+    :return:
+    """
+    return [
+        Tour(id=tour_id, **tour) for tour_id, tour in dict_tours.items()
+    ]
+
+
+def measure(func: Callable, repeat: int = 5, number: int = 1) -> float:
+    """
+    The function returns the best time of function execution in seconds.
+    :param func: function without arguments
+    :param repeat: count of measurements
+    :param number: count of executions in one measurement, time of fast function is averaged over executions
+    :return:
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        duration = (time.perf_counter() - start) / number
+        best = duration if best is None else min(best, duration)
+    return best
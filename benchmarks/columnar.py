@@ -0,0 +1,63 @@
+"""
+Benchmark of columnar tours storage against specification scan over tour objects.
+
+    python -m benchmarks.columnar --count 1000000
+"""
+
+__author__ = 'Artikov A.K.'
+
+import argparse
+
+from tours.services.columnar import ColumnarTourStore, is_columnar_available
+from tours.services.specification import SpecificationFilter, SpecificationFactory
+from tours.services.tour_services import AttrMinMax
+from .catalog import generate_tours, build_tours, measure
+
+FILTERS = (
+    {'departure': 'msk'},
+    {'departure': ['spb', 'kazan'], 'nights': [6, 7, 8]},
+    {'price__between': [50000, 90000], 'stars': '5'},
+)
+
+
+def scan(tours, data_filter: dict):
+    """Filter and min/max by SpecificationFilter over tour objects"""
+    result = list(SpecificationFilter.filter(tours, SpecificationFactory.constract_from_filter(data_filter)))
+    min_max = {'price': AttrMinMax(), 'nights': AttrMinMax()}
+    for tour in result:
+        for attr_name, attr_min_max in min_max.items():
+            attr_min_max.try_set_min(getattr(tour, attr_name))
+            attr_min_max.try_set_max(getattr(tour, attr_name))
+    return result, min_max
+
+
+def columnar(store: ColumnarTourStore, data_filter: dict):
+    """Filter and min/max by columnar storage"""
+    mask = store.get_mask(SpecificationFactory.constract_from_filter(data_filter))
+    return store.get_tours(mask), store.get_min_max(mask, 'price', 'nights')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=1_000_000, help='count of tours')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if not is_columnar_available():
+        raise SystemExit('numpy is not installed')
+
+    tours = build_tours(generate_tours(args.count))
+    store = ColumnarTourStore(tours)
+
+    print(f'{args.count} tours')
+    for data_filter in FILTERS:
+        scan_time = measure(lambda: scan(tours, data_filter), args.repeat)
+        columnar_time = measure(lambda: columnar(store, data_filter), args.repeat)
+        print(
+            f'{str(data_filter):<60} scan {scan_time * 1000:9.1f} ms  columnar {columnar_time * 1000:9.1f} ms  '
+            f'speedup x{scan_time / columnar_time:.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark of catalog loading: per record dacite construction against bulk construction.
+
+    python -m benchmarks.loading --count 100000
+"""
+
+__author__ = 'Artikov A.K.'
+
+import argparse
+
+from tours.data_models import Tour, Departure
+from tours.services.tour_services import TourController
+from .catalog import generate_tours, generate_departures, measure
+
+
+def construct_by_dacite(dict_tours: dict) -> dict:
+    """Construction of tours as it was before bulk loader: merged dict and dacite for every record"""
+    return {
+        data_id: Tour.construct_from_dict(dict_data={**{'id': data_id}, **current_data})
+        for data_id, current_data in dict_tours.items()
+    }
+
+
+def construct_departures_by_dacite(dict_departures: dict) -> dict:
+    """Construction of departures as it was before bulk loader"""
+    return {
+        data_id: Departure.construct_from_dict(dict_data={'id': data_id, 'city_departure': current_data})
+        for data_id, current_data in dict_departures.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=100_000, help='count of tours')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    dict_tours = generate_tours(args.count)
+    dict_departures = generate_departures()
+
+    dacite_time = measure(lambda: construct_by_dacite(dict_tours), args.repeat)
+    bulk_time = measure(lambda: Tour.construct_many(dict_tours.items()), args.repeat)
+    departures_dacite_time = measure(lambda: construct_departures_by_dacite(dict_departures), args.repeat)
+    departures_bulk_time = measure(lambda: Departure.construct_many(
+        (data_id, {'city_departure': current_data}) for data_id, current_data in dict_departures.items()
+    ), args.repeat)
+    controller_time = measure(lambda: TourController(dict_tours), args.repeat)
+
+    print(f'{args.count} tours')
+    print(f'tours dacite:        {dacite_time * 1000:9.1f} ms')
+    print(f'tours bulk:          {bulk_time * 1000:9.1f} ms  speedup x{dacite_time / bulk_time:.1f}')
+    print(f'departures dacite:   {departures_dacite_time * 1000:9.3f} ms')
+    print(f'departures bulk:     {departures_bulk_time * 1000:9.3f} ms')
+    print(f'TourController startup with indexes and aggregates: {controller_time * 1000:9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
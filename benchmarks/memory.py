@@ -0,0 +1,80 @@
+"""
+Benchmark of memory, which is used by tour objects: previous dataclass with __dict__ and stored star_range
+against slotted Tour with interned strings.
+
+    python -m benchmarks.memory --count 100000
+"""
+
+__author__ = 'Artikov A.K.'
+
+import argparse
+import gc
+import json
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable
+
+import dacite
+
+from tours.data_models import Tour
+from .catalog import generate_tours
+
+
+@dataclass
+class DictTour:
+    """Tour data model before slots: instance __dict__, stored star_range, not interned strings"""
+    id: int
+    title: str
+    description: str
+    departure: str
+    picture: str
+    price: float
+    stars: str
+    country: str
+    nights: int
+    date: str
+    star_range: range
+
+
+def construct_dict_tour(dict_data: dict) -> DictTour:
+    dict_data['star_range'] = range(int(dict_data.get('stars')))
+    return dacite.from_dict(DictTour, dict_data)
+
+
+def measure_memory(dict_tours: dict, construct: Callable) -> int:
+    """
+    The function returns bytes, which are allocated by tours construction.
+    Input records are decoded from JSON, so every record has own copies of strings, as after real parsing.
+    :param dict_tours: tours in format of data.tours
+    :param construct: model constructor from dict
+    :return:
+    """
+    dumped_tours = json.dumps(dict_tours)
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    records = json.loads(dumped_tours)
+    tours = [construct({'id': int(tour_id), **record}) for tour_id, record in records.items()]
+    del records
+    gc.collect()
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert tours
+    return end - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=100_000, help='count of tours')
+    args = parser.parse_args()
+
+    dict_tours = generate_tours(args.count)
+    before = measure_memory(dict_tours, construct_dict_tour)
+    after = measure_memory(dict_tours, Tour.construct_from_dict)
+    print(f'{args.count} tours')
+    print(f'dict dataclass: {before / args.count:8.1f} bytes per tour')
+    print(f'slotted Tour:   {after / args.count:8.1f} bytes per tour ({(1 - after / before) * 100:.1f}% less)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Load test of sync WSGI deployment (gunicorn sync workers) against async ASGI deployment (gunicorn with uvicorn
+workers): requests per second and latency percentiles for the same paths and concurrency.
+Servers are started for the test, or load is sent to running server by --url.
+
+    python -m benchmarks.serving --workers 4 --concurrency 64 --duration 10
+    python -m benchmarks.serving --url http://127.0.0.1:8000 --concurrency 64
+"""
+
+__author__ = 'Artikov A.K.'
+
+import argparse
+import asyncio
+import itertools
+import os
+import shlex
+import socket
+import subprocess
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+DEPLOYMENTS = (
+    ('wsgi', 'gunicorn stepik_tours.wsgi:application --workers {workers} --bind {host}:{port}'),
+    (
+        'asgi',
+        'gunicorn stepik_tours.asgi:application --workers {workers} --bind {host}:{port} '
+        '--worker-class uvicorn.workers.UvicornWorker'
+    ),
+)
+PATHS = (
+    '/',
+    '/departure/msk',
+    '/departure/spb?sort=-price',
+    '/tour/3',
+    '/api/tours?departure=msk&sort=price&limit=20',
+)
+
+
+class LoadResult:
+    """
+    Latencies of successful requests and count of failed requests.
+    """
+    def __init__(self, duration: float):
+        self.duration = duration
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    @property
+    def requests_per_second(self) -> float:
+        return len(self.latencies) / self.duration
+
+    def get_percentile(self, percentile: float) -> float:
+        """
+        The method return latency percentile in seconds.
+        :param percentile: percentile from 0 to 100
+        :return:
+        """
+        if not self.latencies:
+            return float('nan')
+        latencies = sorted(self.latencies)
+        return latencies[min(int(len(latencies) * percentile / 100), len(latencies) - 1)]
+
+
+async def read_response(reader: asyncio.StreamReader) -> Tuple[int, bool]:
+    """
+    The function reads HTTP/1.1 response with body of fixed length, chunked body or body until close.
+    :param reader: stream of connection
+    :return: status code and flag, that connection can be reused
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection is closed by server')
+    status = int(status_line.split()[1])
+    headers = dict()
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    keep_alive = headers.get('connection') != 'close'
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    elif status not in (204, 304):
+        await reader.read()
+        keep_alive = False
+    return status, keep_alive
+
+
+async def run_client(host: str, port: int, paths, deadline: float, result: LoadResult) -> None:
+    """
+    The function sends requests one by one until deadline, connection is reused while server keeps it alive.
+    :param host: server host
+    :param port: server port
+    :param paths: cycle of request paths
+    :param deadline: time of the end of test by perf_counter
+    :param result: result of load test
+    :return:
+    """
+    reader: Optional[asyncio.StreamReader] = None
+    writer: Optional[asyncio.StreamWriter] = None
+    while time.perf_counter() < deadline:
+        path = next(paths)
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n'.encode('latin-1'))
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            result.errors += 1
+            status, keep_alive = None, False
+        if status == 200:
+            result.latencies.append(time.perf_counter() - start)
+        elif status is not None:
+            result.errors += 1
+        if not keep_alive and writer is not None:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(url: str, paths, concurrency: int, duration: float) -> LoadResult:
+    """
+    The function sends requests by concurrent clients during duration.
+    :param url: URL of server
+    :param paths: request paths, clients request them in turn
+    :param concurrency: count of concurrent clients
+    :param duration: duration of test in seconds
+    :return:
+    """
+    address = urlsplit(url)
+    result = LoadResult(duration)
+    deadline = time.perf_counter() + duration
+    # Clients start from different paths, so all paths are requested at the same time
+    await asyncio.gather(*(
+        run_client(address.hostname, address.port or 80, itertools.islice(itertools.cycle(paths), client, None),
+                   deadline, result)
+        for client in range(concurrency)
+    ))
+    return result
+
+
+def wait_server(url: str, timeout: float = 30.0) -> None:
+    """
+    The function waits, until server accepts connections.
+    :param url: URL of server
+    :param timeout: timeout in seconds
+    :return:
+    """
+    address = urlsplit(url)
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            socket.create_connection((address.hostname, address.port or 80), timeout=1.0).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f'Server {address.netloc} is not started')
+
+
+def print_result(name: str, result: LoadResult) -> None:
+    print(
+        f'{name:<6} {result.requests_per_second:9.1f} req/s  p50 {result.get_percentile(50) * 1000:8.1f} ms  '
+        f'p99 {result.get_percentile(99) * 1000:8.1f} ms  errors {result.errors}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='URL of running server, deployments are not started')
+    parser.add_argument('--workers', type=int, default=4, help='count of server workers')
+    parser.add_argument('--concurrency', type=int, default=64, help='count of concurrent clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='duration of every test in seconds')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--path', action='append', dest='paths', help='request path, can be repeated')
+    args = parser.parse_args()
+    paths = list(args.paths or PATHS)
+
+    if args.url:
+        print_result('server', asyncio.run(run_load(args.url, paths, args.concurrency, args.duration)))
+        return
+
+    host = '127.0.0.1'
+    url = f'http://{host}:{args.port}'
+    print(f'{args.workers} workers, {args.concurrency} clients, {args.duration:.0f} s, paths: {", ".join(paths)}')
+    for name, command in DEPLOYMENTS:
+        server = subprocess.Popen(
+            shlex.split(command.format(workers=args.workers, host=host, port=args.port)),
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='stepik_tours.settings'),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_server(url)
+            # Warm up: caches of pages and orderings are filled in every worker
+            asyncio.run(run_load(url, paths, args.concurrency, 1.0))
+            print_result(name, asyncio.run(run_load(url, paths, args.concurrency, args.duration)))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
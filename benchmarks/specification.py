@@ -0,0 +1,54 @@
+"""
+Benchmark of compiled specification predicate against evaluation of specification tree for every item.
+
+    python -m benchmarks.specification --count 1000000
+"""
+
+__author__ = 'Artikov A.K.'
+
+import argparse
+
+from tours.services.specification import SpecificationFactory, SpecificationFilter
+from .catalog import generate_tours, build_tours, measure
+
+FILTERS = (
+    {'departure': 'msk'},
+    {'departure': ['spb', 'kazan'], 'nights': [6, 7, 8]},
+    {'nights': [6, 7, 8], 'country': ['Куба', 'Индия'], 'stars': '5', 'departure': 'msk'},
+    {'price__between': [50000, 90000], 'stars': '5', 'date__gte': '1 июня'},
+)
+
+
+def evaluate(tours, data_filter: dict) -> list:
+    """Evaluation of specification tree: is_satisfied of every specification for every tour"""
+    spec = SpecificationFactory.constract_from_filter(data_filter)
+    return [tour for tour in tours if spec.is_satisfied(tour)]
+
+
+def evaluate_compiled(tours, data_filter: dict) -> list:
+    """Evaluation of compiled predicate"""
+    return list(SpecificationFilter.filter(tours, SpecificationFactory.constract_from_filter(data_filter)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=1_000_000, help='count of tours')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tours = build_tours(generate_tours(args.count))
+
+    print(f'{args.count} tours')
+    for data_filter in FILTERS:
+        if evaluate(tours, data_filter) != evaluate_compiled(tours, data_filter):
+            raise SystemExit(f'Results for {data_filter} are different')
+        tree_time = measure(lambda: evaluate(tours, data_filter), args.repeat)
+        compiled_time = measure(lambda: evaluate_compiled(tours, data_filter), args.repeat)
+        print(
+            f'{str(data_filter):<90} tree {tree_time * 1000:9.1f} ms  compiled {compiled_time * 1000:9.1f} ms  '
+            f'speedup x{tree_time / compiled_time:.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmark suite of tours services and views on synthetic catalogs of several sizes: construction of controller,
+filters by departure and nights, random samples, min/max, full-text search and rendering of pages by Django
+test client.
+Results are saved to JSON, results of other run are compared with threshold, slower cases are reported
+as regressions and exit code is 1.
+
+    python -m benchmarks.suite --scale 1000 --scale 100000 --output current.json
+    python -m benchmarks.suite --output current.json --compare baseline.json --threshold 0.2
+"""
+
+__author__ = 'Artikov A.K.'
+
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple, Callable
+
+import django
+from django.test import Client
+
+from tours import page_cache
+from tours.services import tour_services
+from tours.services.sources import DictSource
+from .catalog import generate_tours, generate_departures, measure
+
+SCALES = (1_000, 100_000, 1_000_000)
+# Difference of time, which is not regression for any threshold: timer and scheduler noise of fast cases
+MIN_DIFFERENCE = 50e-6
+VIEW_PATHS = (
+    ('view_main', '/'),
+    ('view_departure', '/departure/msk'),
+    ('view_departure_sorted', '/departure/spb?sort=-price&page=2'),
+    ('view_tour', '/tour/1'),
+)
+
+
+def get_controller_cases(controller) -> List[Tuple[str, Callable]]:
+    """
+    The function returns cases of controller with loaded catalog.
+    :param controller: tour controller
+    :return: pairs of case name and function without arguments
+    """
+    kazan_tours = controller.get({'departure': 'kazan'})
+    return [
+        ('filter_departure', lambda: controller.get({'departure': 'msk'})),
+        ('filter_nights', lambda: controller.get({'nights': 7})),
+        ('filter_departure_nights', lambda: controller.get({'departure': 'spb', 'nights': [7, 10]})),
+        ('filter_price_range', lambda: controller.get({'departure': 'nsk', 'price__between': [40000, 60000]})),
+        ('sample', lambda: controller.get({'random': 6})),
+        ('sample_filtered', lambda: controller.sample(6, data_filter={'departure': 'kazan'})),
+        ('sample_weighted', lambda: controller.sample(6, weight='stars')),
+        ('min_max_aggregates', lambda: controller.get_min_max_attr_for_data(
+            [], 'price', 'nights', data_filter={'departure': 'msk'}
+        )),
+        ('min_max_pass', lambda: controller.get_min_max_attr_for_data(kazan_tours, 'price', 'nights')),
+        ('search_term', lambda: controller.search('отель')),
+        ('search_terms', lambda: controller.search('пляж у моря')),
+        # Every term of description is in most of tours, it is the worst case of ranked postings
+        ('search_common_terms', lambda: controller.search('красного соснового дерева')),
+        ('search_filtered', lambda: controller.search('пляж у моря', {'departure': 'kazan', 'nights__gte': 7})),
+    ]
+
+
+def render_page(client: Client, path: str) -> None:
+    response = client.get(path)
+    if response.status_code != 200:
+        raise SystemExit(f'{path} is answered with {response.status_code}')
+    # Cards of streaming page are rendered, when response is read
+    if response.streaming:
+        b''.join(response.streaming_content)
+
+
+def run_scale(count: int, repeat: int, number: int) -> Dict[str, float]:
+    """
+    The function runs all cases for catalog of count tours.
+    :param count: count of tours
+    :param repeat: count of measurements of case
+    :param number: count of executions of fast case in one measurement
+    :return: case name -> the best time in seconds
+    """
+    dict_tours = generate_tours(count)
+    departures = generate_departures()
+    controller_type = type(tour_services.TOUR_CONTROLLER)
+    results = dict()
+
+    # Construction of large catalog takes seconds, it is measured once
+    results['construct'] = measure(lambda: controller_type(dict_tours), repeat if count < 1_000_000 else 1)
+    controller = controller_type(dict_tours)
+    # Search index is built in background at worker start, searches do not wait for it
+    results['build_search_index'] = measure(controller.build_search_index, 1)
+    for name, func in get_controller_cases(controller):
+        results[name] = measure(func, repeat, number)
+    del controller
+
+    # Views read catalog of global controllers, catalog is reloaded in place as by reload_catalog
+    tour_services.TOUR_CONTROLLER.reload(DictSource(dict_tours))
+    tour_services.DEPARTURE_CONTROLLER.reload(DictSource(departures))
+    client = Client()
+    for name, path in VIEW_PATHS:
+        render_page(client, path)
+        results[name] = measure(lambda: render_page(client, path), repeat, number)
+    return results
+
+
+def compare_results(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """
+    The function returns cases, which are slower than in baseline by more than threshold.
+    :param current: results of current run
+    :param baseline: results of baseline run
+    :param threshold: allowed relative slowdown, for example 0.2 for 20%
+    :return: descriptions of regressions
+    """
+    regressions = []
+    for scale, cases in current['results'].items():
+        baseline_cases = baseline['results'].get(scale, dict())
+        for name, seconds in cases.items():
+            baseline_seconds = baseline_cases.get(name)
+            if baseline_seconds is None:
+                continue
+            ratio = seconds / baseline_seconds
+            if ratio > 1 + threshold and seconds - baseline_seconds > MIN_DIFFERENCE:
+                regressions.append(
+                    f'{scale:>8} {name:<24} {baseline_seconds * 1000:10.3f} ms -> {seconds * 1000:10.3f} ms '
+                    f'(+{(ratio - 1) * 100:.0f}%)'
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, action='append', dest='scales', help='count of tours, can be repeated')
+    parser.add_argument('--repeat', type=int, default=5, help='count of measurements of case')
+    parser.add_argument('--number', type=int, default=10, help='count of executions in one measurement')
+    parser.add_argument('--output', help='JSON file for results')
+    parser.add_argument('--compare', help='JSON file with baseline results')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown')
+    args = parser.parse_args()
+
+    # Pages are rendered for every request
+    page_cache.PAGE_CACHE_SETTINGS = dict(page_cache.PAGE_CACHE_SETTINGS, ENABLED=False)
+    current = {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'platform': platform.platform(),
+            'controller': type(tour_services.TOUR_CONTROLLER).__name__,
+            'repeat': args.repeat,
+            'number': args.number,
+        },
+        'results': dict(),
+    }
+    for count in args.scales or SCALES:
+        results = current['results'][str(count)] = run_scale(count, args.repeat, args.number)
+        print(f'{count} tours')
+        for name, seconds in results.items():
+            print(f'  {name:<24} {seconds * 1000:10.3f} ms')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(current, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare_results(current, baseline, args.threshold)
+        if regressions:
+            print(f'Regressions against {args.compare} (threshold {args.threshold * 100:.0f}%):')
+            print('\n'.join(regressions))
+            sys.exit(1)
+        print(f'No regressions against {args.compare} (threshold {args.threshold * 100:.0f}%)')
+
+
+if __name__ == '__main__':
+    main()
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tours.middleware.instrumentation_middleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -57,8 +58,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': ['templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Templates are compiled once per worker, they are compiled at worker start (see tours.cards)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -79,6 +86,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Connections are kept between requests, SQLite connections are switched to WAL mode (see tours.apps)
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'timeout': 20,
+        },
     }
 }
 
@@ -114,6 +126,84 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Tours catalog
+# Backend of tours controller: 'memory' (inverted indexes), 'columnar' (NumPy arrays, requires numpy),
+# 'bitmap' (inverted indexes with bitmap postings) or 'database' (tables of DATABASES, which are filled by
+# import_catalog command; requests are answered by SQL, until cache is loaded from database)
+
+TOURS_CONTROLLER_BACKEND = 'memory'
+
+# Database catalog is loaded in background at worker start (not on import, so migrate works on empty database).
+# Requests, which need cache, wait for it TIMEOUT seconds and are answered with 503, if loading failed.
+# Failed loading is started again on request not earlier than in RETRY_INTERVAL seconds.
+
+TOURS_DATABASE_CACHE_TIMEOUT = 60
+TOURS_CATALOG_LOAD_RETRY_INTERVAL = 30
+
+# Catalog files (.jsonl or .csv) for tours and departures. Catalog from data.py is used for None.
+# Files are loaded in background, requests are served during loading.
+
+TOURS_CATALOG_SOURCES = {
+    'tours': None,
+    'departures': None,
+}
+
+# Binary catalog snapshot, which is built by build_catalog_snapshot command and shared by all workers.
+# Catalog is loaded from TOURS_CATALOG_SOURCES, while snapshot file does not exist.
+
+TOURS_CATALOG_SNAPSHOT = os.path.join(BASE_DIR, 'catalog.snapshot')
+
+# Catalog reload without restart. Workers poll modification time of catalog files and reload trigger file,
+# which is touched by reload_catalog command. Signal (for example 'SIGUSR2') sent to worker also reloads catalog.
+
+TOURS_CATALOG_RELOAD_TRIGGER = os.path.join(BASE_DIR, 'catalog.reload')
+TOURS_CATALOG_WATCH_INTERVAL = 2
+TOURS_CATALOG_RELOAD_SIGNAL = None
+
+# Cache of rendered pages. Page is cached for catalog generation, main page with random tours
+# is cached in MAIN_PAGE_VARIANTS variants.
+
+TOURS_PAGE_CACHE = {
+    'ENABLED': True,
+    'MAX_SIZE': 64 * 1024 * 1024,
+    'MAX_ENTRIES': 10000,
+    'MAIN_PAGE_VARIANTS': 8,
+}
+
+# Count of tours on page of departure. Tours of departure are sorted by price, nights or stars.
+
+TOURS_DEPARTURE_PAGE_SIZE = 30
+
+# Count of filters, for which counts of tours by departure, country, stars and nights are cached.
+
+TOURS_FACET_CACHE_SIZE = 1024
+
+# Cache of rendered tour cards for current catalog generation. With PRERENDER cards of the first MAX_ENTRIES
+# tours are rendered in background at worker start, other cards are rendered on first request.
+
+TOURS_CARD_CACHE = {
+    'PRERENDER': True,
+    'MAX_SIZE': 64 * 1024 * 1024,
+    'MAX_ENTRIES': 100000,
+}
+
+# Instrumentation of requests. Histograms of requests and stages (filter, specification, min/max, render,
+# api functions) are exposed at /metrics with METRICS only for clients from METRICS_ALLOWED_IPS (REMOTE_ADDR,
+# behind reverse proxy it is address of proxy), other clients get 403. Stage timings are returned
+# in Server-Timing header.
+# With PROFILE request with PROFILE_HEADER is profiled by sampling profiler and stacks in folded format
+# (flamegraph.pl, speedscope) are returned instead of page. Profiler is enabled explicitly by TOURS_PROFILE=1
+# in environment, as any client can send profile header.
+
+TOURS_INSTRUMENTATION = {
+    'METRICS': True,
+    'METRICS_ALLOWED_IPS': ('127.0.0.1', '::1'),
+    'PROFILE': os.environ.get('TOURS_PROFILE') == '1',
+    'PROFILE_HEADER': 'X-Tours-Profile',
+    'PROFILE_INTERVAL': 0.001,
+}
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.0/howto/static-files/
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
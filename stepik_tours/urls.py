@@ -21,6 +21,16 @@ from tours.views import (
     tour_view,
     handler404_view
 )
+from tours.api_views import (
+    tours_api_view,
+    tour_api_view,
+    departures_api_view,
+    aggregates_api_view,
+    search_api_view,
+    complete_api_view,
+    facets_api_view,
+    metrics_api_view
+)
 from django.conf.urls.static import static
 from django.conf import settings
 
@@ -29,6 +39,14 @@ urlpatterns = [
     path('', main_view, name='main_info'),
     path('departure/<str:departure>', departure_view, name='departure_info'),
     path('tour/<int:tour_id>', tour_view, name='tour_info'),
+    path('api/tours', tours_api_view, name='tours_api'),
+    path('api/tours/<int:tour_id>', tour_api_view, name='tour_api'),
+    path('api/departures', departures_api_view, name='departures_api'),
+    path('api/aggregates/<str:dimension>', aggregates_api_view, name='aggregates_api'),
+    path('api/search', search_api_view, name='search_api'),
+    path('api/complete', complete_api_view, name='complete_api'),
+    path('api/facets', facets_api_view, name='facets_api'),
+    path('metrics', metrics_api_view, name='metrics'),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
 
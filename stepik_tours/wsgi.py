@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stepik_tours.settings')
 
 application = get_wsgi_application()
+
+from tours.cards import warm_rendering  # noqa: E402
+from tours.services.reloading import start_catalog_reloading  # noqa: E402
+from tours.services.tour_services import start_catalog_loading  # noqa: E402
+
+start_catalog_loading()
+start_catalog_reloading()
+warm_rendering()
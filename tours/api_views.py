@@ -0,0 +1,227 @@
+"""
+This module describes read-only JSON API of tours catalog. Responses are joined from precomputed
+JSON fragments of tours, lists of tours are paginated by cursor.
+"""
+
+__author__ = 'Artikov A.K.'
+
+from django.conf import settings
+from django.http import HttpResponse, QueryDict
+from django.views.decorators.http import require_GET
+
+from .services.api import (
+    get_tours_json_page, get_tour_json, get_departures_json, get_tours_aggregates, search_tours, complete_tours_query,
+    get_tours_facets
+)
+from .services.facets import UnknownFacetError
+from .services.instrumentation import REGISTRY
+from .services.pagination import InvalidCursorError, InvalidOrderingError
+from .services.serialization import dumps, join_array
+from .services.tour_services import CatalogUnavailableError
+from .services.sources import to_number
+from .services.specification import SpecificationFactory, get_date_key
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Seconds, after which client can repeat request, while catalog is not loaded
+RETRY_AFTER = 5
+INSTRUMENTATION = getattr(settings, 'TOURS_INSTRUMENTATION', dict())
+METRICS_ENABLED = INSTRUMENTATION.get('METRICS', False)
+METRICS_ALLOWED_IPS = frozenset(INSTRUMENTATION.get('METRICS_ALLOWED_IPS', ()))
+
+RESERVED_PARAMS = ('cursor', 'limit', 'sort', 'q', 'facet')
+RANGE_LOOKUPS = ('gt', 'gte', 'lt', 'lte', 'between')
+
+
+def to_date(value: str) -> str:
+    """
+    The function checks date of filter, date is kept as string like '2 марта' and is compared by date key.
+    :param value: date in format '<day> <month name>'
+    :return:
+    :raises ValueError: if day or month is wrong
+    """
+    get_date_key(value)
+    if not 1 <= int(value.split()[0]) <= 31:
+        raise ValueError(f'Wrong day of date {value}')
+    return value
+
+
+# Query values are strings, values of other attributes are converted for indexes and checked
+FILTER_CONVERTERS = {
+    'nights': int,
+    'price': to_number,
+    'date': to_date,
+}
+
+
+class ApiRequestError(Exception):
+    """
+    Wrong parameters of API request.
+    """
+    pass
+
+
+def json_response(content: bytes, status: int = 200) -> HttpResponse:
+    return HttpResponse(content, content_type='application/json', status=status)
+
+
+def error_response(message: str, status: int = 400) -> HttpResponse:
+    return json_response(dumps({'error': message}), status=status)
+
+
+def unavailable_response(error: CatalogUnavailableError) -> HttpResponse:
+    response = error_response(str(error), status=503)
+    response['Retry-After'] = RETRY_AFTER
+    return response
+
+
+def get_tours_filter(query: QueryDict) -> dict:
+    """
+    The function returns tours filter from query parameters, for example departure=msk&price__gte=50000.
+    Repeated parameter is list of values, between lookup takes two values, which are separated by comma.
+    :param query: query parameters
+    :return:
+    :raises ApiRequestError: if filter does not exist or value is wrong
+    """
+    tours_filter = dict()
+    for name in query:
+        if name in RESERVED_PARAMS:
+            continue
+        attr_name, _, lookup = name.partition('__')
+        if lookup:
+            if attr_name not in SpecificationFactory.range_specification_types or lookup not in RANGE_LOOKUPS:
+                raise ApiRequestError(f'Filter {name} does not exist')
+        elif attr_name not in SpecificationFactory.specification_types:
+            raise ApiRequestError(f'Filter {name} does not exist')
+
+        converter = FILTER_CONVERTERS.get(attr_name, str)
+        values = query.getlist(name)
+        if lookup == 'between':
+            values = values[-1].split(',')
+            if len(values) != 2:
+                raise ApiRequestError(f'Filter {name} takes two values')
+        try:
+            values = [converter(value) for value in values]
+        except ValueError:
+            raise ApiRequestError(f'Wrong value of filter {name}')
+
+        if lookup == 'between':
+            tours_filter[name] = values
+        elif lookup or len(values) == 1:
+            tours_filter[name] = values[-1]
+        else:
+            tours_filter[name] = values
+    return tours_filter
+
+
+def get_limit(query: QueryDict) -> int:
+    """
+    The function returns count of items on page from query parameters.
+    :param query: query parameters
+    :return:
+    :raises ApiRequestError: if limit is wrong
+    """
+    try:
+        limit = int(query.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiRequestError('Wrong value of limit')
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ApiRequestError(f'Limit should be from 1 to {MAX_PAGE_SIZE}')
+    return limit
+
+
+@require_GET
+def tours_api_view(request):
+    try:
+        fragments, next_cursor = get_tours_json_page(
+            get_tours_filter(request.GET), request.GET.get('cursor'), get_limit(request.GET), request.GET.get('sort')
+        )
+    except (ApiRequestError, InvalidCursorError, InvalidOrderingError) as error:
+        return error_response(str(error))
+    except CatalogUnavailableError as error:
+        return unavailable_response(error)
+
+    return json_response(b'{"items":' + join_array(fragments) + b',"next":' + dumps(next_cursor) + b'}')
+
+
+@require_GET
+def search_api_view(request):
+    query = request.GET.get('q', '')
+    try:
+        page = search_tours(query, get_tours_filter(request.GET), get_limit(request.GET))
+    except ApiRequestError as error:
+        return error_response(str(error))
+    except CatalogUnavailableError as error:
+        return unavailable_response(error)
+
+    return json_response(
+        b'{"items":' + join_array(page.get_json_fragments()) + b',"scores":' + dumps(page.scores) + b'}'
+    )
+
+
+@require_GET
+def complete_api_view(request):
+    try:
+        words = complete_tours_query(request.GET.get('q', ''), get_limit(request.GET))
+    except ApiRequestError as error:
+        return error_response(str(error))
+    except CatalogUnavailableError as error:
+        return unavailable_response(error)
+
+    return json_response(dumps({'words': words}))
+
+
+@require_GET
+def facets_api_view(request):
+    try:
+        facets = get_tours_facets(get_tours_filter(request.GET), request.GET.getlist('facet') or None)
+    except (ApiRequestError, UnknownFacetError) as error:
+        return error_response(str(error))
+
+    return json_response(dumps({'facets': facets}))
+
+
+@require_GET
+def tour_api_view(request, tour_id: int):
+    try:
+        tour = get_tour_json(tour_id)
+    except CatalogUnavailableError as error:
+        return unavailable_response(error)
+    if tour is None:
+        return error_response(f'Tour {tour_id} does not exist', status=404)
+
+    return json_response(tour)
+
+
+@require_GET
+def departures_api_view(request):
+    return json_response(b'{"items":' + join_array(get_departures_json()) + b'}')
+
+
+@require_GET
+def aggregates_api_view(request, dimension: str):
+    dimension_aggregates = get_tours_aggregates(dimension)
+    if dimension_aggregates is None:
+        return error_response(f'Aggregates for {dimension} do not exist', status=404)
+
+    values = {
+        value: {
+            attr_name: dict(
+                count=aggregate.count, sum=aggregate.sum, min=aggregate.min, max=aggregate.max, mean=aggregate.mean
+            )
+            for attr_name, aggregate in value_aggregates.items()
+        }
+        for value, value_aggregates in dimension_aggregates.items()
+    }
+    return json_response(dumps({'dimension': dimension, 'values': values}))
+
+
+@require_GET
+def metrics_api_view(request):
+    # Latency histograms are not public, they are forbidden for other clients
+    if not METRICS_ENABLED:
+        return error_response('Not found', status=404)
+    if request.META.get('REMOTE_ADDR') not in METRICS_ALLOWED_IPS:
+        return error_response('Forbidden', status=403)
+
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,121 @@
+"""
+This module describes cache of rendered tour cards. Card depends only on tour, so card is rendered once
+for tours generation and pages join cached cards. Templates of pages are compiled at worker start,
+cards are rendered in background after catalog is loaded.
+"""
+
+__author__ = 'Artikov A.K.'
+
+import logging
+import threading
+from typing import Iterable
+
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils.safestring import SafeString, mark_safe
+
+from .page_cache import PageCache
+from .services.api import get_catalog_generations, get_tours_data
+from .services.tour_services import TOUR_CONTROLLER
+
+logger = logging.getLogger(__name__)
+
+CARD_TEMPLATE = 'tours/card.html'
+PAGE_TEMPLATES = (
+    'tours/base.html', 'tours/index.html', 'tours/departure.html', 'tours/tour.html', 'tours/404.html',
+    'tours/navigation.html', 'tours/cards.html', CARD_TEMPLATE,
+)
+CARD_CACHE_SETTINGS = getattr(settings, 'TOURS_CARD_CACHE', dict())
+
+
+class CardCache:
+    """
+    Rendered cards by tour id for current tours generation, cache is bounded as page cache.
+    """
+    def __init__(self, max_size: int, max_entries: int):
+        """
+        Initialisation cache
+        :param max_size: max summary length of cards
+        :param max_entries: max count of cards
+        """
+        self.max_entries = max_entries
+        self._cards = PageCache(max_size, max_entries)
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def get_cards(self, tours: Iterable['Tour']) -> SafeString:
+        """
+        The method return joined cards of tours, cards, which are not cached, are rendered and cached.
+        :param tours: tours
+        :return:
+        """
+        cards = self._cards
+        cards.set_version(get_catalog_generations()['tours'])
+        card_template = None
+        result = []
+        for tour in tours:
+            card = cards.get(tour.id)
+            if card is None:
+                card_template = card_template or get_template(CARD_TEMPLATE)
+                card = card_template.render({'tour': tour})
+                cards.set(tour.id, card)
+            result.append(card)
+        return mark_safe(''.join(result))
+
+    def prerender(self) -> int:
+        """
+        The method renders cards of the first max_entries tours of catalog.
+        :return: count of cached cards
+        """
+        self.get_cards(get_tours_data()[:self.max_entries])
+        return len(self)
+
+
+CARD_CACHE = CardCache(
+    max_size=CARD_CACHE_SETTINGS.get('MAX_SIZE', 64 * 1024 * 1024),
+    max_entries=CARD_CACHE_SETTINGS.get('MAX_ENTRIES', 100000),
+)
+
+
+def get_cards(tours: Iterable['Tour']) -> SafeString:
+    """
+    The function returns rendered cards of tours.
+    :param tours: tours
+    :return:
+    """
+    return CARD_CACHE.get_cards(tours)
+
+
+def warm_templates() -> None:
+    """
+    The function compiles templates of pages, compiled templates are kept by cached template loader.
+    :return:
+    """
+    for template_name in PAGE_TEMPLATES:
+        get_template(template_name)
+
+
+def prerender_cards() -> None:
+    """
+    The function renders cards, when catalog is loaded.
+    :return:
+    """
+    if not TOUR_CONTROLLER.wait_loaded():
+        logger.warning('Tour cards are not rendered, catalog is not loaded')
+        return
+    try:
+        logger.info('%s tour cards are rendered', CARD_CACHE.prerender())
+    except Exception:
+        logger.exception('Tour cards are not rendered')
+
+
+def warm_rendering() -> None:
+    """
+    The function is called at worker start: it compiles templates and starts rendering of cards in background,
+    if it is enabled in settings.
+    :return:
+    """
+    warm_templates()
+    if CARD_CACHE_SETTINGS.get('PRERENDER', True):
+        threading.Thread(target=prerender_cards, name='CardsPrerender', daemon=True).start()
@@ -2,16 +2,103 @@
 
 __author__ = 'Artikov A.K.'
 
-from dataclasses import dataclass
+import sys
+import typing
+from dataclasses import dataclass, fields
+from typing import Dict, Hashable, Iterable, List, Tuple, Type
 
 import dacite
 
 
-@dataclass
+class CatalogValidationError(Exception):
+    """
+    Errors of data models construction. All errors of batch are reported together.
+    """
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__(f'{len(errors)} invalid records:\n' + '\n'.join(errors))
+
+
+class ModelBuilder:
+    """
+    Precompiled constructor of data model. Model fields and types are resolved once for model,
+    record keys are checked once for every record schema (set of keys).
+    """
+    # Accepted types of values for field types, int value is allowed for float field as in dacite
+    accepted_types = {float: (int, float)}
+
+    def __init__(self, model: Type['BaseModel']):
+        self.model = model
+        type_hints = typing.get_type_hints(model)
+        self.field_names = tuple(field.name for field in fields(model))
+        self.field_types = tuple(
+            self.accepted_types.get(type_hints[field_name], type_hints[field_name]) for field_name in self.field_names
+        )
+        self.interned_fields = frozenset(model.interned_fields)
+        self._schema_errors = dict()
+
+    def construct_many(
+            self, records: Iterable[Tuple[Hashable, dict]], id_field: str = 'id'
+    ) -> Dict[Hashable, 'BaseModel']:
+        """
+        Create data models from records.
+        :param records: pairs of model id and dict with other fields
+        :param id_field: name of id field
+        :return: models by id
+        :raises CatalogValidationError: if some records are invalid
+        """
+        result = dict()
+        errors = []
+        model = self.model
+        field_names = self.field_names
+        field_types = self.field_types
+        interned_fields = self.interned_fields
+        intern = sys.intern
+        for data_id, record in records:
+            schema = tuple(record)
+            schema_errors = self._schema_errors.get(schema)
+            if schema_errors is None:
+                schema_errors = self._check_schema(schema, id_field)
+                self._schema_errors[schema] = schema_errors
+            if schema_errors:
+                errors.extend(f'{model.__name__} {data_id}: {error}' for error in schema_errors)
+                continue
+
+            values = []
+            for field_name, field_type in zip(field_names, field_types):
+                value = data_id if field_name == id_field else record[field_name]
+                if not isinstance(value, field_type):
+                    errors.append(
+                        f'{model.__name__} {data_id}: wrong value type for field "{field_name}": {type(value).__name__}'
+                    )
+                    break
+                if field_name in interned_fields:
+                    value = intern(value)
+                values.append(value)
+            else:
+                result[data_id] = model(*values)
+
+        if errors:
+            raise CatalogValidationError(errors)
+        return result
+
+    def _check_schema(self, schema: Tuple[str, ...], id_field: str) -> List[str]:
+        return [
+            f'missing field "{field_name}"' for field_name in self.field_names
+            if field_name != id_field and field_name not in schema
+        ]
+
+
+MODEL_BUILDERS: Dict[Type['BaseModel'], ModelBuilder] = dict()
+
+
+@dataclass(slots=True)
 class BaseModel:
     """
-    Base data model
+    Base data model. Models keep attributes in slots, string attributes with repeated values are interned.
     """
+    interned_fields = ()
+
     @classmethod
     def construct_from_dict(cls, dict_data: dict) -> 'BaseModel':
         """
@@ -19,18 +106,35 @@ class BaseModel:
         :param dict_data:
         :return:
         """
+        for field_name in cls.interned_fields:
+            if isinstance(dict_data.get(field_name), str):
+                dict_data[field_name] = sys.intern(dict_data[field_name])
         data_model = dacite.from_dict(cls, dict_data)
         return data_model
 
-    def as_dict(self):
-        return self.__dict__
+    @classmethod
+    def construct_many(cls, records: Iterable[Tuple[Hashable, dict]]) -> Dict[Hashable, 'BaseModel']:
+        """
+        Create objects for data model from pairs of id and dict without per record type introspection.
+        :param records: pairs of model id and dict with other fields
+        :return: models by id
+        """
+        builder = MODEL_BUILDERS.get(cls)
+        if builder is None:
+            builder = MODEL_BUILDERS[cls] = ModelBuilder(cls)
+        return builder.construct_many(records)
+
+    def as_dict(self) -> dict:
+        return {field.name: getattr(self, field.name) for field in fields(self)}
 
 
-@dataclass
+@dataclass(slots=True)
 class Tour(BaseModel):
     """
     Tour data model
     """
+    interned_fields = ('departure', 'stars', 'country', 'date')
+
     id: int
     title: str
     description: str
@@ -41,20 +145,23 @@ class Tour(BaseModel):
     country: str
     nights: int
     date: str
-    star_range: range
 
-    @classmethod
-    def construct_from_dict(cls, dict_data: dict) -> 'Tour':
-        if 'stars' in dict_data:
-            dict_data['star_range'] = range(int(dict_data.get('stars')))
-        tour = dacite.from_dict(cls, dict_data)
-        return tour
+    @property
+    def star_range(self) -> range:
+        return range(int(self.stars))
+
+    def as_dict(self) -> dict:
+        tour_dict = super(Tour, self).as_dict()
+        tour_dict['star_range'] = self.star_range
+        return tour_dict
 
 
-@dataclass
+@dataclass(slots=True)
 class Departure(BaseModel):
     """
     Departure model
     """
+    interned_fields = ('id', )
+
     id: str
     city_departure: str
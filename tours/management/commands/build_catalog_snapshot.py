@@ -0,0 +1,38 @@
+"""Command builds binary catalog snapshot from catalog sources"""
+
+__author__ = 'Artikov A.K.'
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+import data
+from tours.services.sources import get_catalog_source
+from tours.services.tour_services import TourController, DepartureController
+
+
+class Command(BaseCommand):
+    help = 'Builds binary catalog snapshot, which is mapped to memory by all workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.TOURS_CATALOG_SNAPSHOT, help='snapshot path')
+        parser.add_argument('--tours', default=settings.TOURS_CATALOG_SOURCES.get('tours'),
+                            help='tours catalog file (.jsonl or .csv), data.py by default')
+        parser.add_argument('--departures', default=settings.TOURS_CATALOG_SOURCES.get('departures'),
+                            help='departures catalog file (.jsonl or .csv), data.py by default')
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError('Snapshot path is not defined')
+
+        tour_controller = TourController()
+        tour_controller.load(get_catalog_source(options['tours'], data.tours), background=False)
+        departure_controller = DepartureController()
+        departure_controller.load(get_catalog_source(options['departures'], data.departures), background=False)
+
+        departures = {
+            departure.id: departure.city_departure for departure in departure_controller.get()
+        }
+        tour_controller.save_snapshot(options['output'], departures)
+        self.stdout.write(self.style.SUCCESS(
+            f'Snapshot {options["output"]} with {len(tour_controller.get())} tours is built'
+        ))
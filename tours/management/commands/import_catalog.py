@@ -0,0 +1,37 @@
+"""Command imports catalog sources to tables of database for controller with database backend"""
+
+__author__ = 'Artikov A.K.'
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+import data
+from tours.data_models import CatalogValidationError
+from tours.services.database import import_tours, import_departures
+from tours.services.sources import get_catalog_source
+
+
+class Command(BaseCommand):
+    help = 'Imports tours and departures to database by batches, tables are replaced in one transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tours', default=settings.TOURS_CATALOG_SOURCES.get('tours'),
+                            help='tours catalog file (.jsonl or .csv), data.py by default')
+        parser.add_argument('--departures', default=settings.TOURS_CATALOG_SOURCES.get('departures'),
+                            help='departures catalog file (.jsonl or .csv), data.py by default')
+        parser.add_argument('--batch-size', type=int, default=1000, help='count of tours in one INSERT')
+        parser.add_argument('--database', default='default', help='alias of database')
+
+    def handle(self, *args, **options):
+        try:
+            tours_count = import_tours(
+                get_catalog_source(options['tours'], data.tours).iter_records(), options['batch_size'],
+                using=options['database'],
+            )
+            departures_count = import_departures(
+                get_catalog_source(options['departures'], data.departures).iter_records(), using=options['database']
+            )
+        except (CatalogValidationError, IntegrityError) as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f'{tours_count} tours and {departures_count} departures are imported'))
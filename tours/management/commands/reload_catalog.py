@@ -0,0 +1,21 @@
+"""Command triggers catalog reload in all running workers"""
+
+__author__ = 'Artikov A.K.'
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from tours.services.reloading import touch_reload_trigger
+
+
+class Command(BaseCommand):
+    help = 'Triggers catalog reload in all running workers without restart'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--build-snapshot', action='store_true', help='rebuild catalog snapshot before reload')
+
+    def handle(self, *args, **options):
+        if options['build_snapshot']:
+            call_command('build_catalog_snapshot', stdout=self.stdout)
+        path = touch_reload_trigger()
+        self.stdout.write(self.style.SUCCESS(f'Reload is triggered by {path}'))
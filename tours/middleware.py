@@ -0,0 +1,106 @@
+"""
+This module describes instrumentation middleware. Duration of every request is recorded in histogram by view,
+durations of request stages are returned in Server-Timing header. Request with profile header is profiled by
+sampling profiler and stacks in folded format are returned instead of response.
+"""
+
+__author__ = 'Artikov A.K.'
+
+import asyncio
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+
+from .services.instrumentation import REGISTRY, SamplingProfiler, start_trace, finish_trace
+
+INSTRUMENTATION = getattr(settings, 'TOURS_INSTRUMENTATION', dict())
+PROFILE_HEADER = INSTRUMENTATION.get('PROFILE_HEADER', 'X-Tours-Profile')
+PROFILE_ENABLED = INSTRUMENTATION.get('PROFILE', False)
+PROFILE_INTERVAL = INSTRUMENTATION.get('PROFILE_INTERVAL', 0.001)
+# Key of profile header in request.META
+PROFILE_META_KEY = 'HTTP_' + PROFILE_HEADER.upper().replace('-', '_')
+
+
+def is_profiled(request) -> bool:
+    return PROFILE_ENABLED and PROFILE_META_KEY in request.META
+
+
+def finish_request(request, response: HttpResponse, trace, start: float) -> HttpResponse:
+    """
+    The function records duration of request and adds timings of stages to response.
+    :param request: request
+    :param response: response of view
+    :param trace: trace of request
+    :param start: start time of request by perf_counter
+    :return:
+    """
+    resolver_match = getattr(request, 'resolver_match', None)
+    view = resolver_match.url_name if resolver_match is not None and resolver_match.url_name else 'unknown'
+    REGISTRY.observe('tours_request_seconds', time.perf_counter() - start, view=view)
+    if trace.stages:
+        response['Server-Timing'] = trace.get_server_timing()
+    return response
+
+
+def get_profile_response(response: HttpResponse, profiler: SamplingProfiler) -> HttpResponse:
+    """
+    The function returns stacks of profiled request as text response.
+    :param response: response of view, streaming content is already read by profiler
+    :param profiler: stopped profiler
+    :return:
+    """
+    profile_response = HttpResponse(profiler.get_folded_stacks(), content_type='text/plain; charset=utf-8')
+    profile_response['X-Tours-Profile-Samples'] = sum(profiler.samples.values())
+    profile_response['X-Tours-Profile-Status'] = response.status_code
+    return profile_response
+
+
+def read_streaming_content(response: HttpResponse) -> None:
+    """
+    The function reads streaming content, so rendering of streamed page is profiled too. Content is dropped,
+    profile is returned instead of response.
+    :param response: response of view
+    :return:
+    """
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+@sync_and_async_middleware
+def instrumentation_middleware(get_response):
+    """
+    Middleware records duration of request and stages, it profiles request with profile header,
+    if profiler is enabled in settings. Without profile header overhead is one lookup of request header.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            start = time.perf_counter()
+            trace, token = start_trace()
+            try:
+                if not is_profiled(request):
+                    return finish_request(request, await get_response(request), trace, start)
+                # Async request is executed by event loop and thread pool, so stacks of all threads are sampled
+                with SamplingProfiler(PROFILE_INTERVAL, str(settings.BASE_DIR)) as profiler:
+                    response = await get_response(request)
+                    read_streaming_content(response)
+                return get_profile_response(finish_request(request, response, trace, start), profiler)
+            finally:
+                finish_trace(token)
+    else:
+        def middleware(request):
+            start = time.perf_counter()
+            trace, token = start_trace()
+            try:
+                if not is_profiled(request):
+                    return finish_request(request, get_response(request), trace, start)
+                with SamplingProfiler(PROFILE_INTERVAL, str(settings.BASE_DIR), threading.get_ident()) as profiler:
+                    response = get_response(request)
+                    read_streaming_content(response)
+                return get_profile_response(finish_request(request, response, trace, start), profiler)
+            finally:
+                finish_trace(token)
+    return middleware
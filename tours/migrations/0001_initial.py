@@ -0,0 +1,50 @@
+# Generated by Django 4.0.3 on 2026-10-18 13:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartureRecord',
+            fields=[
+                ('id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('city_departure', models.CharField(max_length=128)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TourRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('position', models.IntegerField(unique=True)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('departure', models.CharField(db_index=True, max_length=32)),
+                ('picture', models.CharField(max_length=512)),
+                ('price', models.FloatField(db_index=True)),
+                ('stars', models.CharField(db_index=True, max_length=8)),
+                ('country', models.CharField(db_index=True, max_length=64)),
+                ('nights', models.IntegerField(db_index=True)),
+                ('date', models.CharField(max_length=32)),
+                ('date_key', models.IntegerField(db_index=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tourrecord',
+            index=models.Index(fields=['departure', 'price', 'position'], name='tour_departure_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tourrecord',
+            index=models.Index(fields=['departure', 'nights', 'position'], name='tour_departure_nights_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tourrecord',
+            index=models.Index(fields=['departure', 'position'], name='tour_departure_position_idx'),
+        ),
+    ]
@@ -1,3 +1,42 @@
+"""
+This module describes tables of tours catalog for controller with database backend.
+Columns, which are used by filters and sorting, are indexed.
+"""
+
+__author__ = 'Artikov A.K.'
+
 from django.db import models
 
-# Create your models here.
+
+class DepartureRecord(models.Model):
+    """
+    Departure of catalog.
+    """
+    id = models.CharField(max_length=32, primary_key=True)
+    city_departure = models.CharField(max_length=128)
+
+
+class TourRecord(models.Model):
+    """
+    Tour of catalog. Position keeps order of catalog, date_key is sortable key of date for range lookups.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    position = models.IntegerField(unique=True)
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    departure = models.CharField(max_length=32, db_index=True)
+    picture = models.CharField(max_length=512)
+    price = models.FloatField(db_index=True)
+    stars = models.CharField(max_length=8, db_index=True)
+    country = models.CharField(max_length=64, db_index=True)
+    nights = models.IntegerField(db_index=True)
+    date = models.CharField(max_length=32)
+    date_key = models.IntegerField(db_index=True)
+
+    class Meta:
+        indexes = [
+            # Pages of departure are sorted by price, nights or stars
+            models.Index(fields=['departure', 'price', 'position'], name='tour_departure_price_idx'),
+            models.Index(fields=['departure', 'nights', 'position'], name='tour_departure_nights_idx'),
+            models.Index(fields=['departure', 'position'], name='tour_departure_position_idx'),
+        ]
@@ -0,0 +1,97 @@
+"""
+This module describes navigation bar with departures. Navigation depends only on departures,
+so fragments are rendered once for every departures generation and active departure.
+"""
+
+__author__ = 'Artikov A.K.'
+
+import threading
+from typing import Optional, List, Dict
+
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import SafeString
+
+from .services.api import get_departures_data, get_catalog_generations, run_in_thread_pool
+
+
+class NavigationCache:
+    """
+    Rendered navigation fragments by active departure for current departures generation.
+    """
+    def __init__(self):
+        self.generation = None
+        self.items = []
+        self.main_url = None
+        self.fragments = dict()
+        self._lock = threading.Lock()
+
+    def get_fragment(self, active_departure: Optional[str]) -> SafeString:
+        """
+        The method return navigation fragment, it is rendered only on first request for generation.
+        :param active_departure: id of departure, which is marked as active
+        :return:
+        """
+        generation = get_catalog_generations()['departures']
+        fragments = self.fragments
+        if generation == self.generation:
+            fragment = fragments.get(active_departure)
+            if fragment is not None:
+                return fragment
+
+        with self._lock:
+            if generation != self.generation:
+                self.items = self._get_items()
+                self.main_url = reverse('main_info')
+                self.fragments = dict()
+                self.generation = generation
+            if active_departure not in self.fragments and not self._is_departure(active_departure):
+                active_departure = None
+            fragment = self.fragments.get(active_departure)
+            if fragment is None:
+                fragment = render_to_string('tours/navigation.html', context=dict(
+                    items=self.items,
+                    main_url=self.main_url,
+                    active_departure=active_departure
+                ))
+                self.fragments[active_departure] = fragment
+            return fragment
+
+    def _is_departure(self, departure: Optional[str]) -> bool:
+        return any(item['id'] == departure for item in self.items)
+
+    @staticmethod
+    def _get_items() -> List[Dict[str, str]]:
+        """
+        Return departures with reversed URLs.
+        :return:
+        """
+        return [
+            dict(
+                id=departure.id,
+                url=reverse('departure_info', args=[departure.id]),
+                city_departure=departure.city_departure
+            )
+            for departure in get_departures_data()
+        ]
+
+
+NAVIGATION_CACHE = NavigationCache()
+
+
+def get_navigation(active_departure: str = None) -> SafeString:
+    """
+    The function returns rendered navigation bar.
+    :param active_departure: id of departure, which is marked as active
+    :return:
+    """
+    return NAVIGATION_CACHE.get_fragment(active_departure)
+
+
+async def aget_navigation(active_departure: str = None) -> SafeString:
+    """
+    Async version of get_navigation, departures are read in thread pool on first request for generation.
+    :param active_departure: id of departure, which is marked as active
+    :return:
+    """
+    return await run_in_thread_pool(get_navigation)(active_departure)
@@ -0,0 +1,219 @@
+"""
+This module describes cache of rendered pages. Page depends only on catalog and URL,
+so cache key contains catalog generations and entries of previous catalog are not used after reload.
+"""
+
+__author__ = 'Artikov A.K.'
+
+import asyncio
+import hashlib
+import random
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Optional, Hashable, Callable, Iterable, Iterator
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from .services.api import get_catalog_generations
+
+
+class CachedPage:
+    """
+    Rendered page with ETag.
+    """
+    __slots__ = ('content', 'content_type', 'etag')
+
+    def __init__(self, content: bytes, content_type: str):
+        self.content = content
+        self.content_type = content_type
+        self.etag = f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+
+    def __len__(self) -> int:
+        return len(self.content)
+
+    def get_response(self) -> HttpResponse:
+        """
+        The method return new response with page content.
+        :return:
+        """
+        response = HttpResponse(self.content, content_type=self.content_type)
+        response['ETag'] = self.etag
+        return response
+
+
+class PageCache:
+    """
+    LRU cache of pages, which is bounded by count of pages and summary size of content.
+    """
+    def __init__(self, max_size: int, max_entries: int):
+        """
+        Initialisation cache
+        :param max_size: max summary size of pages content in bytes
+        :param max_entries: max count of pages
+        """
+        self.max_size = max_size
+        self.max_entries = max_entries
+        self.size = 0
+        self.version = None
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def get(self, key: Hashable) -> Optional[CachedPage]:
+        """
+        The method return cached page and marks it as recently used.
+        :param key: page key
+        :return: page or None
+        """
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            return page
+
+    def set(self, key: Hashable, page: CachedPage) -> None:
+        """
+        The method puts page to cache and evicts least recently used pages over limits.
+        :param key: page key
+        :param page: page
+        :return:
+        """
+        if len(page) > self.max_size:
+            return
+        with self._lock:
+            previous_page = self._pages.pop(key, None)
+            if previous_page is not None:
+                self.size -= len(previous_page)
+            self._pages[key] = page
+            self.size += len(page)
+            while self.size > self.max_size or len(self._pages) > self.max_entries:
+                _, evicted_page = self._pages.popitem(last=False)
+                self.size -= len(evicted_page)
+
+    def set_version(self, version: Hashable) -> None:
+        """
+        The method sets version of cached data. Pages of previous version are evicted.
+        :param version: version, for example catalog generations
+        :return:
+        """
+        if version == self.version:
+            return
+        with self._lock:
+            self._pages.clear()
+            self.size = 0
+            self.version = version
+
+
+PAGE_CACHE_SETTINGS = getattr(settings, 'TOURS_PAGE_CACHE', dict())
+
+PAGE_CACHE = PageCache(
+    max_size=PAGE_CACHE_SETTINGS.get('MAX_SIZE', 64 * 1024 * 1024),
+    max_entries=PAGE_CACHE_SETTINGS.get('MAX_ENTRIES', 10000),
+)
+
+
+def iter_and_cache(key: tuple, streaming_content: Iterable[bytes], content_type: str) -> Iterator[bytes]:
+    """
+    The function yields chunks of streaming response and caches page, when response is streamed completely.
+    :param key: page key, version of catalog is the third item of key
+    :param streaming_content: chunks of response
+    :param content_type: content type of response
+    :return:
+    """
+    chunks = []
+    for chunk in streaming_content:
+        chunks.append(chunk)
+        yield chunk
+    if PAGE_CACHE.version == key[2]:
+        PAGE_CACHE.set(key, CachedPage(b''.join(chunks), content_type))
+
+
+def get_page_key(view: Callable, request, variants: int) -> Optional[tuple]:
+    """
+    The function returns cache key of page for request or None, if page is not cached.
+    :param view: view of page
+    :param request: request
+    :param variants: count of page variants
+    :return:
+    """
+    if request.method not in ('GET', 'HEAD') or not PAGE_CACHE_SETTINGS.get('ENABLED', True):
+        return None
+    generations = get_catalog_generations()
+    version = (generations['tours'], generations['departures'])
+    PAGE_CACHE.set_version(version)
+    return view.__name__, request.get_full_path(), version, random.randrange(variants)
+
+
+def cache_response(key: tuple, response: HttpResponse) -> Optional[CachedPage]:
+    """
+    The function caches successful response of view. Streaming response is cached, when it is streamed to client.
+    :param key: page key
+    :param response: response of view
+    :return: cached page or None, if response should be returned as is
+    """
+    if response.status_code != 200:
+        return None
+    if response.streaming:
+        response.streaming_content = iter_and_cache(key, response.streaming_content, response['Content-Type'])
+        return None
+    page = CachedPage(response.content, response['Content-Type'])
+    PAGE_CACHE.set(key, page)
+    return page
+
+
+def get_page_response(request, page: CachedPage) -> HttpResponse:
+    """
+    The function returns response with cached page or 304, if client has page with ETag. If-None-Match is
+    checked by Django as in RFC 9110: weak comparison of validators (W/"..."), * matches any page.
+    :param request: request
+    :param page: cached page
+    :return:
+    """
+    response = page.get_response()
+    return get_conditional_response(request, etag=page.etag, response=response) or response
+
+
+def catalog_page_cache(variants: int = 1) -> Callable:
+    """
+    Decorator caches successful responses of view by URL and catalog generations. It answers 304
+    for If-None-Match with ETag of page. Streaming response is cached, when it is streamed to client.
+    Sync and async views are supported.
+    :param variants: count of page variants, for example main page with random tours is rendered
+    in several variants and one of them is returned for every request
+    :return:
+    """
+    def decorator(view: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                key = get_page_key(view, request, variants)
+                if key is None:
+                    return await view(request, *args, **kwargs)
+                page = PAGE_CACHE.get(key)
+                if page is None:
+                    response = await view(request, *args, **kwargs)
+                    page = cache_response(key, response)
+                    if page is None:
+                        return response
+                return get_page_response(request, page)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = get_page_key(view, request, variants)
+            if key is None:
+                return view(request, *args, **kwargs)
+            page = PAGE_CACHE.get(key)
+            if page is None:
+                response = view(request, *args, **kwargs)
+                page = cache_response(key, response)
+                if page is None:
+                    return response
+            return get_page_response(request, page)
+        return wrapper
+    return decorator
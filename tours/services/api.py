@@ -2,10 +2,15 @@
 
 __author__ = 'Artikov A.K'
 
-from typing import List, Dict
+from typing import List, Dict, Optional, Iterable, Tuple, Any, Callable
+
+from asgiref.sync import sync_to_async
 
 import data
-from .tour_services import TOUR_CONTROLLER, DEPARTURE_CONTROLLER, AttrMinMax
+from .database import closing_connections
+from .instrumentation import instrument
+from .pagination import InvalidCursorError, encode_cursor, decode_cursor
+from .tour_services import TOUR_CONTROLLER, DEPARTURE_CONTROLLER, AttrMinMax, AttrAggregate, DataPage
 
 
 def is_departure_exists(departure: str) -> bool:
@@ -14,7 +19,7 @@ def is_departure_exists(departure: str) -> bool:
     :param departure: departure id
     :return: True if exists, else False
     """
-    return bool(get_departures_data({'id': departure}))
+    return find_departure(departure) is not None
 
 
 def is_tour_exists(tour_id: int) -> bool:
@@ -23,17 +28,63 @@ def is_tour_exists(tour_id: int) -> bool:
     :param tour_id: tour id
     :return: True if exists, else False
     """
-    return bool(get_tours_data({'id': tour_id}))
+    return find_tour(tour_id) is not None
+
+
+@instrument()
+def find_departure(departure: str) -> Optional['Departure']:
+    """
+    The function returns departure by id in one lookup.
+    :param departure: departure id
+    :return: departure or None, if departure does not exist
+    """
+    return DEPARTURE_CONTROLLER.find(departure)
+
+
+@instrument()
+def find_tour(tour_id: int) -> Optional['Tour']:
+    """
+    The function returns tour by id in one lookup.
+    :param tour_id: tour id
+    :return: tour or None, if tour does not exist
+    """
+    return TOUR_CONTROLLER.find(tour_id)
+
+
+@instrument()
+def get_many_departures(departures: Iterable[str]) -> List['Departure']:
+    """
+    The function returns several departures by id.
+    :param departures: departures id
+    :return: departures in order of id, departures, which do not exist, are skipped
+    """
+    return DEPARTURE_CONTROLLER.get_many(departures)
 
 
-def get_min_max_attr_for_tours(tours: List['Tour'], *min_max_attributes: str) -> Dict[str, AttrMinMax]:
+@instrument()
+def get_many_tours(tour_ids: Iterable[int]) -> List['Tour']:
+    """
+    The function returns several tours by id.
+    :param tour_ids: tours id
+    :return: tours in order of id, tours, which do not exist, are skipped
+    """
+    return TOUR_CONTROLLER.get_many(tour_ids)
+
+
+@instrument()
+def get_min_max_attr_for_tours(
+        tours: List['Tour'], *min_max_attributes: str, tours_filter: dict = None
+) -> Dict[str, AttrMinMax]:
     """
     The function returns min and max attributes value for tours.
     :param tours: list of tours
     :param min_max_attributes: name of attributes
+    :param tours_filter: filter, which was used for select tours. It allows to take precomputed values.
     :return:
     """
-    result_min_max_attributes = TOUR_CONTROLLER.get_min_max_attr_for_data(tours, *min_max_attributes)
+    result_min_max_attributes = TOUR_CONTROLLER.get_min_max_attr_for_data(
+        tours, *min_max_attributes, data_filter=tours_filter
+    )
     return result_min_max_attributes
 
 
@@ -50,6 +101,7 @@ def get_main_data() -> dict:
     return title_data
 
 
+@instrument()
 def get_departures_data(departures_filter: list = None) -> List['Departure']:
     """
     The function returns departures.
@@ -59,6 +111,7 @@ def get_departures_data(departures_filter: list = None) -> List['Departure']:
     return DEPARTURE_CONTROLLER.get(departures_filter)
 
 
+@instrument()
 def get_tours_data(tours_filter: dict = None) -> List['Tour']:
     """
     The function returns tours.
@@ -66,3 +119,224 @@ def get_tours_data(tours_filter: dict = None) -> List['Tour']:
     :return: tour list
     """
     return TOUR_CONTROLLER.get(tours_filter)
+
+
+@instrument()
+def get_tours_page(number: int, size: int, tours_filter: dict = None, order_by: str = None) -> DataPage:
+    """
+    The function returns page of tours by number.
+    :param number: page number from 1
+    :param size: count of tours on page
+    :param tours_filter: filter for select tours
+    :param order_by: price, nights or stars, with minus for descending order (-price)
+    :return: page with tours and count of all tours, which are satisfied filter
+    :raises InvalidOrderingError: if tours can not be sorted by attribute
+    """
+    return TOUR_CONTROLLER.get_page_by_number(number, size, tours_filter, order_by)
+
+
+@instrument()
+def get_tours_json_page(
+        tours_filter: dict = None, cursor: str = None, limit: int = 20, order_by: str = None
+) -> Tuple[List[bytes], Optional[str]]:
+    """
+    The function returns page of tours as JSON fragments.
+    :param tours_filter: filter for select tours
+    :param cursor: cursor of the previous page
+    :param limit: count of tours on page
+    :param order_by: price, nights or stars, with minus for descending order (-price)
+    :return: JSON fragments of tours and cursor of the next page (None for the last page)
+    :raises InvalidCursorError: if cursor is damaged or its tour does not exist
+    :raises InvalidOrderingError: if tours can not be sorted by attribute
+    """
+    after = decode_cursor(cursor)[0] if cursor else None
+    try:
+        page = TOUR_CONTROLLER.get_page(tours_filter, after, limit, order_by)
+    except KeyError:
+        raise InvalidCursorError(f'Tour of cursor {cursor} does not exist')
+    next_cursor = encode_cursor([page.last_id]) if page.has_next else None
+    return page.get_json_fragments(), next_cursor
+
+
+@instrument()
+def get_tour_json(tour_id: int) -> Optional[bytes]:
+    """
+    The function returns tour as JSON fragment.
+    :param tour_id: tour id
+    :return: JSON fragment or None, if tour does not exist
+    """
+    fragments = TOUR_CONTROLLER.get_json_fragments([tour_id])
+    return fragments[0] if fragments else None
+
+
+@instrument()
+def get_departures_json() -> List[bytes]:
+    """
+    The function returns all departures as JSON fragments.
+    :return:
+    """
+    return DEPARTURE_CONTROLLER.get_json_fragments()
+
+
+@instrument()
+def get_tours_aggregates(dimension: str) -> Optional[Dict[Any, Dict[str, AttrAggregate]]]:
+    """
+    The function returns precomputed aggregates of tours for all values of dimension.
+    :param dimension: name of dimension, for example departure
+    :return: aggregates by dimension value or None, if dimension is not aggregated
+    """
+    return TOUR_CONTROLLER.get_dimension_aggregates(dimension)
+
+
+@instrument()
+def get_tours_by_specification(specification: 'Specification') -> List['Tour']:
+    """
+    The function returns tours, which are satisfied specification with AND (&), OR (|) and NOT (~) combinators.
+    :param specification: specification
+    :return: tour list
+    """
+    return TOUR_CONTROLLER.get_by_specification(specification)
+
+
+@instrument()
+def explain_tours_query(specification: 'Specification') -> str:
+    """
+    The function returns query plan of specification for tours with estimated cost.
+    :param specification: specification
+    :return:
+    """
+    return TOUR_CONTROLLER.explain(specification)
+
+
+@instrument()
+def search_tours(query: str, tours_filter: dict = None, limit: int = 20) -> DataPage:
+    """
+    The function returns the most relevant tours for full-text query by title, country and description.
+    :param query: text of query
+    :param tours_filter: filter, tours are searched among tours, which are satisfied filter
+    :param limit: count of tours
+    :return: page with tours in order of relevance and their scores
+    """
+    return TOUR_CONTROLLER.search(query, tours_filter, limit)
+
+
+@instrument()
+def complete_tours_query(prefix: str, limit: int = 10) -> List[str]:
+    """
+    The function returns words of tours texts for autocomplete of the last word of query.
+    :param prefix: beginning of query
+    :param limit: count of words
+    :return:
+    """
+    return TOUR_CONTROLLER.complete(prefix, limit)
+
+
+@instrument()
+def get_tours_facets(tours_filter: dict = None, facets: Iterable[str] = None) -> Dict[str, Dict]:
+    """
+    The function returns counts of tours by departure, country, stars and nights for tours, which are
+    satisfied filter.
+    :param tours_filter: filter for select tours
+    :param facets: attribute names, all attributes by default
+    :return: attribute name -> value -> count of tours
+    :raises UnknownFacetError: if tours can not be counted by attribute
+    """
+    return TOUR_CONTROLLER.get_facets(tours_filter, facets)
+
+
+def get_catalog_generations() -> Dict[str, int]:
+    """
+    The function returns numbers of current catalog data generations.
+    Generation is increased on every catalog reload.
+    :return:
+    """
+    return dict(
+        tours=TOUR_CONTROLLER.generation,
+        departures=DEPARTURE_CONTROLLER.generation
+    )
+
+
+# Async versions of api functions for async views. Lookups are run in thread pool (not in the single thread
+# of sync code), so independent lookups of view are executed concurrently and do not block event loop,
+# when catalog is read from backing store.
+
+def run_in_thread_pool(function: Callable) -> Callable:
+    """
+    The function returns async version of function, which is run in thread pool. Connections of database, which are
+    opened by function in thread of pool, are closed after call.
+    :param function: sync function
+    :return:
+    """
+    return sync_to_async(closing_connections(function), thread_sensitive=False)
+
+
+async def afind_departure(departure: str) -> Optional['Departure']:
+    """
+    Async version of find_departure.
+    :param departure: departure id
+    :return: departure or None, if departure does not exist
+    """
+    return await run_in_thread_pool(find_departure)(departure)
+
+
+async def afind_tour(tour_id: int) -> Optional['Tour']:
+    """
+    Async version of find_tour.
+    :param tour_id: tour id
+    :return: tour or None, if tour does not exist
+    """
+    return await run_in_thread_pool(find_tour)(tour_id)
+
+
+async def aget_min_max_attr_for_tours(
+        tours: List['Tour'], *min_max_attributes: str, tours_filter: dict = None
+) -> Dict[str, AttrMinMax]:
+    """
+    Async version of get_min_max_attr_for_tours.
+    :param tours: list of tours
+    :param min_max_attributes: name of attributes
+    :param tours_filter: filter, which was used for select tours
+    :return:
+    """
+    return await run_in_thread_pool(get_min_max_attr_for_tours)(
+        tours, *min_max_attributes, tours_filter=tours_filter
+    )
+
+
+async def aget_main_data() -> dict:
+    """
+    Async version of get_main_data.
+    :return:
+    """
+    return await run_in_thread_pool(get_main_data)()
+
+
+async def aget_departures_data(departures_filter: list = None) -> List['Departure']:
+    """
+    Async version of get_departures_data.
+    :param departures_filter: filter for select departure
+    :return:
+    """
+    return await run_in_thread_pool(get_departures_data)(departures_filter)
+
+
+async def aget_tours_data(tours_filter: dict = None) -> List['Tour']:
+    """
+    Async version of get_tours_data.
+    :param tours_filter: filter for select tour
+    :return: tour list
+    """
+    return await run_in_thread_pool(get_tours_data)(tours_filter)
+
+
+async def aget_tours_page(number: int, size: int, tours_filter: dict = None, order_by: str = None) -> DataPage:
+    """
+    Async version of get_tours_page.
+    :param number: page number from 1
+    :param size: count of tours on page
+    :param tours_filter: filter for select tours
+    :param order_by: attribute name for sorting, with minus for descending order
+    :return:
+    :raises InvalidOrderingError: if tours can not be sorted by attribute
+    """
+    return await run_in_thread_pool(get_tours_page)(number, size, tours_filter, order_by)
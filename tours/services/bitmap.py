@@ -0,0 +1,192 @@
+"""
+This module describes posting lists of inverted indexes as dense bitmaps over rows of data generation.
+Bit of row is set, if data of row has attribute value. Bitmap is kept in Python int, which stores bits
+in machine words, so AND, OR and NOT of postings are word-level operations of C loops, and posting of
+million rows takes 125 KB instead of tens of megabytes of set of data id.
+NumPy is optional dependency: with it rows of bitmap are extracted by vectorized unpacking of bits.
+"""
+
+__author__ = 'Artikov A.K.'
+
+from collections.abc import Mapping
+from typing import List, Iterable, Iterator, Hashable, Sequence, Set, Any, Dict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Positions of set bits of every byte
+BYTE_ROWS = tuple(tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256))
+
+
+class Bitmap:
+    """
+    Immutable set of row numbers, which is kept as bits of int.
+    """
+    __slots__ = ('bits', '_count')
+
+    def __init__(self, bits: int = 0):
+        self.bits = bits
+        self._count = None
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self._count = self.bits.bit_count()
+        return self._count
+
+    def __bool__(self) -> bool:
+        return self.bits != 0
+
+    def __contains__(self, row: int) -> bool:
+        return self.bits >> row & 1 == 1
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.get_rows())
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Bitmap) and self.bits == other.bits
+
+    def __hash__(self) -> int:
+        return hash(self.bits)
+
+    def __and__(self, other: 'Bitmap') -> 'Bitmap':
+        return Bitmap(self.bits & other.bits)
+
+    def __or__(self, other: 'Bitmap') -> 'Bitmap':
+        return Bitmap(self.bits | other.bits)
+
+    def __sub__(self, other: 'Bitmap') -> 'Bitmap':
+        return Bitmap(self.bits & ~other.bits)
+
+    def __repr__(self) -> str:
+        return f'Bitmap({len(self)} rows)'
+
+    def complement(self, size: int) -> 'Bitmap':
+        """
+        The method return rows from 0 to size, which are not in bitmap.
+        :param size: count of rows
+        :return:
+        """
+        return Bitmap(((1 << size) - 1) & ~self.bits)
+
+    def get_rows(self) -> List[int]:
+        """
+        The method return rows of bitmap in ascending order.
+        :return:
+        """
+        bits = self.bits
+        if not bits:
+            return []
+        # Length is rounded up to whole 64-bit words, so words are read without copy
+        data = bits.to_bytes((bits.bit_length() + 63) // 64 * 8, 'little')
+        if np is not None:
+            return np.flatnonzero(np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder='little')).tolist()
+
+        rows = []
+        for word_index, word in enumerate(memoryview(data).cast('Q')):
+            if not word:
+                continue
+            for byte_index in range(word_index * 8, word_index * 8 + 8):
+                byte = data[byte_index]
+                if byte:
+                    offset = byte_index * 8
+                    rows.extend(offset + bit for bit in BYTE_ROWS[byte])
+        return rows
+
+    def get_size_in_bytes(self) -> int:
+        """
+        The method return count of bytes, which are taken by bits of bitmap.
+        :return:
+        """
+        return (self.bits.bit_length() + 7) // 8
+
+    @classmethod
+    def construct_from_rows(cls, rows: Iterable[int]) -> 'Bitmap':
+        """
+        Create bitmap of rows. Bits are set in buffer from the least row, so bitmap of rows of the last chunk
+        of data does not allocate bytes for previous chunks.
+        :param rows: row numbers
+        :return:
+        """
+        rows = rows if isinstance(rows, (list, tuple, range)) else list(rows)
+        if not rows:
+            return cls()
+        offset = min(rows) & ~7
+        buffer = bytearray((max(rows) - offset) // 8 + 1)
+        for row in rows:
+            row -= offset
+            buffer[row >> 3] |= 1 << (row & 7)
+        return cls(int.from_bytes(buffer, 'little') << offset)
+
+    @classmethod
+    def construct_full(cls, size: int) -> 'Bitmap':
+        """
+        Create bitmap of rows from 0 to size.
+        :param size: count of rows
+        :return:
+        """
+        return cls((1 << size) - 1)
+
+
+EMPTY_BITMAP = Bitmap()
+
+
+class BitmapIndex(Mapping):
+    """
+    Inverted index attribute value -> set of data id, which keeps postings as bitmaps over rows of data.
+    Sets of data id are built on access, index lookups of controller take bitmaps by get_bitmap.
+    """
+    def __init__(self, keys: Sequence[Hashable]):
+        """
+        Initialisation index
+        :param keys: data id by row, data of generation are added to the same sequence
+        """
+        self._keys = keys
+        self._bitmaps: Dict[Any, Bitmap] = dict()
+
+    def __getitem__(self, value) -> Set[Hashable]:
+        keys = self._keys
+        return {keys[row] for row in self._bitmaps[value].get_rows()}
+
+    def __iter__(self) -> Iterator:
+        return iter(self._bitmaps)
+
+    def __len__(self) -> int:
+        return len(self._bitmaps)
+
+    def __contains__(self, value) -> bool:
+        return value in self._bitmaps
+
+    def get_bitmap(self, value) -> Bitmap:
+        """
+        The method return bitmap of rows with attribute value.
+        :param value: attribute value
+        :return:
+        """
+        return self._bitmaps.get(value, EMPTY_BITMAP)
+
+    def get_count(self, value) -> int:
+        """
+        The method return count of data id for value without building of posting set.
+        :param value: attribute value
+        :return:
+        """
+        return len(self._bitmaps.get(value, EMPTY_BITMAP))
+
+    def add(self, value, bitmap: Bitmap) -> None:
+        """
+        The method adds rows of bitmap to posting of value.
+        :param value: attribute value
+        :param bitmap: rows with attribute value
+        :return:
+        """
+        posting = self._bitmaps.get(value)
+        self._bitmaps[value] = bitmap if posting is None else posting | bitmap
+
+    def get_size_in_bytes(self) -> int:
+        """
+        The method return count of bytes, which are taken by bits of postings.
+        :return:
+        """
+        return sum(bitmap.get_size_in_bytes() for bitmap in self._bitmaps.values())
@@ -0,0 +1,251 @@
+"""
+This module describes columnar storage of tours. It keeps tour attributes in NumPy arrays,
+so filters are evaluated as boolean masks and aggregates as vectorized reductions.
+NumPy is optional dependency: without it columnar storage is not available.
+"""
+
+__author__ = 'Artikov A.K.'
+
+from typing import List, Dict, Iterable, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .specification import (
+    Specification, AndSpecification, OrSpecification, NotSpecification, DepartureSpecification, NightsSpecification,
+    CountrySpecification, StarsSpecification, RangeSpecification, get_date_key
+)
+from ..data_models import Tour
+
+
+def is_columnar_available() -> bool:
+    """
+    The function checks that NumPy is installed and columnar storage can be used.
+    :return:
+    """
+    return np is not None
+
+
+def get_stars_key(stars) -> Optional[int]:
+    """
+    The function returns key of stars in numeric column. Stars of catalog are strings of integer,
+    other values (for example 'many' or '05') are not equal to stars of any tour.
+    :param stars: stars of specification
+    :return: key or None, if value does not match any tour
+    """
+    if not isinstance(stars, str):
+        return None
+    try:
+        key = int(stars)
+    except ValueError:
+        return None
+    return key if str(key) == stars else None
+
+
+def get_nights_key(nights) -> Optional[float]:
+    """
+    The function returns key of nights in numeric column. Nights of catalog are integer, values of other types
+    are not equal to nights of any tour.
+    :param nights: nights of specification
+    :return: key or None, if value does not match any tour
+    """
+    return nights if isinstance(nights, (int, float)) else None
+
+
+# Functions, which return keys of numeric columns for values of specifications
+NUMERIC_KEYS = {'nights': get_nights_key, 'stars': get_stars_key}
+
+
+class CategoricalColumn:
+    """
+    Dictionary encoded column: every value is kept as code of category.
+    """
+    def __init__(self, values: Iterable[str] = ()):
+        self.categories = []
+        self.category_codes = dict()
+        self.codes = np.array([], dtype=np.int32)
+        self.extend(values)
+
+    def extend(self, values: Iterable[str]) -> None:
+        """
+        The method adds values to the end of column.
+        :param values: category values
+        :return:
+        """
+        codes = []
+        for value in values:
+            code = self.category_codes.get(value)
+            if code is None:
+                code = len(self.categories)
+                self.category_codes[value] = code
+                self.categories.append(value)
+            codes.append(code)
+        self.codes = np.concatenate((self.codes, np.array(codes, dtype=np.int32)))
+
+    def get_mask(self, value) -> 'np.ndarray':
+        """
+        The method return mask of rows with value (or one of values for list).
+        :param value: category value or list of values
+        :return:
+        """
+        values = value if isinstance(value, list) else [value]
+        codes = [self.category_codes[current] for current in values if current in self.category_codes]
+        if len(codes) == 1:
+            return self.codes == codes[0]
+        return np.isin(self.codes, codes)
+
+
+class ColumnarTourStore:
+    """
+    Columnar storage of tours. Rows keep order of tours, which were used for initialisation.
+    """
+    def __init__(self, tours: Iterable[Tour]):
+        """
+        Initialisation storage
+        :param tours: tours
+        """
+        if np is None:
+            raise Exception('Columnar storage requires numpy')
+        self.tours = []
+        self.ids = np.array([], dtype=np.int64)
+        self.numeric_columns = {
+            'price': np.array([], dtype=np.int64),
+            'nights': np.array([], dtype=np.int32),
+            'stars': np.array([], dtype=np.int8),
+            'date': np.array([], dtype=np.int32),
+        }
+        self.categorical_columns = {
+            'departure': CategoricalColumn(),
+            'country': CategoricalColumn(),
+        }
+        self.extend(tours)
+
+    def extend(self, tours: Iterable[Tour]) -> None:
+        """
+        The method adds tours to the end of storage.
+        :param tours: tours
+        :return:
+        """
+        tours = list(tours)
+        if not tours:
+            return
+        count = len(tours)
+        new_columns = {
+            'price': np.array([tour.price for tour in tours]),
+            'nights': np.fromiter((tour.nights for tour in tours), dtype=np.int32, count=count),
+            'stars': np.fromiter((int(tour.stars) for tour in tours), dtype=np.int8, count=count),
+            'date': np.fromiter((get_date_key(tour.date) for tour in tours), dtype=np.int32, count=count),
+        }
+        self.ids = np.concatenate((self.ids, np.fromiter((tour.id for tour in tours), dtype=np.int64, count=count)))
+        for attr_name, column in new_columns.items():
+            self.numeric_columns[attr_name] = np.concatenate((self.numeric_columns[attr_name], column))
+        self.categorical_columns['departure'].extend(tour.departure for tour in tours)
+        self.categorical_columns['country'].extend(tour.country for tour in tours)
+        self.tours.extend(tours)
+
+    def __len__(self) -> int:
+        return len(self.tours)
+
+    def get_mask(self, specification: Optional[Specification]) -> 'np.ndarray':
+        """
+        The method compiles specification to boolean mask of rows.
+        Specifications without columnar representation are checked for every tour.
+        :param specification: specification
+        :return:
+        """
+        if specification is None:
+            return np.ones(len(self.tours), dtype=bool)
+        if isinstance(specification, AndSpecification):
+            mask = self.get_mask(specification.specifications[0])
+            for child_specification in specification.specifications[1:]:
+                mask &= self.get_mask(child_specification)
+            return mask
+        if isinstance(specification, OrSpecification):
+            mask = self.get_mask(specification.specifications[0])
+            for child_specification in specification.specifications[1:]:
+                mask |= self.get_mask(child_specification)
+            return mask
+        if isinstance(specification, NotSpecification):
+            return ~self.get_mask(specification.specification)
+        if isinstance(specification, DepartureSpecification):
+            return self.categorical_columns['departure'].get_mask(specification.departure)
+        if isinstance(specification, CountrySpecification):
+            return self.categorical_columns['country'].get_mask(specification.country)
+        if isinstance(specification, NightsSpecification):
+            return self._get_numeric_mask('nights', specification.nights)
+        if isinstance(specification, StarsSpecification):
+            return self._get_numeric_mask('stars', specification.stars)
+        if isinstance(specification, RangeSpecification) and specification.attr_name in self.numeric_columns:
+            return self._get_range_mask(specification)
+        return np.fromiter(
+            (specification.is_satisfied(tour) for tour in self.tours), dtype=bool, count=len(self.tours)
+        )
+
+    def filter(self, specification: Optional[Specification]) -> List[Tour]:
+        """
+        The method return tours, which satisfied specification
+        :param specification: specification
+        :return:
+        """
+        return self.get_tours(self.get_mask(specification))
+
+    def get_tours(self, mask: 'np.ndarray') -> List[Tour]:
+        """
+        The method return tours for rows of mask
+        :param mask: boolean mask of rows
+        :return:
+        """
+        tours = self.tours
+        return [tours[row] for row in np.flatnonzero(mask).tolist()]
+
+    def get_min_max(self, mask: 'np.ndarray', *attr_names: str) -> Dict[str, tuple]:
+        """
+        The method return min and max values of numeric attributes for rows of mask.
+        :param mask: boolean mask of rows
+        :param attr_names: attribute names
+        :return: attribute name -> (min, max), values are None for empty mask
+        """
+        result = dict()
+        has_rows = bool(mask.any())
+        for attr_name in attr_names:
+            if not has_rows:
+                result[attr_name] = (None, None)
+                continue
+            column = self.numeric_columns[attr_name][mask]
+            result[attr_name] = (column.min().item(), column.max().item())
+        return result
+
+    @staticmethod
+    def count(mask: 'np.ndarray') -> int:
+        """
+        The method return count of rows in mask
+        :param mask: boolean mask of rows
+        :return:
+        """
+        return int(np.count_nonzero(mask))
+
+    def _get_numeric_mask(self, attr_name: str, value) -> 'np.ndarray':
+        """
+        Return mask of rows with value (or one of values for list). Values, which have no key in column,
+        are skipped, so mask of them is empty.
+        :param attr_name: name of numeric attribute
+        :param value: value or list of values of specification
+        :return:
+        """
+        get_key = NUMERIC_KEYS[attr_name]
+        keys = [key for key in map(get_key, value if isinstance(value, list) else [value]) if key is not None]
+        column = self.numeric_columns[attr_name]
+        if len(keys) == 1:
+            return column == keys[0]
+        return np.isin(column, keys)
+
+    def _get_range_mask(self, specification: RangeSpecification) -> 'np.ndarray':
+        column = self.numeric_columns[specification.attr_name]
+        mask = np.ones(len(column), dtype=bool)
+        if specification.lower is not None:
+            mask &= column >= specification.lower if specification.include_lower else column > specification.lower
+        if specification.upper is not None:
+            mask &= column <= specification.upper if specification.include_upper else column < specification.upper
+        return mask
@@ -0,0 +1,383 @@
+"""
+This module describes storage of tours catalog in database by Django ORM. Specifications are translated
+to WHERE clauses over indexed columns, min, max, aggregates and counts are computed by SQL, catalog is imported
+by bulk_create in batches. SQLite connections are switched to WAL mode, so readers are not blocked by import.
+"""
+
+__author__ = 'Artikov A.K.'
+
+import random
+import sys
+import threading
+from functools import wraps
+from itertools import islice
+from typing import List, Dict, Iterable, Iterator, Tuple, Hashable, Optional, Any, Type, Callable
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models import Q, Count, Sum, Min, Max, IntegerField
+from django.db.models.functions import Cast
+
+from .sources import CatalogSource
+from .specification import (
+    Specification, AndSpecification, OrSpecification, NotSpecification, ValueSpecification, RangeSpecification,
+    get_date_key
+)
+from ..data_models import Tour, Departure
+from ..models import TourRecord, DepartureRecord
+
+SQLITE_PRAGMAS = getattr(settings, 'TOURS_SQLITE_PRAGMAS', {
+    'journal_mode': 'WAL',
+    # In WAL mode commit is durable after checkpoint, it is enough for catalog, which can be imported again
+    'synchronous': 'NORMAL',
+})
+# Range lookups of attributes are done by columns with sortable keys
+KEY_COLUMNS = {'date': 'date_key'}
+# Sorting of string attributes by number
+ORDER_EXPRESSIONS = {'stars': Cast('stars', IntegerField())}
+TOUR_FIELDS = ('id', 'title', 'description', 'departure', 'picture', 'price', 'stars', 'country', 'nights', 'date')
+
+
+class SqlTranslationError(Exception):
+    """
+    Specification can not be translated to SQL.
+    """
+    pass
+
+
+def configure_connection(sender, connection, **kwargs) -> None:
+    """
+    The function sets pragmas of new SQLite connection. It is receiver of connection_created signal.
+    :param sender: database wrapper class
+    :param connection: new connection
+    :return:
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def closing_connections(function: Callable) -> Callable:
+    """
+    The function decorates function, which is run in thread pool: connections, which are opened by function,
+    are closed after every call. Threads of pool are not finished by request signals, so connections of
+    CONN_MAX_AGE would be kept by every thread of pool.
+    :param function: function with ORM queries
+    :return:
+    """
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+    return wrapper
+
+
+def get_query(specification: Optional[Specification]) -> Q:
+    """
+    The function translates specification tree to condition of ORM query.
+    :param specification: specification or None for all data
+    :return:
+    :raises SqlTranslationError: if specification has no translation
+    """
+    if specification is None:
+        return Q()
+    if isinstance(specification, (AndSpecification, OrSpecification)):
+        queries = [get_query(child) for child in specification.get_specifications()]
+        query = queries[0] if queries else Q()
+        for child_query in queries[1:]:
+            query = query & child_query if isinstance(specification, AndSpecification) else query | child_query
+        return query
+    if isinstance(specification, NotSpecification):
+        return ~get_query(specification.specification)
+    if isinstance(specification, ValueSpecification):
+        values = specification.get_values()
+        if len(values) == 1:
+            return Q(**{specification.attr_name: values[0]})
+        return Q(**{f'{specification.attr_name}__in': values})
+    if isinstance(specification, RangeSpecification):
+        column = KEY_COLUMNS.get(specification.attr_name, specification.attr_name)
+        lookups = dict()
+        if specification.lower is not None:
+            lookups[f'{column}__{"gte" if specification.include_lower else "gt"}'] = specification.lower
+        if specification.upper is not None:
+            lookups[f'{column}__{"lte" if specification.include_upper else "lt"}'] = specification.upper
+        return Q(**lookups)
+    raise SqlTranslationError(f'Specification {type(specification).__name__} can not be translated to SQL')
+
+
+def get_order_by(order_by: Optional[str]) -> list:
+    """
+    The function returns ORDER BY expressions for sorting by attribute, data with equal keys are in catalog order.
+    :param order_by: attribute name for sorting, with minus for descending order
+    :return:
+    """
+    if order_by is None:
+        return ['position']
+    attr_name = order_by.lstrip('-')
+    expression = ORDER_EXPRESSIONS.get(attr_name, models.F(attr_name))
+    expression = expression.desc() if order_by.startswith('-') else expression.asc()
+    return [expression, 'position']
+
+
+def get_price(price):
+    """
+    The function returns whole price of float column as int, as it is in catalog records.
+    :param price: price or other value of aggregate
+    :return:
+    """
+    return int(price) if isinstance(price, float) and price.is_integer() else price
+
+
+def construct_tours(rows: Iterable[tuple]) -> List[Tour]:
+    """
+    The function returns tours from rows of TOUR_FIELDS. Strings with repeated values are interned as in
+    data models, which are built from catalog sources.
+    :param rows: rows of tours table
+    :return:
+    """
+    intern = sys.intern
+    return [
+        Tour(
+            id=tour_id, title=title, description=description, departure=intern(departure), picture=picture,
+            price=get_price(price), stars=intern(stars), country=intern(country), nights=nights, date=intern(date),
+        )
+        for tour_id, title, description, departure, picture, price, stars, country, nights, date in rows
+    ]
+
+
+class DatabaseTourStore:
+    """
+    Tours in table of database.
+    """
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        """
+        Initialisation store
+        :param using: alias of database
+        """
+        self.using = using
+
+    def get_queryset(self, specification: Optional[Specification] = None) -> models.QuerySet:
+        """
+        The method return query of tours, which are satisfied specification.
+        :param specification: specification or None for all tours
+        :return:
+        """
+        return TourRecord.objects.using(self.using).filter(get_query(specification))
+
+    def count(self, specification: Optional[Specification] = None) -> int:
+        return self.get_queryset(specification).count()
+
+    def filter(self, specification: Optional[Specification] = None) -> List[Tour]:
+        """
+        The method return tours, which are satisfied specification, in catalog order.
+        :param specification: specification or None for all tours
+        :return:
+        """
+        return construct_tours(self.get_queryset(specification).order_by('position').values_list(*TOUR_FIELDS))
+
+    def get_many(self, tour_ids: Iterable[Hashable]) -> Dict[Hashable, Tour]:
+        """
+        The method return tours by id in one query.
+        :param tour_ids: tours id
+        :return: tours by id, tours, which do not exist, are skipped
+        """
+        rows = self.get_queryset().filter(id__in=list(tour_ids)).values_list(*TOUR_FIELDS)
+        return {tour.id: tour for tour in construct_tours(rows)}
+
+    def get_page(
+            self, specification: Optional[Specification], order_by: Optional[str], start: int, size: int
+    ) -> Tuple[List[Tour], int]:
+        """
+        The method return sorted tours from start by LIMIT and OFFSET and count of tours, which are satisfied
+        specification.
+        :param specification: specification or None for all tours
+        :param order_by: attribute name for sorting, with minus for descending order
+        :param start: index of the first tour
+        :param size: count of tours
+        :return:
+        """
+        queryset = self.get_queryset(specification)
+        rows = queryset.order_by(*get_order_by(order_by)).values_list(*TOUR_FIELDS)[start:start + size]
+        return construct_tours(rows), queryset.count()
+
+    def sample(self, specification: Optional[Specification], count: int) -> List[Tour]:
+        """
+        The method return random tours without repeats. Positions (or id of tours, which are satisfied
+        specification) are sampled as in controller, tours are read by index, table is not sorted by random key.
+        :param specification: specification or None for all tours
+        :param count: count of tours
+        :return:
+        """
+        queryset = self.get_queryset(specification)
+        if specification is None:
+            # Positions of imported catalog are 0..n-1
+            size = queryset.count()
+            positions = random.sample(range(size), min(count, size))
+            rows = list(queryset.filter(position__in=positions).values_list('position', *TOUR_FIELDS))
+            tours = dict(zip((row[0] for row in rows), construct_tours(row[1:] for row in rows)))
+            return [tours[position] for position in positions if position in tours]
+        tour_ids = list(queryset.values_list('id', flat=True))
+        tour_ids = random.sample(tour_ids, min(count, len(tour_ids)))
+        tours = self.get_many(tour_ids)
+        return [tours[tour_id] for tour_id in tour_ids if tour_id in tours]
+
+    def get_min_max(self, specification: Optional[Specification], *attr_names: str) -> Dict[str, tuple]:
+        """
+        The method return min and max of attributes for tours, which are satisfied specification, in one query.
+        :param specification: specification or None for all tours
+        :param attr_names: attribute names
+        :return: attribute name -> (min, max)
+        """
+        values = self.get_queryset(specification).aggregate(**{
+            f'{attr_name}__{function.name.lower()}': function(attr_name)
+            for attr_name in attr_names for function in (Min, Max)
+        })
+        return {
+            attr_name: (get_price(values[f'{attr_name}__min']), get_price(values[f'{attr_name}__max']))
+            for attr_name in attr_names
+        }
+
+    def get_aggregates(
+            self, dimension: str, attr_names: Tuple[str, ...], specification: Optional[Specification] = None
+    ) -> Dict[Any, Dict[str, tuple]]:
+        """
+        The method return count, sum, min and max of attributes for every value of dimension by GROUP BY.
+        :param dimension: attribute name for grouping
+        :param attr_names: names of aggregated attributes
+        :param specification: specification or None for all tours
+        :return: dimension value -> attribute name -> (count, sum, min, max)
+        """
+        functions = {'count': Count('id')}
+        for attr_name in attr_names:
+            functions.update({
+                f'{attr_name}__sum': Sum(attr_name), f'{attr_name}__min': Min(attr_name),
+                f'{attr_name}__max': Max(attr_name),
+            })
+        rows = self.get_queryset(specification).order_by().values(dimension).annotate(**functions)
+        return {
+            row[dimension]: {
+                attr_name: (row['count'], *(
+                    get_price(row[f'{attr_name}__{function}']) for function in ('sum', 'min', 'max')
+                ))
+                for attr_name in attr_names
+            }
+            for row in rows
+        }
+
+    def count_by(self, specification: Optional[Specification], attr_name: str) -> Dict[Any, int]:
+        """
+        The method return count of tours for every value of attribute by GROUP BY.
+        :param specification: specification or None for all tours
+        :param attr_name: attribute name
+        :return: value -> count in order of count
+        """
+        rows = self.get_queryset(specification).order_by().values_list(attr_name).annotate(count=Count('id'))
+        return dict(sorted(rows, key=lambda row: -row[1]))
+
+    def explain(self, specification: Optional[Specification]) -> str:
+        """
+        The method return SQL of specification query and its plan.
+        :param specification: specification
+        :return:
+        """
+        queryset = self.get_queryset(specification).order_by('position').values_list('id')
+        return f'{queryset.query}\n{queryset.explain()}'
+
+
+class DatabaseSource(CatalogSource):
+    """
+    Source for catalog table. Records are read in catalog order by chunks of database cursor.
+    """
+    # Tables can not exist on import, for example before migrate
+    deferred_loading = True
+
+    def __init__(self, model: Type[models.Model], field_names: Tuple[str, ...], order_by: str = 'pk',
+                 using: str = DEFAULT_DB_ALIAS, chunk_size: int = 2000):
+        """
+        Initialisation source
+        :param model: model of catalog table
+        :param field_names: fields of record without primary key
+        :param order_by: field of catalog order
+        :param using: alias of database
+        :param chunk_size: count of rows, which are fetched by cursor at once
+        """
+        self.model = model
+        self.field_names = field_names
+        self.order_by = order_by
+        self.using = using
+        self.chunk_size = chunk_size
+
+    def iter_records(self) -> Iterator[Tuple[Hashable, dict]]:
+        field_names = self.field_names
+        rows = self.model.objects.using(self.using).order_by(self.order_by).values_list('pk', *field_names)
+        try:
+            for row in rows.iterator(chunk_size=self.chunk_size):
+                record = dict(zip(field_names, row[1:]))
+                if 'price' in record:
+                    record['price'] = get_price(record['price'])
+                yield row[0], record
+        finally:
+            # Connection of loader thread is not closed by request signals
+            if threading.current_thread() is not threading.main_thread():
+                connections[self.using].close()
+
+
+def get_tours_source(using: str = DEFAULT_DB_ALIAS) -> DatabaseSource:
+    return DatabaseSource(TourRecord, TOUR_FIELDS[1:], order_by='position', using=using)
+
+
+def get_departures_source(using: str = DEFAULT_DB_ALIAS) -> DatabaseSource:
+    return DatabaseSource(DepartureRecord, ('city_departure', ), using=using)
+
+
+def import_tours(records: Iterable[Tuple[Hashable, dict]], batch_size: int = 1000,
+                 using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    The function replaces tours of database by catalog records in one transaction. Records are validated
+    by data model and inserted by bulk_create in batches.
+    :param records: pairs of tour id and record in format of data.tours
+    :param batch_size: count of records in batch
+    :param using: alias of database
+    :return: count of imported tours
+    :raises CatalogValidationError: if some records are invalid
+    """
+    records = iter(records)
+    count = 0
+    with transaction.atomic(using=using):
+        TourRecord.objects.using(using).all().delete()
+        while True:
+            tours = Tour.construct_many(islice(records, batch_size))
+            if not tours:
+                return count
+            TourRecord.objects.using(using).bulk_create([
+                TourRecord(
+                    position=count + position, date_key=get_date_key(tour.date),
+                    **{field_name: getattr(tour, field_name) for field_name in TOUR_FIELDS}
+                )
+                for position, tour in enumerate(tours.values())
+            ], batch_size=batch_size)
+            count += len(tours)
+
+
+def import_departures(records: Iterable[Tuple[Hashable, Any]], using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    The function replaces departures of database by catalog records in one transaction.
+    :param records: pairs of departure id and record or city name in format of data.departures
+    :param using: alias of database
+    :return: count of imported departures
+    """
+    departures = Departure.construct_many(
+        (departure_id, record if isinstance(record, dict) else {'city_departure': record})
+        for departure_id, record in records
+    )
+    with transaction.atomic(using=using):
+        DepartureRecord.objects.using(using).all().delete()
+        DepartureRecord.objects.using(using).bulk_create(
+            [DepartureRecord(**departure.as_dict()) for departure in departures.values()]
+        )
+    return len(departures)
@@ -0,0 +1,125 @@
+"""
+This module describes counts of data by attribute values (facets) for data, which are selected by filter.
+Counts are computed in one pass over selected data or by intersections of selected data id with postings of
+inverted indexes, results are cached by normalized filter.
+"""
+
+__author__ = 'Artikov A.K.'
+
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Any, Iterable, Tuple, Hashable, Optional, Set, Mapping
+
+from .bitmap import Bitmap, BitmapIndex
+
+# Intersection of sets is done by C loop, it is cheaper than check of attribute of data in Python loop
+INTERSECTION_COST = 0.1
+
+
+class UnknownFacetError(Exception):
+    """
+    Data can not be counted by attribute.
+    """
+    pass
+
+
+def normalize_filter(data_filter: Optional[dict]) -> tuple:
+    """
+    The function returns hashable filter, which does not depend on order of keys and values of lists.
+    Bounds of range lookups keep their order.
+    :param data_filter: filter
+    :return:
+    """
+    if not data_filter:
+        return ()
+    items = []
+    for name, value in data_filter.items():
+        if isinstance(value, list):
+            value = tuple(value) if '__' in name else tuple(sorted(set(value), key=repr))
+        items.append((name, value))
+    return tuple(sorted(items, key=lambda item: item[0]))
+
+
+def count_by_pass(items: Iterable, facets: Tuple[str, ...]) -> Dict[str, Counter]:
+    """
+    The function counts values of attributes in one pass over data.
+    :param items: data
+    :param facets: attribute names
+    :return: attribute name -> value -> count
+    """
+    counters = {facet: Counter() for facet in facets}
+    counter_items = tuple(counters.items())
+    for item in items:
+        for facet, counter in counter_items:
+            counter[getattr(item, facet)] += 1
+    return counters
+
+
+def count_by_intersection(selected_ids: Set[Hashable], index: Mapping[Any, Iterable[Hashable]]) -> Counter:
+    """
+    The function counts data of every value of inverted index among selected data.
+    :param selected_ids: id of selected data
+    :param index: inverted index value -> data id
+    :return: value -> count
+    """
+    counter = Counter()
+    for value, posting in index.items():
+        count = len(selected_ids.intersection(posting))
+        if count:
+            counter[value] = count
+    return counter
+
+
+def count_by_bitmaps(selected: Bitmap, index: BitmapIndex) -> Counter:
+    """
+    The function counts data of every value of bitmap index among selected rows by AND of bitmaps.
+    :param selected: bitmap of selected rows
+    :param index: bitmap index
+    :return: value -> count
+    """
+    counter = Counter()
+    for value in index:
+        count = len(selected & index.get_bitmap(value))
+        if count:
+            counter[value] = count
+    return counter
+
+
+def estimate_intersection_cost(selected_count: int, index: Mapping[Any, Any]) -> float:
+    """
+    The function returns estimated cost of count by intersection in checks of attribute.
+    :param selected_count: count of selected data
+    :param index: inverted index
+    :return:
+    """
+    get_count = getattr(index, 'get_count', None)
+    if get_count is not None:
+        return INTERSECTION_COST * sum(min(get_count(value), selected_count) for value in index)
+    return INTERSECTION_COST * sum(min(len(posting), selected_count) for posting in index.values())
+
+
+class FacetCache:
+    """
+    LRU cache of facet counts by normalized filter.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Dict[Any, int]]]:
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is not None:
+                self._counts.move_to_end(key)
+            return counts
+
+    def set(self, key: Hashable, counts: Dict[str, Dict[Any, int]]) -> None:
+        with self._lock:
+            self._counts[key] = counts
+            self._counts.move_to_end(key)
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
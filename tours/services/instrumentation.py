@@ -0,0 +1,312 @@
+"""
+This module describes instrumentation of request path: stages of request (filter, specification, min/max, render,
+api functions) are timed, counts of scanned and returned items are recorded, values are collected in histograms
+of process and rendered in Prometheus text format. Sampling profiler collects stacks of request in folded
+format (one line per stack with count of samples), which is input of flamegraph.pl and speedscope.
+"""
+
+__author__ = 'Artikov A.K.'
+
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List, Tuple, Optional, Callable
+
+# Upper bounds of histogram buckets: seconds of stages and counts of items
+SECONDS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ITEMS_BUCKETS = (0, 1, 10, 30, 100, 300, 1000, 3000, 10000, 30000, 100000, 300000, 1000000)
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets, sum and count of observed values.
+    """
+    def __init__(self, buckets: Tuple[float, ...]):
+        """
+        Initialisation histogram
+        :param buckets: sorted upper bounds of buckets, bucket +Inf is added
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """
+        The method adds value to the first bucket, which upper bound is not less than value.
+        :param value: observed value
+        :return:
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def get_cumulative_counts(self) -> List[Tuple[str, int]]:
+        """
+        The method return pairs of bucket bound and count of values, which are not greater than bound.
+        :return:
+        """
+        with self._lock:
+            counts = list(self.counts)
+        result, total = [], 0
+        for bound, count in zip([*(format_value(bound) for bound in self.buckets), '+Inf'], counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class MetricsRegistry:
+    """
+    Histograms of process by metric name and labels.
+    """
+    def __init__(self):
+        self._metrics: Dict[str, Tuple[str, Tuple[float, ...], Dict[tuple, Histogram]]] = dict()
+        self._lock = threading.Lock()
+
+    def register(self, name: str, description: str, buckets: Tuple[float, ...]) -> None:
+        """
+        The method registers histogram metric.
+        :param name: metric name
+        :param description: help text
+        :param buckets: upper bounds of buckets
+        :return:
+        """
+        self._metrics[name] = (description, buckets, dict())
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        The method adds value to histogram of metric with labels.
+        :param name: metric name
+        :param value: observed value
+        :param labels: labels of histogram
+        :return:
+        """
+        _, buckets, histograms = self._metrics[name]
+        key = tuple(sorted(labels.items()))
+        histogram = histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = histograms.setdefault(key, Histogram(buckets))
+        histogram.observe(value)
+
+    def render(self) -> str:
+        """
+        The method return all histograms in Prometheus text format.
+        :return:
+        """
+        lines = []
+        for name, (description, _, histograms) in self._metrics.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} histogram')
+            for key, histogram in sorted(histograms.copy().items()):
+                labels = ','.join(f'{label}="{escape_label(value)}"' for label, value in key)
+                for bound, count in histogram.get_cumulative_counts():
+                    lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{{labels}}} {format_value(histogram.sum)}')
+                lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.register('tours_request_seconds', 'Duration of requests by view.', SECONDS_BUCKETS)
+REGISTRY.register('tours_stage_seconds', 'Duration of request stages.', SECONDS_BUCKETS)
+REGISTRY.register('tours_stage_scanned_items', 'Count of items, which are checked by stage.', ITEMS_BUCKETS)
+REGISTRY.register('tours_stage_returned_items', 'Count of items, which are returned by stage.', ITEMS_BUCKETS)
+
+
+class RequestTrace:
+    """
+    Durations of stages of one request.
+    """
+    __slots__ = ('stages', )
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float]] = []
+
+    def get_server_timing(self) -> str:
+        """
+        The method return value of Server-Timing header with summary duration of every stage in milliseconds.
+        :return:
+        """
+        durations = Counter()
+        for name, duration in self.stages:
+            durations[name] += duration
+        return ', '.join(f'{name};dur={duration * 1000:.3f}' for name, duration in durations.items())
+
+
+class Stage:
+    """
+    Timer of request stage. Counts of items are set by stage code or by nested code through add_scanned.
+    """
+    __slots__ = ('name', 'scanned', 'returned', '_start', '_token')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.scanned = None
+        self.returned = None
+
+    def __enter__(self) -> 'Stage':
+        self._token = _current_stage.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        duration = time.perf_counter() - self._start
+        _current_stage.reset(self._token)
+        REGISTRY.observe('tours_stage_seconds', duration, stage=self.name)
+        if self.scanned is not None:
+            REGISTRY.observe('tours_stage_scanned_items', self.scanned, stage=self.name)
+        if self.returned is not None:
+            REGISTRY.observe('tours_stage_returned_items', self.returned, stage=self.name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.stages.append((self.name, duration))
+
+
+# Context of request is copied to threads of sync_to_async, so stages of api functions are added to request trace
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar('tours_request_trace', default=None)
+_current_stage: ContextVar[Optional[Stage]] = ContextVar('tours_stage', default=None)
+
+
+def stage(name: str) -> Stage:
+    """
+    The function returns context manager, which times stage of request.
+    :param name: stage name
+    :return:
+    """
+    return Stage(name)
+
+
+def add_scanned(count: int) -> None:
+    """
+    The function adds count of checked items to current stage.
+    :param count: count of items
+    :return:
+    """
+    current_stage = _current_stage.get()
+    if current_stage is not None:
+        current_stage.scanned = (current_stage.scanned or 0) + count
+
+
+def get_item_count(result) -> Optional[int]:
+    """
+    The function returns count of items in result of function: list or page with items.
+    :param result: result of function
+    :return: count or None, if result is not list of items
+    """
+    items = getattr(result, 'items', result)
+    return len(items) if isinstance(items, list) else None
+
+
+def instrument(name: str = None) -> Callable:
+    """
+    The decorator times function as request stage and records count of returned items.
+    :param name: stage name, name of function by default
+    :return:
+    """
+    def decorator(func: Callable) -> Callable:
+        stage_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with Stage(stage_name) as current_stage:
+                result = func(*args, **kwargs)
+                current_stage.returned = get_item_count(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def start_trace() -> Tuple[RequestTrace, object]:
+    """
+    The function starts trace of request in current context.
+    :return: trace and token for finish_trace
+    """
+    trace = RequestTrace()
+    return trace, _current_trace.set(trace)
+
+
+def finish_trace(token) -> None:
+    _current_trace.reset(token)
+
+
+class SamplingProfiler:
+    """
+    Profiler, which takes stacks of threads by timer. Only stacks with frames of project are kept, so idle
+    threads of server and thread pool are skipped, in async server stacks of concurrent requests can be sampled too.
+    """
+    def __init__(self, interval: float, root: str, thread_id: int = None):
+        """
+        Initialisation profiler
+        :param interval: interval between samples in seconds
+        :param root: directory of project, frames of its files are marked as project frames
+        :param thread_id: id of sampled thread, all threads by default
+        """
+        self.interval = interval
+        self.root = root
+        self.thread_id = thread_id
+        self.samples = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='SamplingProfiler', daemon=True)
+
+    def __enter__(self) -> 'SamplingProfiler':
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def get_folded_stacks(self) -> str:
+        """
+        The method return stacks in folded format: frames from root to leaf are separated by semicolon,
+        count of samples follows stack.
+        :return:
+        """
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+    def _run(self) -> None:
+        own_thread_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id or (self.thread_id is not None and thread_id != self.thread_id):
+                    continue
+                stack = self._get_stack(frame)
+                if stack is not None:
+                    self.samples[stack] += 1
+
+    def _get_stack(self, frame) -> Optional[str]:
+        frames, in_project = [], False
+        while frame is not None:
+            code = frame.f_code
+            in_project = in_project or code.co_filename.startswith(self.root)
+            frames.append(f'{code.co_name} ({shorten_path(code.co_filename)})')
+            frame = frame.f_back
+        return ';'.join(reversed(frames)) if in_project else None
+
+
+def shorten_path(path: str) -> str:
+    """
+    The function returns path of module from package directory.
+    :param path: file path
+    :return:
+    """
+    for prefix in sorted(filter(None, sys.path), key=len, reverse=True):
+        if path.startswith(prefix):
+            return path[len(prefix):].lstrip('/\\')
+    return path
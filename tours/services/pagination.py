@@ -0,0 +1,55 @@
+"""
+This module describes cursors of keyset pagination. Cursor keeps key of the last item of page,
+so next page is found by key without skipping of previous pages.
+"""
+
+__author__ = 'Artikov A.K.'
+
+import base64
+import binascii
+import json
+from typing import List
+
+# Types of keys in cursor, keys are looked up in indexes of data, so they should be hashable scalars
+KEY_TYPES = (int, float, str)
+
+
+class InvalidCursorError(Exception):
+    """
+    Cursor is damaged or it points to data, which do not exist in catalog anymore.
+    """
+    pass
+
+
+class InvalidOrderingError(Exception):
+    """
+    Data can not be sorted by attribute.
+    """
+    pass
+
+
+def encode_cursor(keys: list) -> str:
+    """
+    The function encodes keys of the last item of page to opaque cursor.
+    :param keys: keys of item, for example tour id
+    :return:
+    """
+    return base64.urlsafe_b64encode(json.dumps(keys, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> List:
+    """
+    The function decodes keys of item from cursor.
+    :param cursor: cursor
+    :return:
+    :raises InvalidCursorError: if cursor is damaged or its keys are not scalars
+    """
+    try:
+        keys = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, binascii.Error):
+        raise InvalidCursorError(f'Cursor {cursor} is damaged')
+    if not isinstance(keys, list) or not keys:
+        raise InvalidCursorError(f'Cursor {cursor} is damaged')
+    if not all(isinstance(key, KEY_TYPES) and not isinstance(key, bool) for key in keys):
+        raise InvalidCursorError(f'Cursor {cursor} is damaged')
+    return keys
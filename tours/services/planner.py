@@ -0,0 +1,453 @@
+"""
+This module describes planner of specification queries. Planner rewrites specification tree (NOT is pushed down
+to leaves, IN specifications of one attribute are merged) and chooses for every node, whether it is answered
+from inverted index or sorted column of controller or by scan of data. Cost of plan is estimated in count of
+processed data id: index lookup costs count of found id, scan costs count of checked data multiplied by SCAN_COST.
+Plan is executed on sets of data id or, if inverted indexes keep bitmaps, on bitmaps of rows of data.
+"""
+
+__author__ = 'Artikov A.K.'
+
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from math import log2
+from typing import List, Set, Hashable, Optional
+
+from .bitmap import Bitmap
+from .instrumentation import add_scanned
+from .specification import (
+    Specification, AndSpecification, OrSpecification, NotSpecification, ValueSpecification, RangeSpecification,
+    compile_specification
+)
+
+# Check of data by predicate is more expensive than set operation with data id
+SCAN_COST = 4.0
+
+
+def push_down_not(spec: Specification) -> Specification:
+    """
+    The function moves NOT specifications to leaves of tree by De Morgan's laws. NOT of range specification
+    is replaced by complement range.
+    :param spec: specification
+    :return:
+    """
+    if isinstance(spec, AndSpecification):
+        return AndSpecification(*(push_down_not(child) for child in spec.get_specifications()))
+    if isinstance(spec, OrSpecification):
+        return OrSpecification(*(push_down_not(child) for child in spec.get_specifications()))
+    if not isinstance(spec, NotSpecification):
+        return spec
+
+    child = spec.specification
+    if isinstance(child, NotSpecification):
+        return push_down_not(child.specification)
+    if isinstance(child, AndSpecification):
+        return OrSpecification(*(push_down_not(NotSpecification(current)) for current in child.get_specifications()))
+    if isinstance(child, OrSpecification):
+        return AndSpecification(*(push_down_not(NotSpecification(current)) for current in child.get_specifications()))
+    if isinstance(child, RangeSpecification):
+        return ~child
+    return spec
+
+
+def merge_in(spec: Specification) -> Specification:
+    """
+    The function merges specifications of one attribute: values are united in OR and intersected in AND.
+    :param spec: specification
+    :return:
+    """
+    if not isinstance(spec, (AndSpecification, OrSpecification)):
+        return spec
+
+    is_and = isinstance(spec, AndSpecification)
+    children = []
+    values_by_type = defaultdict(list)
+    for child in spec.get_specifications():
+        child = merge_in(child)
+        if isinstance(child, ValueSpecification):
+            values_by_type[type(child)].append(child.get_values())
+        else:
+            children.append(child)
+
+    for spec_type, values_list in values_by_type.items():
+        values = values_list[0]
+        for current_values in values_list[1:]:
+            if is_and:
+                values = [value for value in values if value in current_values]
+            else:
+                values = values + [value for value in current_values if value not in values]
+        children.append(spec_type.construct_from_values(values) if values else spec_type([]))
+
+    if len(children) == 1:
+        return children[0]
+    return AndSpecification(*children) if is_and else OrSpecification(*children)
+
+
+def get_posting_count(index, value) -> int:
+    """
+    The function return count of data id for value of inverted index without building of posting set.
+    :param index: inverted index
+    :param value: attribute value
+    :return:
+    """
+    get_count = getattr(index, 'get_count', None)
+    if get_count is not None:
+        return get_count(value)
+    return len(index.get(value, ()))
+
+
+class PlanNode(ABC):
+    """
+    Node of query plan.
+    """
+    # Node is answered from indexes without check of data
+    is_index = False
+
+    def __init__(self, spec: Specification, rows: float, cost: float):
+        """
+        Initialisation node
+        :param spec: specification of node
+        :param rows: estimated count of found data
+        :param cost: estimated cost of node with children
+        """
+        self.spec = spec
+        self.rows = rows
+        self.cost = cost
+
+    @abstractmethod
+    def execute(self, generation) -> Set[Hashable]:
+        """
+        The method return set of data id, which are satisfied specification of node.
+        :param generation: data generation of controller
+        :return:
+        """
+        pass
+
+    def execute_bitmap(self, generation) -> Bitmap:
+        """
+        The method return bitmap of rows of data, which are satisfied specification of node.
+        :param generation: data generation of controller with bitmap indexes
+        :return:
+        """
+        positions = generation.positions
+        return Bitmap.construct_from_rows([positions[data_id] for data_id in self.execute(generation)])
+
+    def get_children(self) -> List['PlanNode']:
+        return []
+
+    def describe(self) -> str:
+        return f'{type(self).__name__} {self.spec}'
+
+    def explain(self, level: int = 0) -> str:
+        """
+        The method return plan as text: one node on line with estimated count of data and cost.
+        :param level: level of node in plan
+        :return:
+        """
+        lines = [f'{"  " * level}{self.describe()} (rows={self.rows:.0f} cost={self.cost:.0f})']
+        lines.extend(child.explain(level + 1) for child in self.get_children())
+        return '\n'.join(lines)
+
+
+class IndexLookup(PlanNode):
+    """
+    Union of postings of inverted index for values.
+    """
+    is_index = True
+
+    def execute(self, generation) -> Set[Hashable]:
+        index = generation.indexes[self.spec.attr_name]
+        return set().union(*(index.get(value, ()) for value in self.spec.get_values()))
+
+    def execute_bitmap(self, generation) -> Bitmap:
+        index = generation.indexes[self.spec.attr_name]
+        result = Bitmap()
+        for value in self.spec.get_values():
+            result |= index.get_bitmap(value)
+        return result
+
+
+class RangeLookup(PlanNode):
+    """
+    Range of sorted column.
+    """
+    is_index = True
+
+    def execute(self, generation) -> Set[Hashable]:
+        return generation.sorted_columns[self.spec.attr_name].get_range(self.spec)
+
+    def execute_bitmap(self, generation) -> Bitmap:
+        sorted_column = generation.sorted_columns[self.spec.attr_name]
+        start, end = sorted_column.get_bounds(self.spec)
+        positions = generation.positions
+        return Bitmap.construct_from_rows([positions[data_id] for data_id in sorted_column.ids[start:end]])
+
+
+class Complement(PlanNode):
+    """
+    All data id except data id of child index node.
+    """
+    is_index = True
+
+    def __init__(self, spec: Specification, child: PlanNode, rows: float, cost: float):
+        super().__init__(spec, rows, cost)
+        self.child = child
+
+    def execute(self, generation) -> Set[Hashable]:
+        return set(generation.keys).difference(self.child.execute(generation))
+
+    def execute_bitmap(self, generation) -> Bitmap:
+        return self.child.execute_bitmap(generation).complement(len(generation.keys))
+
+    def get_children(self) -> List[PlanNode]:
+        return [self.child]
+
+    def describe(self) -> str:
+        return 'Complement'
+
+
+class Intersect(PlanNode):
+    """
+    Intersection of children index nodes, the smallest child first.
+    """
+    is_index = True
+
+    def __init__(self, spec: Specification, children: List[PlanNode], rows: float, cost: float):
+        super().__init__(spec, rows, cost)
+        self.children = sorted(children, key=lambda child: child.rows)
+
+    def execute(self, generation) -> Set[Hashable]:
+        result = self.children[0].execute(generation)
+        for child in self.children[1:]:
+            if not result:
+                break
+            result.intersection_update(child.execute(generation))
+        return result
+
+    def execute_bitmap(self, generation) -> Bitmap:
+        result = self.children[0].execute_bitmap(generation)
+        for child in self.children[1:]:
+            if not result:
+                break
+            result &= child.execute_bitmap(generation)
+        return result
+
+    def get_children(self) -> List[PlanNode]:
+        return self.children
+
+    def describe(self) -> str:
+        return 'Intersect'
+
+
+class Union(PlanNode):
+    """
+    Union of children index nodes.
+    """
+    is_index = True
+
+    def __init__(self, spec: Specification, children: List[PlanNode], rows: float, cost: float):
+        super().__init__(spec, rows, cost)
+        self.children = children
+
+    def execute(self, generation) -> Set[Hashable]:
+        return set().union(*(child.execute(generation) for child in self.children))
+
+    def execute_bitmap(self, generation) -> Bitmap:
+        result = Bitmap()
+        for child in self.children:
+            result |= child.execute_bitmap(generation)
+        return result
+
+    def get_children(self) -> List[PlanNode]:
+        return self.children
+
+    def describe(self) -> str:
+        return 'Union'
+
+
+class Filter(PlanNode):
+    """
+    Check of data, which were found by child index node, by compiled predicate.
+    """
+    def __init__(self, spec: Specification, child: PlanNode, rows: float, cost: float):
+        super().__init__(spec, rows, cost)
+        self.child = child
+
+    def execute(self, generation) -> Set[Hashable]:
+        data = generation.data
+        predicate = compile_specification(self.spec)
+        candidates = self.child.execute(generation)
+        add_scanned(len(candidates))
+        return {data_id for data_id in candidates if predicate(data[data_id])}
+
+    def execute_bitmap(self, generation) -> Bitmap:
+        data, keys = generation.data, generation.keys
+        predicate = compile_specification(self.spec)
+        rows = self.child.execute_bitmap(generation).get_rows()
+        add_scanned(len(rows))
+        return Bitmap.construct_from_rows([row for row in rows if predicate(data[keys[row]])])
+
+    def get_children(self) -> List[PlanNode]:
+        return [self.child]
+
+
+class Scan(PlanNode):
+    """
+    Check of all data by compiled predicate.
+    """
+    def execute(self, generation) -> Set[Hashable]:
+        data = generation.data
+        predicate = compile_specification(self.spec)
+        add_scanned(len(generation.keys))
+        return {data_id for data_id in generation.keys if predicate(data[data_id])}
+
+    def execute_bitmap(self, generation) -> Bitmap:
+        data = generation.data
+        predicate = compile_specification(self.spec)
+        add_scanned(len(generation.keys))
+        return Bitmap.construct_from_rows([
+            row for row, data_id in enumerate(generation.keys) if predicate(data[data_id])
+        ])
+
+
+class QueryPlanner:
+    """
+    Planner of specification queries for data generation of controller.
+    """
+    def __init__(self, generation):
+        """
+        Initialisation planner
+        :param generation: data generation with data, keys, inverted indexes and sorted columns
+        """
+        self.generation = generation
+        self.count = len(generation.keys)
+
+    def plan(self, spec: Specification) -> PlanNode:
+        """
+        The method rewrites specification and return the cheapest found plan.
+        :param spec: specification
+        :return:
+        """
+        return self._plan(merge_in(push_down_not(spec)))
+
+    def _plan(self, spec: Specification) -> PlanNode:
+        if isinstance(spec, AndSpecification):
+            return self._plan_and(spec)
+        if isinstance(spec, OrSpecification):
+            return self._plan_or(spec)
+        if isinstance(spec, NotSpecification):
+            return self._plan_not(spec)
+        node = self._plan_lookup(spec)
+        if node is not None:
+            return node
+        return self._plan_scan(spec)
+
+    def _plan_scan(self, spec: Specification) -> Scan:
+        return Scan(spec, self.count * spec.estimate_selectivity(), self.count * SCAN_COST)
+
+    def _plan_lookup(self, spec: Specification) -> Optional[PlanNode]:
+        """
+        Return index node for leaf specification or None, if attribute has no index.
+        :param spec: leaf specification
+        :return:
+        """
+        if isinstance(spec, ValueSpecification):
+            index = self.generation.indexes.get(spec.attr_name)
+            if index is None:
+                return None
+            rows = sum(get_posting_count(index, value) for value in spec.get_values())
+            return IndexLookup(spec, rows, rows + 1)
+        if isinstance(spec, RangeSpecification):
+            sorted_column = self.generation.sorted_columns.get(spec.attr_name)
+            if sorted_column is None:
+                return None
+            start, end = sorted_column.get_bounds(spec)
+            return RangeLookup(spec, end - start, end - start + log2(self.count + 1))
+        return None
+
+    def _plan_not(self, spec: NotSpecification) -> PlanNode:
+        child = self._plan(spec.specification)
+        if child.is_index:
+            return Complement(spec, child, self.count - child.rows, child.cost + self.count)
+        return self._plan_scan(spec)
+
+    def _plan_and(self, spec: AndSpecification) -> PlanNode:
+        """
+        Index children are intersected, while intersection is cheaper than check of found data by predicate.
+        Other children are checked by predicate for found data.
+        """
+        children = [(child, self._plan(child)) for child in spec.get_specifications()]
+        index_children = sorted(
+            ((child, node) for child, node in children if node.is_index), key=lambda child_node: child_node[1].rows
+        )
+        if not index_children:
+            return self._plan_scan(spec)
+
+        used_nodes = [index_children[0][1]]
+        rows = used_nodes[0].rows
+        cost = used_nodes[0].cost
+        residual = [child for child, node in children if not node.is_index]
+        for child, node in index_children[1:]:
+            if node.cost < rows * SCAN_COST:
+                used_nodes.append(node)
+                cost += node.cost
+                rows = rows * node.rows / self.count if self.count else 0
+            else:
+                residual.append(child)
+
+        if len(used_nodes) == 1:
+            node = used_nodes[0]
+        else:
+            node = Intersect(AndSpecification(*(current.spec for current in used_nodes)), used_nodes, rows, cost)
+        if not residual:
+            return node
+
+        residual_spec = residual[0] if len(residual) == 1 else AndSpecification(*residual)
+        filter_cost = cost + rows * SCAN_COST
+        if filter_cost >= self.count * SCAN_COST:
+            return self._plan_scan(spec)
+        return Filter(residual_spec, node, rows * residual_spec.estimate_selectivity(), filter_cost)
+
+    def _plan_or(self, spec: OrSpecification) -> PlanNode:
+        """
+        OR is answered from indexes, only if all children are answered from indexes.
+        """
+        nodes = [self._plan(child) for child in spec.get_specifications()]
+        cost = sum(node.cost for node in nodes)
+        if all(node.is_index for node in nodes) and cost < self.count * SCAN_COST:
+            not_selected = 1.0
+            for node in nodes:
+                not_selected *= 1.0 - node.rows / self.count
+            return Union(spec, nodes, self.count * (1.0 - not_selected), cost)
+        return self._plan_scan(spec)
+
+
+def get_plan(generation, spec: Specification) -> PlanNode:
+    """
+    The function return query plan of specification for data generation.
+    :param generation: data generation
+    :param spec: specification
+    :return:
+    """
+    return QueryPlanner(generation).plan(spec)
+
+
+def execute_plan(generation, plan: PlanNode) -> List[Hashable]:
+    """
+    The function executes plan and return data id in order of generation.
+    :param generation: data generation
+    :param plan: query plan
+    :return:
+    """
+    return sorted(plan.execute(generation), key=generation.positions.__getitem__)
+
+
+def execute_bitmap_plan(generation, plan: PlanNode) -> List[Hashable]:
+    """
+    The function executes plan on bitmaps of rows and return data id in order of generation without sorting.
+    :param generation: data generation with bitmap indexes
+    :param plan: query plan
+    :return:
+    """
+    keys = generation.keys
+    return [keys[row] for row in plan.execute_bitmap(generation).get_rows()]
@@ -0,0 +1,134 @@
+"""
+This module allows reloading catalog without restart of server. New data generation is built
+out of request path and swapped atomically. Reload is triggered by reload_catalog command (trigger file),
+by change of catalog files or by signal.
+"""
+
+__author__ = 'Artikov A.K.'
+
+import importlib
+import logging
+import signal
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+import data
+from . import tour_services
+from .api import get_catalog_generations
+from .snapshot import CatalogSnapshot
+from .sources import DictSource
+
+logger = logging.getLogger(__name__)
+
+_reload_lock = threading.Lock()
+
+
+def reload_catalog() -> Dict[str, int]:
+    """
+    The function reloads tours and departures from catalog snapshot or catalog sources.
+    :return: numbers of new generations
+    """
+    with _reload_lock:
+        tour_controller = tour_services.TOUR_CONTROLLER
+        departure_controller = tour_services.DEPARTURE_CONTROLLER
+        snapshot_path = tour_services.CATALOG_SNAPSHOT
+        if isinstance(tour_controller, tour_services.SnapshotTourController) and Path(snapshot_path).exists():
+            snapshot = CatalogSnapshot(snapshot_path)
+            tour_controller.load_snapshot(snapshot)
+            departure_controller.reload(DictSource(snapshot.departures))
+        else:
+            sources = tour_services.CATALOG_SOURCES
+            if sources.get('tours') is None or sources.get('departures') is None:
+                importlib.reload(data)
+            tours_source, departures_source = tour_services.get_catalog_sources()
+            tour_controller.reload(tours_source)
+            departure_controller.reload(departures_source)
+        # Search index of new generation is built by reload, not by the first search
+        tour_controller.build_search_index()
+        return get_catalog_generations()
+
+
+def get_watched_paths() -> List[Path]:
+    """
+    The function returns files, which changes trigger catalog reload.
+    :return:
+    """
+    paths = [getattr(settings, 'TOURS_CATALOG_RELOAD_TRIGGER', None), tour_services.CATALOG_SNAPSHOT]
+    paths.extend(tour_services.CATALOG_SOURCES.values())
+    paths.append(data.__file__)
+    return [Path(path) for path in paths if path]
+
+
+class CatalogWatcher(threading.Thread):
+    """
+    Thread, which polls modification time of catalog files and reloads catalog on change.
+    """
+    def __init__(self, paths: List[Path], interval: float):
+        super().__init__(name='CatalogWatcher', daemon=True)
+        self.paths = paths
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        mtimes = self._get_mtimes()
+        while not self._stopped.wait(self.interval):
+            current_mtimes = self._get_mtimes()
+            if current_mtimes != mtimes:
+                mtimes = current_mtimes
+                try:
+                    reload_catalog()
+                except Exception:
+                    logger.exception('Catalog reload failed, current catalog generation is kept')
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _get_mtimes(self) -> Dict[Path, Optional[float]]:
+        mtimes = dict()
+        for path in self.paths:
+            try:
+                mtimes[path] = path.stat().st_mtime
+            except FileNotFoundError:
+                mtimes[path] = None
+        return mtimes
+
+
+def install_reload_signal(signal_name: str) -> None:
+    """
+    The function installs handler, which reloads catalog in background thread on signal.
+    Handler can be installed only from main thread of process.
+    :param signal_name: signal name, for example SIGUSR2
+    :return:
+    """
+    def handler(signum, frame):
+        threading.Thread(target=reload_catalog, name='CatalogReload', daemon=True).start()
+
+    signal.signal(getattr(signal, signal_name), handler)
+
+
+def touch_reload_trigger() -> Path:
+    """
+    The function changes modification time of reload trigger file, so watchers of all workers reload catalog.
+    :return: path of trigger file
+    """
+    path = Path(settings.TOURS_CATALOG_RELOAD_TRIGGER)
+    path.touch()
+    return path
+
+
+def start_catalog_reloading() -> None:
+    """
+    The function starts catalog watcher and installs reload signal handler according to settings.
+    It should be called in every worker process after application loading.
+    :return:
+    """
+    interval = getattr(settings, 'TOURS_CATALOG_WATCH_INTERVAL', None)
+    if interval:
+        CatalogWatcher(get_watched_paths(), interval).start()
+
+    signal_name = getattr(settings, 'TOURS_CATALOG_RELOAD_SIGNAL', None)
+    if signal_name and threading.current_thread() is threading.main_thread():
+        install_reload_signal(signal_name)
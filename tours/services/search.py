@@ -0,0 +1,442 @@
+"""
+This module describes full-text search of catalog: tokenisation of russian texts, stemming by russian
+Snowball (Porter) algorithm, inverted index with BM25 ranking and prefix autocomplete of words.
+Documents are numbered in order of adding, so number of document is position of data in data generation.
+NumPy is optional dependency: with it BM25 scores of many documents are computed by vectorized operations.
+"""
+
+__author__ = 'Artikov A.K.'
+
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from typing import List, Tuple, Optional, Iterable, Dict, Collection, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TOKEN_PATTERN = re.compile(r'[0-9a-zа-я]+')
+STOP_WORDS = frozenset((
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а', 'то', 'все', 'она', 'так', 'его', 'но',
+    'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне', 'было', 'вот', 'от', 'меня', 'еще',
+    'нет', 'о', 'из', 'ему', 'теперь', 'когда', 'даже', 'ну', 'ли', 'если', 'уже', 'или', 'ни', 'быть', 'был',
+    'него', 'до', 'вас', 'нибудь', 'опять', 'уж', 'вам', 'ведь', 'там', 'потом', 'себя', 'ничего', 'ей', 'может',
+    'они', 'тут', 'где', 'есть', 'надо', 'ней', 'для', 'мы', 'тебя', 'их', 'чем', 'была', 'сам', 'чтоб', 'без',
+    'будто', 'чего', 'раз', 'тоже', 'себе', 'под', 'будет', 'ж', 'тогда', 'кто', 'этот', 'того', 'потому', 'этого',
+    'какой', 'совсем', 'ним', 'здесь', 'этом', 'один', 'почти', 'мой', 'тем', 'чтобы', 'нее', 'были', 'куда',
+    'зачем', 'всех', 'никогда', 'можно', 'при', 'наконец', 'два', 'об', 'другой', 'хоть', 'после', 'над', 'больше',
+    'тот', 'через', 'эти', 'нас', 'про', 'всего', 'них', 'какая', 'много', 'разве', 'три', 'эту', 'моя', 'впрочем',
+    'хорошо', 'свою', 'этой', 'перед', 'иногда', 'лучше', 'чуть', 'том', 'нельзя', 'такой', 'им', 'более',
+    'всегда', 'конечно', 'всю', 'между', 'это',
+))
+
+# Count of documents, which scores are computed by vectorized operations of NumPy
+VECTORIZED_MIN_COUNT = 256
+
+VOWELS = frozenset('аеиоуыэюя')
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'), ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+ADJECTIVE = ((), (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому',
+    'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило',
+     'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = ((), (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям',
+    'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+))
+SUPERLATIVE = ((), ('ейше', 'ейш'))
+DERIVATIONAL = ((), ('ость', 'ост'))
+
+
+def _remove_ending(word: str, endings: Tuple[Tuple[str, ...], Tuple[str, ...]]) -> Optional[str]:
+    """
+    Return word without the longest ending or None, if word has no ending.
+    Endings of the first group are removed only after а or я.
+    :param word: word
+    :param endings: endings, which follow а or я, and other endings
+    :return:
+    """
+    after_a, other = endings
+    for ending in sorted(after_a + other, key=len, reverse=True):
+        if not word.endswith(ending):
+            continue
+        stem = word[:-len(ending)]
+        if ending in other or stem.endswith(('а', 'я')):
+            return stem
+    return None
+
+
+def _get_region_start(word: str, start: int) -> int:
+    """
+    Return start of region after the first non-vowel, which follows vowel (R1 of Snowball).
+    :param word: word
+    :param start: start of search
+    :return:
+    """
+    for position in range(start + 1, len(word)):
+        if word[position] not in VOWELS and word[position - 1] in VOWELS:
+            return position + 1
+    return len(word)
+
+
+@lru_cache(maxsize=100000)
+def stem(word: str) -> str:
+    """
+    The function returns stem of russian word by Snowball algorithm.
+    :param word: word in lower case
+    :return:
+    """
+    # Words without russian letters (numbers, latin words) have no region for endings
+    if word.isascii():
+        return word
+    rv_start = next((position + 1 for position, char in enumerate(word) if char in VOWELS), len(word))
+    prefix, rv = word[:rv_start], word[rv_start:]
+    r2_start = max(_get_region_start(word, _get_region_start(word, 0)) - rv_start, 0)
+
+    # Step 1
+    result = _remove_ending(rv, PERFECTIVE_GERUND)
+    if result is None:
+        rv = _remove_ending(rv, REFLEXIVE) or rv
+        result = _remove_ending(rv, ADJECTIVE)
+        if result is not None:
+            result = _remove_ending(result, PARTICIPLE) or result
+        else:
+            result = _remove_ending(rv, VERB)
+            if result is None:
+                result = _remove_ending(rv, NOUN)
+    rv = result if result is not None else rv
+
+    # Step 2
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Step 3
+    derivational = _remove_ending(rv[r2_start:], DERIVATIONAL) if r2_start <= len(rv) else None
+    if derivational is not None:
+        rv = rv[:r2_start] + derivational
+
+    # Step 4
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        superlative = _remove_ending(rv, SUPERLATIVE)
+        if superlative is not None:
+            rv = superlative[:-1] if superlative.endswith('нн') else superlative
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    The function returns words of text in lower case, ё is replaced by е.
+    :param text: text
+    :return:
+    """
+    return TOKEN_PATTERN.findall(text.lower().replace('ё', 'е'))
+
+
+def get_terms(text: str) -> List[str]:
+    """
+    The function returns stems of words of text without stop words.
+    :param text: text
+    :return:
+    """
+    return [stem(word) for word in tokenize(text) if word not in STOP_WORDS]
+
+
+class SearchIndex:
+    """
+    Inverted index of documents: term -> arrays of document numbers and term frequencies.
+    Documents are ranked by BM25.
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.postings: Dict[str, Tuple[array, array]] = dict()
+        self.document_lengths = array('I')
+        self.total_length = 0
+        self.word_counts = Counter()
+        # Stem of every distinct word, texts of catalog repeat the same words
+        self._word_terms: Dict[str, str] = dict()
+        # Postings of queried terms in descending order of term score
+        self._ranked_postings: Dict[str, Tuple[Sequence[int], Sequence[float]]] = dict()
+        self._sorted_words = None
+
+    def __len__(self) -> int:
+        return len(self.document_lengths)
+
+    def add(self, fields: Iterable[Tuple[str, int]]) -> int:
+        """
+        The method adds document to index.
+        :param fields: pairs of field text and field weight, weight repeats terms of field
+        :return: number of document
+        """
+        number = len(self.document_lengths)
+        frequencies = Counter()
+        word_terms = self._word_terms
+        for text, weight in fields:
+            words = [word for word in tokenize(text) if word not in STOP_WORDS]
+            self.word_counts.update(words)
+            for word in words:
+                term = word_terms.get(word)
+                if term is None:
+                    term = word_terms[word] = stem(word)
+                frequencies[term] += weight
+        length = sum(frequencies.values())
+        for term, frequency in frequencies.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array('I'), array('H'))
+            posting[0].append(number)
+            posting[1].append(min(frequency, 65535))
+        self.document_lengths.append(length)
+        self.total_length += length
+        self._sorted_words = None
+        self._ranked_postings = dict()
+        return number
+
+    def search(
+            self, query: str, limit: int = 20, candidates: Optional[Collection[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        The method return the most relevant documents for query. Postings of terms are read in descending
+        order of term score by prefixes, which are doubled, until score of the last found document is greater
+        than sum of scores of the next documents of postings (threshold algorithm), so documents of frequent
+        terms with low scores are not scored. Small candidates are scored by bisect in postings.
+        :param query: text of query
+        :param limit: count of documents
+        :param candidates: numbers of documents, which can be found, for example documents selected by filter
+        :return: pairs of document number and BM25 score in order of score
+        """
+        terms = [term for term in set(get_terms(query)) if term in self.postings]
+        if not terms or limit <= 0:
+            return []
+        if candidates is not None:
+            longest = max(len(self.postings[term][0]) for term in terms)
+            if len(candidates) * math.log2(longest + 1) < longest:
+                numbers = list(candidates)
+                scores = zip(numbers, self._get_scores(terms, numbers))
+                return self._get_top(((number, score) for number, score in scores if score > 0.0), limit)
+            if not isinstance(candidates, (set, frozenset)):
+                candidates = set(candidates)
+
+        ranked_postings = [self._get_ranked_posting(term) for term in terms]
+        if np is not None:
+            return self._search_ranked_vectorized(terms, ranked_postings, limit, candidates)
+        return self._search_ranked(terms, ranked_postings, limit, candidates)
+
+    def rank_postings(self, min_count: int = 1000) -> int:
+        """
+        The method sorts postings of frequent terms by term score before the first search of term.
+        :param min_count: min count of documents of term
+        :return: count of sorted postings
+        """
+        terms = [term for term, (numbers, _) in self.postings.items() if len(numbers) >= min_count]
+        for term in terms:
+            self._get_ranked_posting(term)
+        return len(terms)
+
+    def _search_ranked(
+            self, terms: List[str], ranked_postings: List[Tuple[array, array]], limit: int,
+            candidates: Optional[Collection[int]]
+    ) -> List[Tuple[int, float]]:
+        """
+        Return the most relevant documents, which are found by threshold algorithm in sorted postings.
+        :param terms: terms of query
+        :param ranked_postings: postings of terms in descending order of term score
+        :param limit: count of documents
+        :param candidates: numbers of documents, which can be found
+        :return: pairs of document number and BM25 score in order of score
+        """
+        longest = max(len(numbers) for numbers, _ in ranked_postings)
+        scored = set()
+        # The least of found documents is the first, documents with equal scores are ordered by number
+        top = []
+        start, end = 0, limit
+        while True:
+            numbers = {number for ranked_numbers, _ in ranked_postings for number in ranked_numbers[start:end]}
+            numbers = [
+                number for number in numbers if number not in scored and (candidates is None or number in candidates)
+            ]
+            scored.update(numbers)
+            for number, score in zip(numbers, self._get_scores(terms, numbers)):
+                if len(top) < limit:
+                    heapq.heappush(top, (score, -number))
+                elif (score, -number) > top[0]:
+                    heapq.heapreplace(top, (score, -number))
+            if end >= longest or len(top) == limit and top[0][0] > self._get_threshold(ranked_postings, end):
+                break
+            start, end = end, end * 2
+        return [(-negative_number, score) for score, negative_number in sorted(top, reverse=True)]
+
+    def _search_ranked_vectorized(
+            self, terms: List[str], ranked_postings: List[Tuple[array, array]], limit: int,
+            candidates: Optional[Collection[int]]
+    ) -> List[Tuple[int, float]]:
+        """
+        Return the most relevant documents, which are found by threshold algorithm in sorted postings.
+        Documents of prefixes of postings are selected and scored by vectorized operations of NumPy.
+        :param terms: terms of query
+        :param ranked_postings: postings of terms in descending order of term score
+        :param limit: count of documents
+        :param candidates: numbers of documents, which can be found
+        :return: pairs of document number and BM25 score in order of score
+        """
+        ranked_numbers = [np.frombuffer(numbers, dtype=numbers.typecode) for numbers, _ in ranked_postings]
+        longest = max(len(numbers) for numbers in ranked_numbers)
+        scored = np.zeros(len(self.document_lengths), dtype=bool)
+        top_numbers, top_scores = np.zeros(0, dtype=np.int64), np.zeros(0)
+        start, end = 0, limit
+        while True:
+            numbers = np.unique(np.concatenate([numbers[start:end] for numbers in ranked_numbers])).astype(np.int64)
+            numbers = numbers[~scored[numbers]]
+            scored[numbers] = True
+            if candidates is not None:
+                numbers = np.array([number for number in numbers.tolist() if number in candidates], dtype=np.int64)
+            top_numbers = np.concatenate((top_numbers, numbers))
+            top_scores = np.concatenate((top_scores, self._get_vectorized_scores(terms, numbers)))
+            order = np.lexsort((top_numbers, -top_scores))[:limit]
+            top_numbers, top_scores = top_numbers[order], top_scores[order]
+            if end >= longest or len(order) == limit and top_scores[-1] > self._get_threshold(ranked_postings, end):
+                break
+            start, end = end, end * 2
+        return list(zip(top_numbers.tolist(), top_scores.tolist()))
+
+    @staticmethod
+    def _get_threshold(ranked_postings: List[Tuple[array, array]], position: int) -> float:
+        """
+        Return the max score of documents, which are not in prefixes of sorted postings: term scores of them
+        are not greater than scores of documents at the end of prefixes. Scores are added in order of terms
+        as scores of documents.
+        :param ranked_postings: postings of terms in descending order of term score
+        :param position: end of prefixes
+        :return:
+        """
+        threshold = 0.0
+        for _, ranked_scores in ranked_postings:
+            if position < len(ranked_scores):
+                threshold += ranked_scores[position]
+        return threshold
+
+    @staticmethod
+    def _get_top(scores: Iterable[Tuple[int, float]], limit: int) -> List[Tuple[int, float]]:
+        """
+        Return documents with the greatest scores, documents with equal scores are in order of numbers.
+        :param scores: pairs of document number and score
+        :param limit: count of documents
+        :return:
+        """
+        return heapq.nlargest(limit, scores, key=lambda number_score: (number_score[1], -number_score[0]))
+
+    def _get_idf(self, term: str) -> float:
+        """
+        Return inverse document frequency of term.
+        :param term: term of index
+        :return:
+        """
+        count, term_count = len(self.document_lengths), len(self.postings[term][0])
+        return math.log(1.0 + (count - term_count + 0.5) / (term_count + 0.5))
+
+    def _get_scores(self, terms: List[str], numbers: List[int]) -> List[float]:
+        """
+        Return BM25 scores of documents for terms, term frequency of document is found in posting by bisect.
+        Scores are added in order of terms, so score of document is the same for any set of documents.
+        :param terms: terms of query
+        :param numbers: document numbers
+        :return: scores in order of numbers
+        """
+        if np is not None and len(numbers) >= VECTORIZED_MIN_COUNT:
+            return self._get_vectorized_scores(terms, np.array(numbers, dtype=np.int64)).tolist()
+
+        k1, b = self.k1, self.b
+        average_length = self.total_length / len(self.document_lengths) or 1.0
+        postings = [(*self.postings[term], self._get_idf(term)) for term in terms]
+        document_lengths = self.document_lengths
+        result = []
+        for number in numbers:
+            norm = k1 * (1.0 - b + b * document_lengths[number] / average_length)
+            score = 0.0
+            for term_numbers, frequencies, idf in postings:
+                position = bisect_left(term_numbers, number)
+                if position < len(term_numbers) and term_numbers[position] == number:
+                    frequency = frequencies[position]
+                    score += idf * frequency * (k1 + 1.0) / (frequency + norm)
+            result.append(score)
+        return result
+
+    def _get_vectorized_scores(self, terms: List[str], numbers: 'np.ndarray') -> 'np.ndarray':
+        """
+        Return BM25 scores of documents for terms by vectorized operations, which are the same as operations
+        of _get_scores, so scores are equal.
+        :param terms: terms of query
+        :param numbers: document numbers
+        :return: scores in order of numbers
+        """
+        k1, b = self.k1, self.b
+        average_length = self.total_length / len(self.document_lengths) or 1.0
+        lengths = np.frombuffer(self.document_lengths, dtype=self.document_lengths.typecode)[numbers]
+        norms = k1 * (1.0 - b + b * lengths / average_length)
+        scores = np.zeros(len(numbers))
+        for term in terms:
+            term_numbers, frequencies = self.postings[term]
+            term_numbers = np.frombuffer(term_numbers, dtype=term_numbers.typecode)
+            # Numbers have type of posting, else posting is converted on every search
+            positions = np.minimum(
+                np.searchsorted(term_numbers, numbers.astype(term_numbers.dtype)), len(term_numbers) - 1
+            )
+            term_frequencies = np.frombuffer(frequencies, dtype=frequencies.typecode)[positions]
+            term_scores = self._get_idf(term) * term_frequencies * (k1 + 1.0) / (term_frequencies + norms)
+            scores = scores + np.where(term_numbers[positions] == numbers, term_scores, 0.0)
+        return scores
+
+    def _get_ranked_posting(self, term: str) -> Tuple[Sequence[int], Sequence[float]]:
+        """
+        Return document numbers of term posting and term scores in descending order of score. Posting is sorted
+        once, until documents are added to index.
+        :param term: term of index
+        :return:
+        """
+        ranked_posting = self._ranked_postings.get(term)
+        if ranked_posting is None:
+            numbers = list(self.postings[term][0])
+            scores = self._get_scores([term], numbers)
+            order = sorted(range(len(numbers)), key=scores.__getitem__, reverse=True)
+            ranked_posting = (
+                array('I', [numbers[position] for position in order]),
+                array('d', [scores[position] for position in order]),
+            )
+            self._ranked_postings[term] = ranked_posting
+        return ranked_posting
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        The method return the most frequent words, which start with prefix.
+        :param prefix: beginning of word
+        :param limit: count of words
+        :return:
+        """
+        words = tokenize(prefix)
+        if not words:
+            return []
+        prefix = words[-1]
+        if self._sorted_words is None:
+            self._sorted_words = sorted(self.word_counts)
+        sorted_words = self._sorted_words
+        start = bisect_left(sorted_words, prefix)
+        end = bisect_left(sorted_words, prefix + '\uffff', start)
+        word_counts = self.word_counts
+        return heapq.nsmallest(limit, sorted_words[start:end], key=lambda word: (-word_counts[word], word))
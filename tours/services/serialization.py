@@ -0,0 +1,45 @@
+"""
+This module describes JSON serialization of catalog data. Data are encoded to JSON fragments once
+for every data generation, and responses are joined from fragments without building dict for every object.
+orjson is optional dependency: without it standard json encoder is used.
+"""
+
+__author__ = 'Artikov A.K.'
+
+import json
+from typing import Iterable, List
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(value) -> bytes:
+    """
+    The function encodes value to compact JSON.
+    :param value: value for encoding
+    :return: JSON in UTF-8
+    """
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def encode_object(item, field_names: Iterable[str]) -> bytes:
+    """
+    The function encodes object attributes to JSON object.
+    :param item: object, for example tour
+    :param field_names: names of serialized attributes
+    :return:
+    """
+    return dumps({field_name: getattr(item, field_name) for field_name in field_names})
+
+
+def join_array(fragments: List[bytes]) -> bytes:
+    """
+    The function joins JSON fragments to JSON array.
+    :param fragments: encoded objects
+    :return:
+    """
+    return b'[' + b','.join(fragments) + b']'
@@ -0,0 +1,368 @@
+"""
+This module describes binary snapshot of tours catalog. Snapshot keeps fixed-width table of tour records,
+pool of strings and prebuilt indexes. Snapshot file is mapped to memory read-only, so all worker processes
+share the same pages, and tours are lightweight views, which read fields on access.
+
+File layout: header (magic, directory offset and length), string pool, records table, arrays of indexes
+and JSON directory with offsets of all sections.
+"""
+
+__author__ = 'Artikov A.K.'
+
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple, Any, Hashable, Union
+
+from ..data_models import Tour
+
+MAGIC = b'TOURSNP1'
+HEADER = struct.Struct('<8sQQ')
+# id, title, description, departure, picture, price, stars, country, nights, date
+# strings are kept as pairs of offset and length in string pool
+RECORD = struct.Struct('<qIIIIIIIIdIIIIqII')
+ALIGNMENT = 8
+
+
+class SnapshotFormatError(Exception):
+    """
+    Snapshot file has wrong format.
+    """
+    pass
+
+
+class TourView:
+    """
+    Lightweight view of tour record in snapshot. Fields are decoded on access.
+    """
+    __slots__ = ('_snapshot', '_row')
+
+    def __init__(self, snapshot: 'CatalogSnapshot', row: int):
+        self._snapshot = snapshot
+        self._row = row
+
+    def _get_record(self) -> tuple:
+        return RECORD.unpack_from(self._snapshot.buffer, self._snapshot.records_offset + self._row * RECORD.size)
+
+    def _get_string(self, field_index: int) -> str:
+        record = self._get_record()
+        return self._snapshot.get_string(record[field_index], record[field_index + 1])
+
+    @property
+    def id(self) -> int:
+        return self._get_record()[0]
+
+    @property
+    def title(self) -> str:
+        return self._get_string(1)
+
+    @property
+    def description(self) -> str:
+        return self._get_string(3)
+
+    @property
+    def departure(self) -> str:
+        return self._get_string(5)
+
+    @property
+    def picture(self) -> str:
+        return self._get_string(7)
+
+    @property
+    def price(self) -> Union[int, float]:
+        price = self._get_record()[9]
+        return int(price) if price.is_integer() else price
+
+    @property
+    def stars(self) -> str:
+        return self._get_string(10)
+
+    @property
+    def country(self) -> str:
+        return self._get_string(12)
+
+    @property
+    def nights(self) -> int:
+        return self._get_record()[14]
+
+    @property
+    def date(self) -> str:
+        return self._get_string(15)
+
+    @property
+    def star_range(self) -> range:
+        return range(int(self.stars))
+
+    def materialize(self) -> Tour:
+        """
+        The method return Tour object with all fields of record.
+        :return:
+        """
+        record = self._get_record()
+        get_string = self._snapshot.get_string
+        price = record[9]
+        return Tour(
+            id=record[0], title=get_string(record[1], record[2]), description=get_string(record[3], record[4]),
+            departure=get_string(record[5], record[6]), picture=get_string(record[7], record[8]),
+            price=int(price) if price.is_integer() else price, stars=get_string(record[10], record[11]),
+            country=get_string(record[12], record[13]), nights=record[14], date=get_string(record[15], record[16]),
+        )
+
+    def as_dict(self) -> dict:
+        return self.materialize().as_dict()
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, TourView):
+            return self._snapshot is other._snapshot and self._row == other._row
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((id(self._snapshot), self._row))
+
+    def __repr__(self) -> str:
+        return f'TourView(id={self.id}, title={self.title!r})'
+
+
+class SnapshotTours(Mapping):
+    """
+    Read-only mapping tour id -> tour view. Iteration keeps order of records in snapshot.
+    """
+    def __init__(self, snapshot: 'CatalogSnapshot'):
+        self._snapshot = snapshot
+
+    def __getitem__(self, tour_id: int) -> TourView:
+        return TourView(self._snapshot, self._snapshot.get_row(tour_id))
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._snapshot.ids)
+
+    def __len__(self) -> int:
+        return self._snapshot.count
+
+    def values(self) -> Iterator[TourView]:
+        snapshot = self._snapshot
+        return (TourView(snapshot, row) for row in range(snapshot.count))
+
+
+class SnapshotPositions(Mapping):
+    """
+    Read-only mapping tour id -> row number.
+    """
+    def __init__(self, snapshot: 'CatalogSnapshot'):
+        self._snapshot = snapshot
+
+    def __getitem__(self, tour_id: int) -> int:
+        return self._snapshot.get_row(tour_id)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._snapshot.ids)
+
+    def __len__(self) -> int:
+        return self._snapshot.count
+
+
+class SnapshotIndex(Mapping):
+    """
+    Read-only inverted index attribute value -> set of tour id.
+    """
+    def __init__(self, snapshot: 'CatalogSnapshot', postings: Dict[Any, Tuple[int, int]]):
+        self._snapshot = snapshot
+        self._postings = postings
+
+    def __getitem__(self, value) -> set:
+        offset, count = self._postings[value]
+        return set(self._snapshot.get_array(offset, count, 'q'))
+
+    def __iter__(self) -> Iterator:
+        return iter(self._postings)
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def get_count(self, value) -> int:
+        """
+        The method return count of tour id for value without reading of posting.
+        :param value: attribute value
+        :return:
+        """
+        posting = self._postings.get(value)
+        return posting[1] if posting is not None else 0
+
+
+class CatalogSnapshot:
+    """
+    Catalog snapshot, which is mapped to memory read-only.
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with self.path.open('rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self._mmap)
+
+        magic, directory_offset, directory_length = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise SnapshotFormatError(f'{self.path} is not tours catalog snapshot')
+        directory = json.loads(bytes(self.buffer[directory_offset:directory_offset + directory_length]))
+
+        self.count = directory['count']
+        self.strings_offset = directory['strings']
+        self.records_offset = directory['records']
+        self.ids = self.get_array(directory['ids'], self.count, 'q')
+        self.id_rows = self.get_array(directory['id_rows'], self.count, 'q')
+        self.sorted_ids = self.get_array(directory['sorted_ids'], self.count, 'q')
+        self.indexes = {
+            attr_name: {value: (offset, count) for value, offset, count in postings}
+            for attr_name, postings in directory['indexes'].items()
+        }
+        self.sorted_columns = {
+            attr_name: (self.get_array(keys_offset, self.count, 'd'), self.get_array(ids_offset, self.count, 'q'))
+            for attr_name, (keys_offset, ids_offset) in directory['sorted_columns'].items()
+        }
+        self.aggregates = {
+            dimension: {value: aggregates for value, aggregates in dimension_aggregates}
+            for dimension, dimension_aggregates in directory['aggregates'].items()
+        }
+        self.departures = directory['departures']
+
+    def get_array(self, offset: int, count: int, array_format: str) -> memoryview:
+        """
+        The method return typed array from snapshot without copy.
+        :param offset: offset of array
+        :param count: count of items
+        :param array_format: struct format of item
+        :return:
+        """
+        return self.buffer[offset:offset + count * struct.calcsize(array_format)].cast(array_format)
+
+    def get_string(self, offset: int, length: int) -> str:
+        """
+        The method return string from string pool.
+        :param offset: offset in string pool
+        :param length: length in bytes
+        :return:
+        """
+        start = self.strings_offset + offset
+        return str(self.buffer[start:start + length], 'utf-8')
+
+    def get_row(self, tour_id: int) -> int:
+        """
+        The method return row number of tour.
+        :param tour_id: tour id
+        :return:
+        :raises KeyError: if tour does not exist
+        """
+        position = bisect_left(self.sorted_ids, tour_id)
+        if position == len(self.sorted_ids) or self.sorted_ids[position] != tour_id:
+            raise KeyError(tour_id)
+        return self.id_rows[position]
+
+    def get_index(self, attr_name: str) -> SnapshotIndex:
+        return SnapshotIndex(self, self.indexes[attr_name])
+
+
+class SnapshotWriter:
+    """
+    Writer of snapshot file. Sections are aligned for typed arrays.
+    """
+    def __init__(self, file):
+        self._file = file
+        self._file.write(b'\0' * HEADER.size)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def write(self, data: bytes) -> int:
+        """
+        The method writes aligned section.
+        :param data: section data
+        :return: offset of section
+        """
+        padding = -self._file.tell() % ALIGNMENT
+        self._file.write(b'\0' * padding)
+        offset = self._file.tell()
+        self._file.write(data)
+        return offset
+
+    def write_array(self, values: Iterable, array_format: str) -> int:
+        values = list(values)
+        return self.write(struct.pack(f'<{len(values)}{array_format}', *values))
+
+    def finish(self, directory: dict) -> None:
+        directory_bytes = json.dumps(directory, ensure_ascii=False).encode('utf-8')
+        directory_offset = self.write(directory_bytes)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, directory_offset, len(directory_bytes)))
+
+
+def write_snapshot(
+        path: Union[str, Path],
+        tours: List[Tour],
+        indexes: Dict[str, Dict[Any, Iterable[Hashable]]],
+        sorted_columns: Dict[str, Tuple[List[float], List[int]]],
+        aggregates: Dict[str, Dict[Any, Dict[str, tuple]]],
+        departures: Dict[str, str],
+) -> None:
+    """
+    The function writes catalog snapshot. File is replaced atomically, so processes, which mapped previous file,
+    keep reading it.
+    :param path: snapshot path
+    :param tours: tours in catalog order
+    :param indexes: inverted indexes attribute name -> value -> tour ids
+    :param sorted_columns: attribute name -> (sorted keys, tour ids)
+    :param aggregates: dimension -> value -> attribute name -> (count, sum, min, max)
+    :param departures: departures in format of data.departures
+    :return:
+    """
+    path = Path(path)
+    strings = dict()
+    string_pool = bytearray()
+
+    def add_string(value: str) -> Tuple[int, int]:
+        location = strings.get(value)
+        if location is None:
+            encoded = value.encode('utf-8')
+            location = strings[value] = (len(string_pool), len(encoded))
+            string_pool.extend(encoded)
+        return location
+
+    records = bytearray()
+    for tour in tours:
+        records.extend(RECORD.pack(
+            tour.id, *add_string(tour.title), *add_string(tour.description), *add_string(tour.departure),
+            *add_string(tour.picture), float(tour.price), *add_string(tour.stars), *add_string(tour.country),
+            tour.nights, *add_string(tour.date),
+        ))
+
+    temp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with temp_path.open('wb') as file:
+        writer = SnapshotWriter(file)
+        directory = {
+            'count': len(tours),
+            'strings': writer.write(bytes(string_pool)),
+            'records': writer.write(bytes(records)),
+            'ids': writer.write_array((tour.id for tour in tours), 'q'),
+        }
+        ids_with_rows = sorted((tour.id, row) for row, tour in enumerate(tours))
+        directory['sorted_ids'] = writer.write_array((tour_id for tour_id, _ in ids_with_rows), 'q')
+        directory['id_rows'] = writer.write_array((row for _, row in ids_with_rows), 'q')
+        directory['indexes'] = {
+            attr_name: [
+                [value, writer.write_array(sorted(posting), 'q'), len(posting)] for value, posting in index.items()
+            ]
+            for attr_name, index in indexes.items()
+        }
+        directory['sorted_columns'] = {
+            attr_name: [writer.write_array(keys, 'd'), writer.write_array(ids, 'q')]
+            for attr_name, (keys, ids) in sorted_columns.items()
+        }
+        directory['aggregates'] = {
+            dimension: [[value, value_aggregates] for value, value_aggregates in dimension_aggregates.items()]
+            for dimension, dimension_aggregates in aggregates.items()
+        }
+        directory['departures'] = departures
+        writer.finish(directory)
+    os.replace(temp_path, path)
@@ -0,0 +1,151 @@
+"""
+This module describes catalog sources. Source streams records of catalog as pairs of id and record dict,
+so controller can load catalog by chunks without reading the whole file in memory.
+"""
+
+__author__ = 'Artikov A.K.'
+
+import csv
+import json
+from abc import ABC, abstractmethod
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, Tuple, Hashable, List, Dict, Callable, Optional, Union
+
+
+def to_number(value: str) -> Union[int, float]:
+    """
+    The function converts string to int, if it is possible, else to float.
+    :param value: string value
+    :return:
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def to_key(value: str) -> Union[int, str]:
+    """
+    The function converts id of record to int, if it is integer, other id (for example id of departure) are strings.
+    :param value: string value
+    :return:
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+class CatalogSource(ABC):
+    """
+    Source of catalog records.
+    """
+    # Source parses data, so controller loads it in background by default
+    background_loading = True
+    # Source is read at worker start or on the first wait for data, not on import of controllers
+    deferred_loading = False
+
+    @abstractmethod
+    def iter_records(self) -> Iterator[Tuple[Hashable, dict]]:
+        """
+        The method yields pairs of record id and record data.
+        :return:
+        """
+        pass
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[List[Tuple[Hashable, dict]]]:
+        """
+        The method yields records by chunks.
+        :param chunk_size: count of records in chunk
+        :return:
+        """
+        records = self.iter_records()
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+class DictSource(CatalogSource):
+    """
+    Source for catalog, which is already in memory, for example data.tours from data.py.
+    """
+    background_loading = False
+
+    def __init__(self, dict_data: dict):
+        self.dict_data = dict_data
+
+    def iter_records(self) -> Iterator[Tuple[Hashable, dict]]:
+        return iter(self.dict_data.items())
+
+
+class FileSource(CatalogSource, ABC):
+    """
+    Source for catalog file. Every record of file keeps own id in id field.
+    """
+    def __init__(self, path: Union[str, Path], id_field: str = 'id', encoding: str = 'utf-8'):
+        self.path = Path(path)
+        self.id_field = id_field
+        self.encoding = encoding
+
+
+class JsonlSource(FileSource):
+    """
+    Source for JSON lines file: one JSON object for every record.
+    """
+    def iter_records(self) -> Iterator[Tuple[Hashable, dict]]:
+        with self.path.open(encoding=self.encoding) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                yield record.pop(self.id_field), record
+
+
+class CsvSource(FileSource):
+    """
+    Source for CSV file with header. Values of columns are converted by converters, other values are strings.
+    """
+    default_converters = {
+        'id': to_key,
+        'price': to_number,
+        'nights': int,
+    }
+
+    def __init__(self, path: Union[str, Path], id_field: str = 'id', encoding: str = 'utf-8',
+                 converters: Dict[str, Callable[[str], object]] = None):
+        super().__init__(path, id_field, encoding)
+        self.converters = self.default_converters if converters is None else converters
+
+    def iter_records(self) -> Iterator[Tuple[Hashable, dict]]:
+        converters = self.converters
+        with self.path.open(encoding=self.encoding, newline='') as file:
+            for record in csv.DictReader(file):
+                for field_name, converter in converters.items():
+                    if field_name in record:
+                        record[field_name] = converter(record[field_name])
+                yield record.pop(self.id_field), record
+
+
+FILE_SOURCES = {
+    '.jsonl': JsonlSource,
+    '.csv': CsvSource,
+}
+
+
+def get_catalog_source(path: Optional[Union[str, Path]], default_data: dict) -> CatalogSource:
+    """
+    The function returns catalog source for file path. Type of source is defined by file extension.
+    :param path: path to catalog file or None
+    :param default_data: data for catalog, if path is None
+    :return:
+    """
+    if path is None:
+        return DictSource(default_data)
+    path = Path(path)
+    source = FILE_SOURCES.get(path.suffix)
+    if source is None:
+        raise Exception(f'Catalog source for {path.suffix} files does not exist')
+    return source(path)
@@ -4,11 +4,49 @@ __author__ = 'Artikov A.K.'
 
 
 from abc import ABC, abstractmethod
-from typing import Iterator
+from functools import lru_cache
+from typing import Iterator, Callable, Any, Optional, List
+
+MONTHS = (
+    'января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+    'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря',
+)
+
+
+def get_date_key(date: str) -> int:
+    """
+    The function returns sortable key for tour date like '2 марта'.
+    :param date: date in format '<day> <month name>'
+    :return: key, which keeps date order inside year
+    """
+    day, month = date.split()
+    return (MONTHS.index(month.lower()) + 1) * 100 + int(day)
+
+
+class ExpressionConstants:
+    """
+    Constants of compiled expression. Constants are named by order of adding, so expressions of specifications
+    with the same structure have the same source.
+    """
+    def __init__(self):
+        self.namespace = dict()
+
+    def add(self, value) -> str:
+        """
+        The method adds constant and return its name in expression.
+        :param value: constant value
+        :return:
+        """
+        name = f'c{len(self.namespace)}'
+        self.namespace[name] = value
+        return name
 
 
 class Specification(ABC):
     """Class allows checking, that item is satisfied conditions"""
+    # Estimated part of items, which are satisfied specification
+    selectivity = 0.5
+
     @abstractmethod
     def is_satisfied(self, item) -> bool:
         """
@@ -26,6 +64,56 @@ class Specification(ABC):
         """
         return AndSpecification(self, other)
 
+    def __or__(self, other: 'Specification') -> 'OrSpecification':
+        """
+        The method return OR specification.
+        :param other:
+        :return:
+        """
+        return OrSpecification(self, other)
+
+    def __invert__(self) -> 'NotSpecification':
+        """
+        The method return NOT specification.
+        :return:
+        """
+        return NotSpecification(self)
+
+    def __str__(self) -> str:
+        return type(self).__name__
+
+    def estimate_selectivity(self) -> float:
+        """
+        The method return estimated part of items, which are satisfied specification.
+        :return:
+        """
+        return self.selectivity
+
+    def get_expression(self, constants: ExpressionConstants) -> str:
+        """
+        The method return Python expression, which checks variable item. By default expression calls is_satisfied.
+        :param constants: constants of expression
+        :return:
+        """
+        return f'{constants.add(self)}.is_satisfied(item)'
+
+
+@lru_cache(maxsize=256)
+def _compile_source(source: str):
+    return compile(source, '<specification>', 'eval')
+
+
+def compile_specification(spec: Specification) -> Callable[[Any], bool]:
+    """
+    The function compiles specification tree to one flat predicate. Conditions of AND specifications are
+    checked in order of estimated selectivity, list values are checked by frozenset.
+    :param spec: specification
+    :return: predicate for item
+    """
+    constants = ExpressionConstants()
+    source = f'lambda item: {spec.get_expression(constants)}'
+    return eval(_compile_source(source), constants.namespace)
+
 
 class SpecificationFilter:
     """
@@ -34,14 +122,12 @@ class SpecificationFilter:
     @staticmethod
     def filter(items, spec: Specification) -> Iterator:
         """
-        The method return items, which satisfied specifications
+        The method return items, which satisfied specifications. Specification is compiled to one predicate.
         :param items: items
         :param spec: specification
         :return:
         """
-        for item in items:
-            if spec.is_satisfied(item):
-                yield item
+        return filter(compile_specification(spec), items)
 
 
 class AndSpecification(Specification):
@@ -51,6 +137,9 @@ class AndSpecification(Specification):
     def __init__(self, *specifications: Specification):
         self.specifications = specifications
 
+    def __and__(self, other: Specification) -> 'AndSpecification':
+        return AndSpecification(*self.specifications, other)
+
     def is_satisfied(self, item) -> bool:
         """
         The method checks that ALL specifications for item is satisfied conditions
@@ -59,11 +148,153 @@ class AndSpecification(Specification):
             lambda spec: spec.is_satisfied(item), self.specifications
         ))
 
+    def get_specifications(self) -> List[Specification]:
+        """
+        The method return specifications of nested AND specifications as flat list.
+        :return:
+        """
+        result = []
+        for spec in self.specifications:
+            if isinstance(spec, AndSpecification):
+                result.extend(spec.get_specifications())
+            else:
+                result.append(spec)
+        return result
+
+    def estimate_selectivity(self) -> float:
+        selectivity = 1.0
+        for spec in self.specifications:
+            selectivity *= spec.estimate_selectivity()
+        return selectivity
+
+    def get_expression(self, constants: ExpressionConstants) -> str:
+        specifications = sorted(self.get_specifications(), key=lambda spec: spec.estimate_selectivity())
+        return ' and '.join(f'({spec.get_expression(constants)})' for spec in specifications) or 'True'
+
+    def __str__(self) -> str:
+        return '(' + ' AND '.join(str(spec) for spec in self.specifications) + ')'
+
+
+class OrSpecification(Specification):
+    """
+    OR specification
+    """
+    def __init__(self, *specifications: Specification):
+        self.specifications = specifications
+
+    def __or__(self, other: Specification) -> 'OrSpecification':
+        return OrSpecification(*self.specifications, other)
+
+    def is_satisfied(self, item) -> bool:
+        """
+        The method checks that ANY specification for item is satisfied conditions
+        """
+        return any(spec.is_satisfied(item) for spec in self.specifications)
+
+    def get_specifications(self) -> List[Specification]:
+        """
+        The method return specifications of nested OR specifications as flat list.
+        :return:
+        """
+        result = []
+        for spec in self.specifications:
+            if isinstance(spec, OrSpecification):
+                result.extend(spec.get_specifications())
+            else:
+                result.append(spec)
+        return result
+
+    def estimate_selectivity(self) -> float:
+        not_selected = 1.0
+        for spec in self.specifications:
+            not_selected *= 1.0 - spec.estimate_selectivity()
+        return 1.0 - not_selected
+
+    def get_expression(self, constants: ExpressionConstants) -> str:
+        specifications = sorted(self.get_specifications(), key=lambda spec: -spec.estimate_selectivity())
+        return ' or '.join(f'({spec.get_expression(constants)})' for spec in specifications) or 'False'
+
+    def __str__(self) -> str:
+        return '(' + ' OR '.join(str(spec) for spec in self.specifications) + ')'
+
+
+class NotSpecification(Specification):
+    """
+    NOT specification
+    """
+    def __init__(self, specification: Specification):
+        self.specification = specification
+
+    def __invert__(self) -> Specification:
+        return self.specification
+
+    def is_satisfied(self, item) -> bool:
+        """
+        The method checks that specification for item is not satisfied conditions
+        """
+        return not self.specification.is_satisfied(item)
+
+    def estimate_selectivity(self) -> float:
+        return 1.0 - self.specification.estimate_selectivity()
+
+    def get_expression(self, constants: ExpressionConstants) -> str:
+        return f'not ({self.specification.get_expression(constants)})'
+
+    def __str__(self) -> str:
+        return f'NOT {self.specification}'
+
+
+class ValueSpecification(Specification, ABC):
+    """
+    Specification for attribute value or list of values.
+    """
+    attr_name: str = None
+    # Estimated part of items with one value of attribute
+    value_selectivity = 0.1
+
+    @property
+    def value(self):
+        return getattr(self, self.attr_name)
+
+    def estimate_selectivity(self) -> float:
+        if isinstance(self.value, list):
+            return min(self.value_selectivity * len(self.value), 1.0)
+        return self.value_selectivity
+
+    def get_expression(self, constants: ExpressionConstants) -> str:
+        if isinstance(self.value, list):
+            return f'item.{self.attr_name} in {constants.add(frozenset(self.value))}'
+        return f'item.{self.attr_name} == {constants.add(self.value)}'
+
+    def get_values(self) -> list:
+        """
+        The method return list of specification values.
+        :return:
+        """
+        return list(self.value) if isinstance(self.value, list) else [self.value]
 
-class DepartureSpecification(Specification):
+    @classmethod
+    def construct_from_values(cls, values: list) -> 'ValueSpecification':
+        """
+        Create specification for list of values, specification for one value is created for list with one value.
+        :param values: values
+        :return:
+        """
+        return cls(values[0] if len(values) == 1 else list(values))
+
+    def __str__(self) -> str:
+        if isinstance(self.value, list):
+            return f'{self.attr_name} IN ({", ".join(repr(value) for value in self.value)})'
+        return f'{self.attr_name} = {self.value!r}'
+
+
+class DepartureSpecification(ValueSpecification):
     """
     Departure specification
     """
+    attr_name = 'departure'
+    value_selectivity = 0.2
+
     def __init__(self, departure: str):
         super().__init__()
         self.departure = departure
@@ -79,10 +310,13 @@ class DepartureSpecification(Specification):
         return self.departure == item.departure
 
 
-class NightsSpecification(Specification):
+class NightsSpecification(ValueSpecification):
     """
     Nights specification
     """
+    attr_name = 'nights'
+    value_selectivity = 0.1
+
     def __init__(self, nights: str):
         super().__init__()
         self.nights = nights
@@ -98,6 +332,180 @@ class NightsSpecification(Specification):
         return self.nights == item.nights
 
 
+class CountrySpecification(ValueSpecification):
+    """
+    Country specification
+    """
+    attr_name = 'country'
+    value_selectivity = 0.15
+
+    def __init__(self, country: str):
+        super().__init__()
+        self.country = country
+
+    def is_satisfied(self, item) -> bool:
+        """
+        The method give info that item is satisfied conditions
+        :param item: item for check conditions
+        :return:
+        """
+        if isinstance(self.country, list):
+            return item.country in self.country
+        return self.country == item.country
+
+
+class StarsSpecification(ValueSpecification):
+    """
+    Stars specification
+    """
+    attr_name = 'stars'
+    value_selectivity = 0.2
+
+    def __init__(self, stars: str):
+        super().__init__()
+        self.stars = stars
+
+    def is_satisfied(self, item) -> bool:
+        """
+        The method give info that item is satisfied conditions
+        :param item: item for check conditions
+        :return:
+        """
+        if isinstance(self.stars, list):
+            return item.stars in self.stars
+        return self.stars == item.stars
+
+
+class RangeSpecification(Specification):
+    """
+    Range specification. Bounds are kept as keys, which are comparable with keys of item attribute.
+    """
+    attr_name: str = None
+    get_key: Callable[[Any], Any] = staticmethod(lambda value: value)
+
+    def __init__(self, lower=None, upper=None, include_lower: bool = True, include_upper: bool = True):
+        super().__init__()
+        self.lower = self.get_key(lower) if lower is not None else None
+        self.upper = self.get_key(upper) if upper is not None else None
+        self.include_lower = include_lower
+        self.include_upper = include_upper
+
+    @classmethod
+    def construct_from_lookup(cls, lookup: str, value) -> 'RangeSpecification':
+        """
+        The method create range specification from lookup name and value.
+        :param lookup: one of gt, gte, lt, lte, between
+        :param value: bound value or pair of bounds for between
+        :return:
+        """
+        if lookup == 'gt':
+            return cls(lower=value, include_lower=False)
+        if lookup == 'gte':
+            return cls(lower=value)
+        if lookup == 'lt':
+            return cls(upper=value, include_upper=False)
+        if lookup == 'lte':
+            return cls(upper=value)
+        if lookup == 'between':
+            lower, upper = value
+            return cls(lower=lower, upper=upper)
+        raise Exception(f'Lookup {lookup} does not exist')
+
+    @classmethod
+    def construct_from_keys(cls, lower=None, upper=None, include_lower: bool = True,
+                            include_upper: bool = True) -> 'RangeSpecification':
+        """
+        The method create range specification from bounds, which are already converted to keys.
+        :return:
+        """
+        specification = cls()
+        specification.lower, specification.upper = lower, upper
+        specification.include_lower, specification.include_upper = include_lower, include_upper
+        return specification
+
+    def __invert__(self) -> Specification:
+        """
+        The method return complement range or OR of two ranges for range with both bounds.
+        :return:
+        """
+        below = type(self).construct_from_keys(upper=self.lower, include_upper=not self.include_lower)
+        above = type(self).construct_from_keys(lower=self.upper, include_lower=not self.include_upper)
+        if self.lower is not None and self.upper is not None:
+            return OrSpecification(below, above)
+        if self.lower is not None:
+            return below
+        if self.upper is not None:
+            return above
+        return NotSpecification(self)
+
+    def __str__(self) -> str:
+        lower_operator = '<=' if self.include_lower else '<'
+        upper_operator = '<=' if self.include_upper else '<'
+        if self.lower is not None and self.upper is not None:
+            return f'{self.lower!r} {lower_operator} {self.attr_name} {upper_operator} {self.upper!r}'
+        if self.lower is not None:
+            return f'{self.attr_name} {">=" if self.include_lower else ">"} {self.lower!r}'
+        if self.upper is not None:
+            return f'{self.attr_name} {upper_operator} {self.upper!r}'
+        return f'{self.attr_name} is any'
+
+    def estimate_selectivity(self) -> float:
+        if self.lower is not None and self.upper is not None:
+            return 0.25
+        return 0.5
+
+    def get_expression(self, constants: ExpressionConstants) -> str:
+        key = f'{constants.add(self.get_key)}(item.{self.attr_name})'
+        lower_operator = '<=' if self.include_lower else '<'
+        upper_operator = '<=' if self.include_upper else '<'
+        if self.lower is not None and self.upper is not None:
+            return f'{constants.add(self.lower)} {lower_operator} {key} {upper_operator} {constants.add(self.upper)}'
+        if self.lower is not None:
+            return f'{constants.add(self.lower)} {lower_operator} {key}'
+        if self.upper is not None:
+            return f'{key} {upper_operator} {constants.add(self.upper)}'
+        return 'True'
+
+    def is_satisfied(self, item) -> bool:
+        """
+        The method give info that item is satisfied conditions
+        :param item: item for check conditions
+        :return:
+        """
+        key = self.get_key(getattr(item, self.attr_name))
+        if self.lower is not None:
+            if key < self.lower or (key == self.lower and not self.include_lower):
+                return False
+        if self.upper is not None:
+            if key > self.upper or (key == self.upper and not self.include_upper):
+                return False
+        return True
+
+
+class PriceRangeSpecification(RangeSpecification):
+    """
+    Price range specification
+    """
+    attr_name = 'price'
+    get_key = staticmethod(float)
+
+
+class NightsRangeSpecification(RangeSpecification):
+    """
+    Nights range specification
+    """
+    attr_name = 'nights'
+    get_key = staticmethod(int)
+
+
+class DateRangeSpecification(RangeSpecification):
+    """
+    Date range specification
+    """
+    attr_name = 'date'
+    get_key = staticmethod(get_date_key)
+
+
 class SpecificationFactory:
     """
     Specification factory
@@ -105,17 +513,47 @@ class SpecificationFactory:
     specification_types = {
         'departure': DepartureSpecification,
         'nights': NightsSpecification,
+        'country': CountrySpecification,
+        'stars': StarsSpecification,
+    }
+    range_specification_types = {
+        'price': PriceRangeSpecification,
+        'nights': NightsRangeSpecification,
+        'date': DateRangeSpecification,
     }
 
     @staticmethod
     def constract_from_name_and_value(spec_name: str, spec_value) -> Specification:
         """
         The method create specification object from name and value.
+        Range specification name consists of attribute name and lookup, for example price__gte.
         :param spec_name: Specification name
         :param spec_value: Specification value
         :return:
         """
+        if '__' in spec_name:
+            attr_name, lookup = spec_name.split('__', 1)
+            range_specification = SpecificationFactory.range_specification_types.get(attr_name)
+            if range_specification:
+                return range_specification.construct_from_lookup(lookup, spec_value)
+            raise Exception(f'Range specification for {attr_name} does not exist')
+
         specification = SpecificationFactory.specification_types.get(spec_name)
         if specification:
             return specification(spec_value)
         raise Exception(f'Specification for {spec_name} does not exist')
+
+    @staticmethod
+    def constract_from_filter(data_filter: dict) -> Optional[Specification]:
+        """
+        The method create AND specification for all items of filter.
+        :param data_filter: filter (specification name -> specification value)
+        :return: specification or None for empty filter
+        """
+        specification = None
+        for name, value in data_filter.items():
+            if not specification:
+                specification = SpecificationFactory.constract_from_name_and_value(name, value)
+            else:
+                specification = specification & SpecificationFactory.constract_from_name_and_value(name, value)
+        return specification
@@ -6,13 +6,63 @@ This module describes work with tours
 __author__ = 'Artikov A.K.'
 
 
+import logging
 import random
+import threading
+import time
+from pathlib import Path
+from bisect import bisect_left, bisect_right
 from abc import ABC, abstractmethod
-from typing import List, Dict, Union, Optional, Type
+from collections import defaultdict, Counter
+from dataclasses import fields
+from itertools import accumulate
+from typing import List, Dict, Union, Optional, Type, Tuple, Set, Any, Hashable, Sequence, Iterable, Callable
+
+from django.conf import settings
 
 import data
-from .specification import SpecificationFilter, SpecificationFactory
-from ..data_models import BaseModel, Tour, Departure
+from .bitmap import Bitmap, BitmapIndex
+from .columnar import ColumnarTourStore
+from .database import DatabaseTourStore, get_tours_source, get_departures_source
+from .facets import (
+    FacetCache, UnknownFacetError, normalize_filter, count_by_pass, count_by_intersection, count_by_bitmaps,
+    estimate_intersection_cost
+)
+from .instrumentation import stage, add_scanned
+from .pagination import InvalidOrderingError
+from .planner import PlanNode, get_plan, execute_plan, execute_bitmap_plan, get_posting_count
+from .search import SearchIndex
+from .serialization import encode_object
+from .snapshot import CatalogSnapshot, SnapshotTours, SnapshotPositions, write_snapshot
+from .sources import CatalogSource, get_catalog_source
+from .specification import (
+    SpecificationFilter, SpecificationFactory, RangeSpecification, Specification, compile_specification
+)
+from ..data_models import BaseModel, Tour, Departure, CatalogValidationError
+
+
+logger = logging.getLogger(__name__)
+
+# Count of filters, for which facet counts are cached in every data generation
+FACET_CACHE_SIZE = getattr(settings, 'TOURS_FACET_CACHE_SIZE', 1024)
+# Timeout in seconds for requests, which can not be answered by SQL and wait for cache of database controller
+DATABASE_CACHE_TIMEOUT = getattr(settings, 'TOURS_DATABASE_CACHE_TIMEOUT', 60)
+# Interval in seconds, after which failed deferred loading of catalog is started again
+LOAD_RETRY_INTERVAL = getattr(settings, 'TOURS_CATALOG_LOAD_RETRY_INTERVAL', 30)
+
+
+class CatalogUnavailableError(Exception):
+    """
+    Data of controller are not loaded: loading failed or is not finished in timeout.
+    """
+    pass
+
+
+class ReadOnlyCatalogError(RuntimeError):
+    """
+    Data can not be added to catalog, which is read-only, for example to catalog snapshot.
+    """
+    pass
 
 
 class AttrMinMax:
@@ -40,17 +90,355 @@ class AttrMinMax:
         self.max = max(value, self.max) if self.max is not None else value
 
 
+class AttrAggregate(AttrMinMax):
+    """
+    Storage for count, min, max, sum and mean of attribute values.
+    """
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self.sum = 0
+
+    @property
+    def mean(self) -> Optional[float]:
+        """
+        Mean of attribute values.
+        :return:
+        """
+        return self.sum / self.count if self.count else None
+
+    def add(self, value) -> None:
+        """
+        The method adds new value to aggregate.
+        :param value: attribute value
+        :return:
+        """
+        self.count += 1
+        self.sum += value
+        self.try_set_min(value)
+        self.try_set_max(value)
+
+    @classmethod
+    def construct_from_values(cls, count: int, sum_value, min_value, max_value) -> 'AttrAggregate':
+        """
+        Create aggregate from precomputed values.
+        :return:
+        """
+        aggregate = cls()
+        aggregate.count, aggregate.sum, aggregate.min, aggregate.max = count, sum_value, min_value, max_value
+        return aggregate
+
+
+class SortedColumn:
+    """
+    Attribute keys of data, sorted for range lookups by bisect.
+    """
+    def __init__(self, keys_with_ids: List[Tuple[Any, Hashable]]):
+        """
+        Initialisation column
+        :param keys_with_ids: pairs of attribute key and data id
+        """
+        keys_with_ids = sorted(keys_with_ids, key=lambda key_with_id: key_with_id[0])
+        self.keys = [key for key, _ in keys_with_ids]
+        self.ids = [data_id for _, data_id in keys_with_ids]
+        # Keys of chunks, which are appended by extend, are sorted once by sort
+        self._is_sorted = True
+
+    def get_range(self, specification: RangeSpecification) -> Set[Hashable]:
+        """
+        The method return set of data id, which keys are satisfied range specification. It costs O(log n + k).
+        :param specification: range specification
+        :return:
+        """
+        start, end = self.get_bounds(specification)
+        return set(self.ids[start:end])
+
+    def get_bounds(self, specification: RangeSpecification) -> Tuple[int, int]:
+        """
+        The method return start and end of keys, which are satisfied range specification. It costs O(log n).
+        :param specification: range specification
+        :return:
+        """
+        start, end = 0, len(self.keys)
+        if specification.lower is not None:
+            bisect_lower = bisect_left if specification.include_lower else bisect_right
+            start = bisect_lower(self.keys, specification.lower)
+        if specification.upper is not None:
+            bisect_upper = bisect_right if specification.include_upper else bisect_left
+            end = bisect_upper(self.keys, specification.upper)
+        return start, max(start, end)
+
+    @classmethod
+    def construct_from_sorted(cls, keys: Sequence, ids: Sequence) -> 'SortedColumn':
+        """
+        Create column from already sorted keys and ids, for example from arrays of catalog snapshot.
+        :param keys: sorted keys
+        :param ids: data id for keys
+        :return:
+        """
+        sorted_column = cls([])
+        sorted_column.keys, sorted_column.ids = keys, ids
+        return sorted_column
+
+    def extend(self, other: 'SortedColumn') -> None:
+        """
+        The method appends keys of other column. Column is not sorted until sort is called, so chunks
+        of catalog are sorted once after loading instead of sorting of the whole column for every chunk.
+        :param other: sorted column
+        :return:
+        """
+        if not other.keys:
+            return
+        self.keys.extend(other.keys)
+        self.ids.extend(other.ids)
+        self._is_sorted = False
+
+    def sort(self) -> None:
+        """
+        The method sorts keys, which were appended by extend. Appended chunks are sorted runs, which are merged
+        by stable sort in O(n log k) for k chunks, data with equal keys are kept in order of loading.
+        :return:
+        """
+        if self._is_sorted:
+            return
+        keys, ids = self.keys, self.ids
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[position] for position in order]
+        self.ids = [ids[position] for position in order]
+        self._is_sorted = True
+
+
+class DataGeneration:
+    """
+    Generation of controller data: data with indexes, sorted columns and aggregates.
+    Generation is built out of request path and is not changed after publication,
+    so reader, which took generation once, sees consistent data.
+    """
+    def __init__(self, number: int, data: Dict[Hashable, BaseModel], keys: Sequence[Hashable],
+                 positions: Dict[Hashable, int], indexes: Dict[str, Dict[Any, Set[Hashable]]],
+                 sorted_columns: Dict[str, SortedColumn], aggregates: Dict[str, Dict[Any, Dict[str, AttrAggregate]]]):
+        self.number = number
+        self.data = data
+        self.keys = keys
+        self.positions = positions
+        self.indexes = indexes
+        self.sorted_columns = sorted_columns
+        self.aggregates = aggregates
+        self.cumulative_weights = dict()
+        self.json_fragments = dict()
+        self.orderings = dict()
+        # Full-text index, numbers of documents are positions of data
+        self.search_index: Optional[SearchIndex] = None
+        self.facet_cache = FacetCache(FACET_CACHE_SIZE)
+        # Columnar store of data, it is built by columnar controller
+        self.store: Optional[ColumnarTourStore] = None
+
+    def get_cumulative_weights(self, weight: str) -> List[float]:
+        """
+        The method return cumulative weights of data in order of keys. Weights are computed once for generation.
+        :param weight: name of numeric attribute, which is used as weight
+        :return:
+        """
+        cumulative_weights = self.cumulative_weights.get(weight)
+        if cumulative_weights is None:
+            data = self.data
+            cumulative_weights = list(accumulate(float(getattr(data[key], weight)) for key in self.keys))
+            self.cumulative_weights[weight] = cumulative_weights
+        return cumulative_weights
+
+    def get_json_fragments(self, data_ids: Iterable[Hashable], field_names: Tuple[str, ...]) -> List[bytes]:
+        """
+        The method return JSON fragments of data. Every fragment is encoded once for generation.
+        :param data_ids: data id
+        :param field_names: names of serialized attributes
+        :return:
+        """
+        fragments = self.json_fragments
+        result = []
+        for data_id in data_ids:
+            fragment = fragments.get(data_id)
+            if fragment is None:
+                fragment = fragments[data_id] = encode_object(self.data[data_id], field_names)
+            result.append(fragment)
+        return result
+
+
+class DataPage:
+    """
+    Page of data, which were selected from one data generation. Page of database query has no generation,
+    JSON fragments of its data are encoded for page.
+    """
+    def __init__(self, generation: Optional[DataGeneration], items: List[BaseModel], count: int, has_next: bool,
+                 field_names: Tuple[str, ...], scores: List[float] = None):
+        self.generation = generation
+        self.items = items
+        self.count = count
+        self.has_next = has_next
+        self.field_names = field_names
+        # Relevance of data for page of search results
+        self.scores = scores
+
+    @property
+    def last_id(self) -> Optional[Hashable]:
+        """
+        Id of the last data on page, it is key for next page.
+        :return:
+        """
+        return self.items[-1].id if self.items else None
+
+    def get_json_fragments(self) -> List[bytes]:
+        """
+        The method return JSON fragments of data on page.
+        :return:
+        """
+        if self.generation is None:
+            return [encode_object(item, self.field_names) for item in self.items]
+        return self.generation.get_json_fragments((item.id for item in self.items), self.field_names)
+
+
 class BaseController(ABC):
     """
     Base data controller.
     """
-    def __init__(self, dict_data: dict):
+    def __init__(self, dict_data: dict = None):
         """
         Initialisation controller
-        :param dict_data: data for control
+        :param dict_data: data for control. Without data controller is empty until catalog source is loaded.
         """
         self._base_model = self._get_base_model()
-        self._data = self._get_init_data(dict_data)
+        self._serialized_fields = tuple(field.name for field in fields(self._base_model))
+        self._load_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._search_lock = threading.Lock()
+        self._loaded = threading.Event()
+        # Background loading is finished successfully or with error
+        self._load_finished = threading.Event()
+        self._load_error: Optional[Exception] = None
+        self._deferred_source: Optional[Tuple[CatalogSource, int]] = None
+        self._load_started: Optional[float] = None
+        self._generation = self._create_generation(0)
+        if dict_data is not None:
+            generation = self._create_generation(1)
+            self._add_data(generation, self._get_init_data(dict_data))
+            self._publish(generation)
+
+    @property
+    def generation(self) -> int:
+        """
+        Number of current data generation. It is increased on every load of data.
+        :return:
+        """
+        return self._generation.number
+
+    @property
+    def is_loaded(self) -> bool:
+        """
+        Flag, that all data of controller are loaded.
+        :return:
+        """
+        return self._loaded.is_set()
+
+    @property
+    def load_error(self) -> Optional[Exception]:
+        """
+        Error of the last loading in background, None if loading is running or succeeded.
+        :return:
+        """
+        return self._load_error
+
+    def wait_loaded(self, timeout: float = None) -> bool:
+        """
+        The method waits for the end of data loading. Deferred loading is started, if it is not started yet.
+        :param timeout: timeout in seconds
+        :return: True if data are loaded, False if loading failed or is not finished in timeout
+        """
+        if self._loaded.is_set():
+            return True
+        self.start_loading()
+        self._load_finished.wait(timeout)
+        return self._loaded.is_set()
+
+    def load(self, source: CatalogSource, chunk_size: int = 10000, background: bool = None) -> None:
+        """
+        The method loads data from catalog source by chunks into new data generation.
+        Requests are served by current generation, until new generation is built and swapped atomically.
+        Error of loading in background is logged and kept in load_error, current generation is kept.
+        :param source: catalog source
+        :param chunk_size: count of records in chunk
+        :param background: load data in background thread, by default it is defined by source
+        :return:
+        """
+        if background is None:
+            background = source.background_loading
+        if background:
+            self._load_error = None
+            self._load_finished.clear()
+            threading.Thread(
+                target=self._load_in_background, args=(source, chunk_size), name=f'{type(self).__name__}-loader',
+                daemon=True
+            ).start()
+            return
+
+        with self._load_lock:
+            generation = self._create_generation(self._generation.number + 1)
+            for chunk in source.iter_chunks(chunk_size):
+                self._add_data(generation, self._get_init_data(dict(chunk)))
+            self._publish(generation)
+            self._load_error = None
+
+    def defer_load(self, source: CatalogSource, chunk_size: int = 10000) -> None:
+        """
+        The method keeps catalog source, which is loaded in background by start_loading at worker start
+        or on the first wait for data. So source, which reads database, is not read on import of module.
+        :param source: catalog source
+        :param chunk_size: count of records in chunk
+        :return:
+        """
+        self._deferred_source = (source, chunk_size)
+
+    def start_loading(self) -> bool:
+        """
+        The method starts loading of deferred catalog source in background, if data are not loaded.
+        Loading is started once, failed loading is started again not earlier than in LOAD_RETRY_INTERVAL seconds.
+        :return: True if loading is started
+        """
+        if self._deferred_source is None or self._loaded.is_set():
+            return False
+        with self._start_lock:
+            now = time.monotonic()
+            if self._load_started is not None and (
+                    self._load_error is None or now - self._load_started < LOAD_RETRY_INTERVAL
+            ):
+                return False
+            self._load_started = now
+            source, chunk_size = self._deferred_source
+            self.load(source, chunk_size, background=True)
+        return True
+
+    def reload(self, source: CatalogSource, chunk_size: int = 10000) -> int:
+        """
+        The method builds new data generation from catalog source and swaps it with current generation.
+        :param source: catalog source
+        :param chunk_size: count of records in chunk
+        :return: number of new generation
+        """
+        self.load(source, chunk_size, background=False)
+        return self.generation
+
+    def _load_in_background(self, source: CatalogSource, chunk_size: int) -> None:
+        """
+        Load data in background thread. Error is not raised in thread, it is logged and kept for requests.
+        :param source: catalog source
+        :param chunk_size: count of records in chunk
+        :return:
+        """
+        try:
+            self.load(source, chunk_size, background=False)
+        except Exception as error:
+            self._load_error = error
+            logger.exception('%s data are not loaded, generation %s is kept', type(self).__name__, self.generation)
+        finally:
+            self._load_finished.set()
 
     def get(self, data_filter: dict = None) -> Union[List[BaseModel], None]:
         """
@@ -58,36 +446,359 @@ class BaseController(ABC):
         :param data_filter: filter for select data.
         :return:
         """
+        generation = self._generation
         if data_filter is None:
-            result = self._data.values()
+            result = list(generation.data.values())
         elif 'random' in data_filter:
-            result = self._get_by_random(data_filter.get('random'))
+            data_filter = dict(data_filter)
+            random_count = data_filter.pop('random')
+            result = self._get_by_random(generation, random_count, data_filter.pop('random_weight', None), data_filter)
         elif 'id' in data_filter:
-            result = self._get_by_id(data_filter.get('id'))
+            result = self._get_by_id(generation, data_filter.get('id'))
             result = [result] if result else []
         else:
-            result = self._get_by_filter(data_filter)
+            with stage('filter') as current_stage:
+                result = self._get_by_filter(generation, data_filter)
+                current_stage.returned = len(result)
 
         return result
 
-    @staticmethod
-    def get_min_max_attr_for_data(list_of_data: List[BaseModel], *attr_names: str) -> Optional[Dict[str, AttrMinMax]]:
+    def get_by_specification(self, specification: Specification) -> List[BaseModel]:
+        """
+        The method return data, which are satisfied specification with AND, OR and NOT combinators,
+        in order of controller data. Specification is answered by query plan (see explain).
+        :param specification: specification
+        :return:
+        """
+        with stage('specification') as current_stage:
+            result = self._get_by_specification(self._generation, specification)
+            current_stage.returned = len(result)
+        return result
+
+    def explain(self, specification: Specification) -> str:
+        """
+        The method return query plan of specification with estimated count of data and cost of every node.
+        :param specification: specification
+        :return:
+        """
+        return self._get_plan(self._generation, specification).explain()
+
+    def search(self, query: str, data_filter: dict = None, limit: int = 20) -> DataPage:
+        """
+        The method return the most relevant data for full-text query, data are ranked by BM25.
+        :param query: text of query
+        :param data_filter: filter, data are searched among data, which are satisfied filter
+        :param limit: count of data
+        :return: page with data in order of relevance and their scores
+        """
+        generation = self._generation
+        search_index = self._get_search_index(generation)
+        candidates = None
+        if data_filter:
+            positions = generation.positions
+            candidates = {positions[item.id] for item in self._get_by_filter(generation, data_filter)}
+        results = search_index.search(query, limit, candidates) if search_index is not None else []
+        data, keys = generation.data, generation.keys
+        return DataPage(
+            generation, [data[keys[number]] for number, _ in results], len(results), False, self._serialized_fields,
+            scores=[score for _, score in results]
+        )
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        The method return the most frequent words of data texts, which start with the last word of prefix.
+        :param prefix: beginning of query
+        :param limit: count of words
+        :return:
+        """
+        search_index = self._get_search_index(self._generation)
+        return search_index.complete(prefix, limit) if search_index is not None else []
+
+    def build_search_index(self) -> None:
+        """
+        The method builds full-text index of current data generation and sorts postings of frequent terms
+        by score, so the first search does not wait for them.
+        :return:
+        """
+        search_index = self._get_search_index(self._generation)
+        if search_index is not None:
+            search_index.rank_postings()
+
+    def get_facets(self, data_filter: dict = None, facets: Iterable[str] = None) -> Dict[str, Dict[Any, int]]:
+        """
+        The method return counts of data by values of attributes (facets) for data, which are satisfied filter.
+        Every facet is counted by sizes of index postings (without filter), by intersections of selected data
+        with postings or in one pass over selected data, the cheapest way is chosen.
+        Counts are cached in generation by normalized filter.
+        :param data_filter: filter for select data
+        :param facets: attribute names, all facet attributes by default
+        :return: attribute name -> value -> count, values are in order of count
+        :raises UnknownFacetError: if data can not be counted by attribute
+        """
+        facet_attributes = self._get_facet_attributes()
+        facets = tuple(facets) if facets is not None else facet_attributes
+        unknown_facets = [facet for facet in facets if facet not in facet_attributes]
+        if unknown_facets:
+            raise UnknownFacetError(f'{self._base_model.__name__} can not be counted by {", ".join(unknown_facets)}')
+
+        generation = self._generation
+        key = (normalize_filter(data_filter), facets)
+        counts = generation.facet_cache.get(key)
+        if counts is None:
+            counts = self._count_facets(generation, data_filter, facets)
+            generation.facet_cache.set(key, counts)
+        return counts
+
+    def find(self, data_id: Hashable) -> Optional[BaseModel]:
+        """
+        The method return data by id in one lookup.
+        :param data_id: data id
+        :return: data or None, if data does not exist
+        """
+        return self._get_by_id(self._generation, data_id)
+
+    def get_many(self, data_ids: Iterable[Hashable]) -> List[BaseModel]:
+        """
+        The method return data by several id from one data generation.
+        :param data_ids: data id
+        :return: data in order of id, data, which do not exist, are skipped
+        """
+        generation = self._generation
+        result = []
+        for data_id in data_ids:
+            current_data = self._get_by_id(generation, data_id)
+            if current_data is not None:
+                result.append(current_data)
+        return result
+
+    def get_page(
+            self, data_filter: dict = None, after: Hashable = None, limit: int = 20, order_by: str = None
+    ) -> DataPage:
+        """
+        The method return page of data, which starts after data with id `after` (keyset pagination),
+        so page is found by bisect without skipping of previous pages.
+        :param data_filter: filter for select data
+        :param after: id of the last data on previous page
+        :param limit: count of data on page
+        :param order_by: attribute name for sorting, with minus for descending order (-price),
+        data are in order of controller data by default
+        :return:
+        :raises KeyError: if data with id `after` does not exist
+        :raises InvalidOrderingError: if data can not be sorted by attribute
+        """
+        generation = self._generation
+        ordered_ids = self._get_ordered_ids(generation, data_filter, order_by)
+        start = 0
+        if after is not None:
+            if after not in generation.positions:
+                raise KeyError(after)
+            start = bisect_right(
+                ordered_ids, self._get_order_key(generation, after, order_by),
+                key=lambda data_id: self._get_order_key(generation, data_id, order_by)
+            )
+        return self._get_data_page(generation, ordered_ids, start, limit)
+
+    def get_page_by_number(
+            self, number: int, size: int, data_filter: dict = None, order_by: str = None
+    ) -> DataPage:
+        """
+        The method return page of data by number. Orderings of all data and of data with value of ordering
+        dimension (departure for tours) are sorted once for data generation, so page costs O(size).
+        :param number: page number from 1
+        :param size: count of data on page
+        :param data_filter: filter for select data
+        :param order_by: attribute name for sorting, with minus for descending order (-price)
+        :return:
+        :raises InvalidOrderingError: if data can not be sorted by attribute
+        """
+        generation = self._generation
+        ordered_ids = self._get_ordered_ids(generation, data_filter, order_by)
+        return self._get_data_page(generation, ordered_ids, (number - 1) * size, size)
+
+    def get_json_fragments(self, data_ids: Iterable[Hashable] = None) -> List[bytes]:
+        """
+        The method return JSON fragments of data by id from one data generation.
+        :param data_ids: data id, all data by default
+        :return: fragments in order of id, data, which do not exist, are skipped
+        """
+        generation = self._generation
+        if data_ids is None:
+            data_ids = generation.keys
+        else:
+            data_ids = [data_id for data_id in data_ids if self._get_by_id(generation, data_id) is not None]
+        return generation.get_json_fragments(data_ids, self._serialized_fields)
+
+    def sample(self, count: int, weight: str = None, data_filter: dict = None) -> List[BaseModel]:
+        """
+        The method return random data without repeats. Without filter it costs O(count) (O(count * log n) for weights).
+        :param count: count of random data, if there is less data, all data are returned
+        :param weight: name of numeric attribute, which is used as weight of data, for example stars
+        :param data_filter: filter, data are sampled among data, which are satisfied filter
+        :return:
+        """
+        return self._get_by_random(self._generation, count, weight, data_filter)
+
+    def get_min_max_attr_for_data(
+            self, list_of_data: List[BaseModel], *attr_names: str, data_filter: dict = None
+    ) -> Optional[Dict[str, AttrMinMax]]:
         """
-        The method return min and max value for attributes in list of data
+        The method return min and max value for attributes in list of data.
+        If list of data was selected by filter for one aggregated dimension, result is taken from aggregates.
         :param list_of_data: list of data
         :param attr_names: attribute names
+        :param data_filter: filter, which was used for select list of data
         :return:
         """
-        result = {attr_name: AttrMinMax() for attr_name in attr_names}
+        with stage('min_max') as current_stage:
+            result = self._get_min_max_attr_from_aggregates(data_filter, *attr_names)
+            if result is not None:
+                return result
+
+            result = {attr_name: AttrMinMax() for attr_name in attr_names}
 
-        for current_data in list_of_data:
-            for attr, min_max in result.items():
-                tour_attr_value = getattr(current_data, attr)
-                min_max.try_set_min(tour_attr_value)
-                min_max.try_set_max(tour_attr_value)
+            for current_data in list_of_data:
+                for attr, min_max in result.items():
+                    tour_attr_value = getattr(current_data, attr)
+                    min_max.try_set_min(tour_attr_value)
+                    min_max.try_set_max(tour_attr_value)
+            current_stage.scanned = len(list_of_data)
 
         return result
 
+    def get_aggregates(self, dimension: str, value) -> Optional[Dict[str, AttrAggregate]]:
+        """
+        The method return precomputed aggregates of data with attribute value.
+        :param dimension: name of aggregated dimension (attribute)
+        :param value: attribute value
+        :return: aggregates by attribute name or None, if dimension is not aggregated
+        """
+        dimension_aggregates = self._generation.aggregates.get(dimension)
+        if dimension_aggregates is None:
+            return None
+        aggregates = dimension_aggregates.get(value)
+        if aggregates is None:
+            return {attr_name: AttrAggregate() for attr_name in self._get_aggregated_attributes()}
+        return aggregates
+
+    def _get_data_page(
+            self, generation: DataGeneration, ordered_ids: Sequence[Hashable], start: int, size: int
+    ) -> DataPage:
+        """
+        Return page of ordered data.
+        :param generation: data generation
+        :param ordered_ids: id of data in order
+        :param start: index of the first data on page
+        :param size: count of data on page
+        :return:
+        """
+        start = max(start, 0)
+        data = generation.data
+        items = [data[data_id] for data_id in ordered_ids[start:start + size]]
+        return DataPage(generation, items, len(ordered_ids), start + size < len(ordered_ids), self._serialized_fields)
+
+    def _get_ordered_ids(
+            self, generation: DataGeneration, data_filter: Optional[dict], order_by: Optional[str]
+    ) -> Sequence[Hashable]:
+        """
+        Return id of data, which are satisfied filter, in order. Orderings for filter without conditions
+        or with one value of ordering dimension are kept in generation.
+        :param generation: data generation
+        :param data_filter: filter for select data
+        :param order_by: attribute name for sorting, with minus for descending order
+        :return:
+        """
+        if order_by is not None:
+            self._get_sort_key(order_by)
+        if not data_filter and order_by is None:
+            return generation.keys
+
+        ordering_key = self._get_ordering_key(generation, data_filter, order_by)
+        ordered_ids = generation.orderings.get(ordering_key) if ordering_key is not None else None
+        if ordered_ids is None:
+            if data_filter:
+                ordered_ids = [item.id for item in self._get_by_filter(generation, data_filter)]
+            else:
+                ordered_ids = list(generation.keys)
+            if order_by is not None:
+                ordered_ids.sort(key=lambda data_id: self._get_order_key(generation, data_id, order_by))
+            if ordering_key is not None:
+                generation.orderings[ordering_key] = ordered_ids
+        return ordered_ids
+
+    def _get_ordering_key(
+            self, generation: DataGeneration, data_filter: Optional[dict], order_by: Optional[str]
+    ) -> Optional[tuple]:
+        """
+        Return key of ordering, which is kept in generation, or None, if ordering for filter is not kept.
+        Orderings are kept only for existing values of dimension.
+        :param generation: data generation
+        :param data_filter: filter for select data
+        :param order_by: attribute name for sorting
+        :return:
+        """
+        if not data_filter:
+            return None, None, order_by
+        if len(data_filter) != 1:
+            return None
+        (dimension, value), = data_filter.items()
+        if dimension not in self._get_ordering_dimensions() or isinstance(value, list):
+            return None
+        if value not in generation.indexes.get(dimension, ()):
+            return None
+        return dimension, value, order_by
+
+    def _get_order_key(self, generation: DataGeneration, data_id: Hashable, order_by: Optional[str]) -> tuple:
+        """
+        Return sort key of data. Data with equal attribute values keep order of controller data.
+        :param generation: data generation
+        :param data_id: data id
+        :param order_by: attribute name for sorting, with minus for descending order
+        :return:
+        """
+        position = generation.positions[data_id]
+        if order_by is None:
+            return position,
+        attr_name = order_by.lstrip('-')
+        key = self._get_sort_key(order_by)(getattr(generation.data[data_id], attr_name))
+        return (-key if order_by.startswith('-') else key), position
+
+    def _get_sort_key(self, order_by: str) -> Callable:
+        """
+        Return function, which converts attribute value to sort key.
+        :param order_by: attribute name for sorting, with minus for descending order
+        :return:
+        :raises InvalidOrderingError: if data can not be sorted by attribute
+        """
+        sort_key = self._get_sort_keys().get(order_by.lstrip('-'))
+        if sort_key is None:
+            raise InvalidOrderingError(f'{self._base_model.__name__} can not be sorted by {order_by}')
+        return sort_key
+
+    def get_dimension_aggregates(self, dimension: str) -> Optional[Dict[Any, Dict[str, AttrAggregate]]]:
+        """
+        The method return precomputed aggregates for all values of dimension.
+        :param dimension: name of aggregated dimension (attribute)
+        :return: aggregates by attribute value or None, if dimension is not aggregated
+        """
+        return self._generation.aggregates.get(dimension)
+
+    def _get_min_max_attr_from_aggregates(self, data_filter: Optional[dict], *attr_names: str) -> Optional[dict]:
+        """
+        Return min and max value for attributes from aggregates, if it is possible for filter.
+        :param data_filter: filter for data
+        :param attr_names: attribute names
+        :return:
+        """
+        if not data_filter or len(data_filter) != 1:
+            return None
+        (dimension, value), = data_filter.items()
+        if isinstance(value, list):
+            return None
+        aggregates = self.get_aggregates(dimension, value)
+        if aggregates is None or not all(attr_name in aggregates for attr_name in attr_names):
+            return None
+        return {attr_name: aggregates[attr_name] for attr_name in attr_names}
+
     @abstractmethod
     def _get_base_model(self) -> Type[BaseModel]:
         """
@@ -96,51 +807,433 @@ class BaseController(ABC):
         """
         pass
 
+    def save_snapshot(self, path: Union[str, Path], departures: Dict[str, str]) -> None:
+        """
+        The method writes controller data with indexes and aggregates to catalog snapshot.
+        :param path: snapshot path
+        :param departures: departures in format of data.departures
+        :return:
+        """
+        generation = self._generation
+        write_snapshot(
+            path,
+            tours=list(generation.data.values()),
+            indexes=generation.indexes,
+            sorted_columns={
+                attr_name: (sorted_column.keys, sorted_column.ids)
+                for attr_name, sorted_column in generation.sorted_columns.items()
+            },
+            aggregates={
+                dimension: {
+                    value: {
+                        attr_name: (aggregate.count, aggregate.sum, aggregate.min, aggregate.max)
+                        for attr_name, aggregate in value_aggregates.items()
+                    }
+                    for value, value_aggregates in dimension_aggregates.items()
+                }
+                for dimension, dimension_aggregates in generation.aggregates.items()
+            },
+            departures=departures,
+        )
+
+    def _get_indexed_attributes(self) -> Tuple[str, ...]:
+        """
+        The method return names of attributes, which have inverted index in controller.
+        :return:
+        """
+        return tuple()
+
+    def _get_search_fields(self) -> Dict[str, int]:
+        """
+        The method return names of text attributes for full-text search with their weights.
+        :return:
+        """
+        return dict()
+
+    def _get_search_index(self, generation: DataGeneration) -> Optional[SearchIndex]:
+        """
+        Return full-text index of generation. Index is not built during load of data, it is built once
+        by build_search_index out of request path or on the first search.
+        :param generation: data generation
+        :return: index or None, if controller has no search fields
+        """
+        if generation.search_index is None and self._get_search_fields():
+            with self._search_lock:
+                if generation.search_index is None:
+                    search_index = SearchIndex()
+                    self._add_to_search_index(search_index, (generation.data[key] for key in generation.keys))
+                    generation.search_index = search_index
+        return generation.search_index
+
+    def _add_to_search_index(self, search_index: SearchIndex, items: Iterable[BaseModel]) -> None:
+        """
+        Add texts of data to full-text index.
+        :param search_index: full-text index
+        :param items: data in order of generation
+        :return:
+        """
+        search_fields = self._get_search_fields().items()
+        for item in items:
+            search_index.add((getattr(item, field_name), weight) for field_name, weight in search_fields)
+
+    def _get_facet_attributes(self) -> Tuple[str, ...]:
+        """
+        The method return names of attributes, which data can be counted by.
+        :return:
+        """
+        return tuple()
+
+    def _count_facets(
+            self, generation: DataGeneration, data_filter: Optional[dict], facets: Tuple[str, ...]
+    ) -> Dict[str, Dict[Any, int]]:
+        """
+        Count data, which are satisfied filter, by values of attributes.
+        :param generation: data generation
+        :param data_filter: filter for select data
+        :param facets: attribute names
+        :return:
+        """
+        indexes = generation.indexes
+        counters = dict()
+        if not data_filter:
+            items = generation.data.values()
+            for facet in facets:
+                index = indexes.get(facet)
+                if index is not None:
+                    counters[facet] = Counter({value: get_posting_count(index, value) for value in index})
+        else:
+            items = self._get_by_filter(generation, data_filter)
+            selected_ids = None
+            for facet in facets:
+                index = indexes.get(facet)
+                if index is None or estimate_intersection_cost(len(items), index) >= len(items):
+                    continue
+                if selected_ids is None:
+                    selected_ids = {item.id for item in items}
+                counters[facet] = count_by_intersection(selected_ids, index)
+
+        pass_facets = tuple(facet for facet in facets if facet not in counters)
+        if pass_facets:
+            counters.update(count_by_pass(items, pass_facets))
+        return {facet: dict(counters[facet].most_common()) for facet in facets}
+
+    def _get_sort_keys(self) -> Dict[str, Callable]:
+        """
+        The method return functions, which convert attribute value to numeric sort key,
+        for attributes, which data can be sorted by.
+        :return:
+        """
+        return dict()
+
+    def _get_ordering_dimensions(self) -> Tuple[str, ...]:
+        """
+        The method return names of attributes, for which values orderings of data are kept in generation.
+        :return:
+        """
+        return tuple()
+
+    def _get_init_indexes(self, data: Dict[Hashable, BaseModel]) -> Dict[str, Dict[Any, Set[Hashable]]]:
+        """
+        Init inverted indexes (attribute value -> set of data id) for indexed attributes.
+        :param data: controller data
+        :return:
+        """
+        indexes = {attr_name: defaultdict(set) for attr_name in self._get_indexed_attributes()}
+        for data_id, current_data in data.items():
+            for attr_name, index in indexes.items():
+                index[getattr(current_data, attr_name)].add(data_id)
+        return {attr_name: dict(index) for attr_name, index in indexes.items()}
+
+    def _get_range_indexed_attributes(self) -> Tuple[str, ...]:
+        """
+        The method return names of attributes, which have sorted column for range lookups.
+        :return:
+        """
+        return tuple()
+
+    def _get_init_sorted_columns(self, data: Dict[Hashable, BaseModel]) -> Dict[str, SortedColumn]:
+        """
+        Init sorted columns for attributes with range lookups.
+        :param data: controller data
+        :return:
+        """
+        sorted_columns = dict()
+        for attr_name in self._get_range_indexed_attributes():
+            get_key = SpecificationFactory.range_specification_types[attr_name].get_key
+            sorted_columns[attr_name] = SortedColumn([
+                (get_key(getattr(current_data, attr_name)), data_id) for data_id, current_data in data.items()
+            ])
+        return sorted_columns
+
+    def _get_aggregate_dimensions(self) -> Tuple[str, ...]:
+        """
+        The method return names of attributes, for which values aggregates are precomputed.
+        :return:
+        """
+        return tuple()
+
+    def _get_aggregated_attributes(self) -> Tuple[str, ...]:
+        """
+        The method return names of numeric attributes, which are aggregated.
+        :return:
+        """
+        return tuple()
+
+    def _get_init_aggregates(self, data: Dict[Hashable, BaseModel]) -> Dict[str, Dict[Any, Dict[str, AttrAggregate]]]:
+        """
+        Init aggregates table: dimension -> dimension value -> attribute name -> aggregate.
+        :param data: controller data
+        :return:
+        """
+        aggregates = {dimension: dict() for dimension in self._get_aggregate_dimensions()}
+        for current_data in data.values():
+            self._add_to_aggregates(aggregates, current_data)
+        return aggregates
+
+    def _add_to_aggregates(self, aggregates: Dict[str, Dict[Any, Dict[str, AttrAggregate]]], item: BaseModel) -> None:
+        """
+        Add item attributes to aggregates table.
+        :param aggregates: aggregates table
+        :param item: data item
+        :return:
+        """
+        for dimension, dimension_aggregates in aggregates.items():
+            value_aggregates = dimension_aggregates.get(getattr(item, dimension))
+            if value_aggregates is None:
+                value_aggregates = {attr_name: AttrAggregate() for attr_name in self._get_aggregated_attributes()}
+                dimension_aggregates[getattr(item, dimension)] = value_aggregates
+            for attr_name, aggregate in value_aggregates.items():
+                aggregate.add(getattr(item, attr_name))
+
+    def _create_generation(self, number: int) -> DataGeneration:
+        """
+        Create empty data generation.
+        :param number: generation number
+        :return:
+        """
+        generation = DataGeneration(
+            number=number,
+            data=dict(),
+            keys=list(),
+            positions=dict(),
+            indexes=self._get_init_indexes(dict()),
+            sorted_columns=self._get_init_sorted_columns(dict()),
+            aggregates=self._get_init_aggregates(dict()),
+        )
+        return generation
+
+    def _publish(self, generation: DataGeneration) -> None:
+        """
+        Swap current data generation with new generation. Assignment is atomic for readers.
+        Sorted columns, which were extended by chunks of data, are sorted before publication.
+        :param generation: new generation
+        :return:
+        """
+        for sorted_column in generation.sorted_columns.values():
+            sorted_column.sort()
+        self._generation = generation
+        self._loaded.set()
+
+    def _add_data(self, generation: DataGeneration, data: Dict[Hashable, BaseModel]) -> None:
+        """
+        Add data with indexes, sorted columns and aggregates to generation, which is not published yet.
+        :param generation: data generation
+        :param data: data by id
+        :return:
+        """
+        duplicates = [data_id for data_id in data if data_id in generation.data]
+        if duplicates:
+            raise CatalogValidationError([
+                f'{self._base_model.__name__} {data_id}: duplicate id' for data_id in duplicates
+            ])
+
+        for data_id, current_data in data.items():
+            generation.data[data_id] = current_data
+            generation.positions[data_id] = len(generation.keys)
+            generation.keys.append(data_id)
+        self._add_to_indexes(generation, data)
+        for attr_name, sorted_column in self._get_init_sorted_columns(data).items():
+            generation.sorted_columns[attr_name].extend(sorted_column)
+        for current_data in data.values():
+            self._add_to_aggregates(generation.aggregates, current_data)
+
+    def _add_to_indexes(self, generation: DataGeneration, data: Dict[Hashable, BaseModel]) -> None:
+        """
+        Add data id to inverted indexes of generation.
+        :param generation: data generation
+        :param data: data by id, which are added to generation
+        :return:
+        """
+        for attr_name, index in self._get_init_indexes(data).items():
+            for value, posting in index.items():
+                generation.indexes[attr_name].setdefault(value, set()).update(posting)
+
     def _get_init_data(self, dict_data: dict) -> Dict[int, BaseModel]:
         """
         Init data for controller from dict
         :param dict_data:
         :return:
         """
-        result = dict()
-        for data_id, current_data in dict_data.items():
-            result[data_id] = self._base_model.construct_from_dict(dict_data={**{'id': data_id}, **current_data})
-        return result
+        return self._base_model.construct_many(dict_data.items())
 
-    def _get_by_filter(self, data_filter: dict) -> List[BaseModel]:
+    def _get_by_filter(self, generation: DataGeneration, data_filter: dict) -> List[BaseModel]:
         """
         Return data from controller by filter.
+        Filters with inverted index are resolved by intersection of index posting sets (the smallest set first),
+        other filters are checked by specification only for data, which remained after intersection.
+        :param generation: data generation
         :param data_filter: filter
         :return:
         """
-        specification = None
+        postings = []
+        not_indexed_filter = dict()
         for name, value in data_filter.items():
-            if not specification:
-                specification = SpecificationFactory.constract_from_name_and_value(name, value)
+            posting = self._get_posting(generation, name, value)
+            if posting is not None:
+                postings.append(posting)
             else:
-                specification = specification & SpecificationFactory.constract_from_name_and_value(name, value)
+                not_indexed_filter[name] = value
+        specification = SpecificationFactory.constract_from_filter(not_indexed_filter)
+
+        if postings:
+            items = [generation.data[data_id] for data_id in self._intersect_postings(generation, postings)]
+        else:
+            items = generation.data.values()
+        add_scanned(len(items))
+
+        if not specification:
+            return list(items)
 
         tf = SpecificationFilter()
 
-        return list(tf.filter(self._data.values(), specification))
+        return list(tf.filter(items, specification))
 
-    def _get_by_id(self, data_id: int) -> BaseModel:
+    def _get_plan(self, generation: DataGeneration, specification: Specification) -> PlanNode:
+        """
+        Return query plan of specification for generation.
+        :param generation: data generation
+        :param specification: specification
+        :return:
+        """
+        return get_plan(generation, specification)
+
+    def _get_by_specification(self, generation: DataGeneration, specification: Specification) -> List[BaseModel]:
+        """
+        Return data, which are satisfied specification, by query plan.
+        :param generation: data generation
+        :param specification: specification
+        :return:
+        """
+        data = generation.data
+        return [data[data_id] for data_id in execute_plan(generation, self._get_plan(generation, specification))]
+
+    def _get_posting(self, generation: DataGeneration, attr_name: str, value) -> Optional[Set[Hashable]]:
+        """
+        Return set of data id for attribute value from inverted index or for range lookup from sorted column.
+        :param generation: data generation
+        :param attr_name: attribute name or attribute name with range lookup (price__gte)
+        :param value: attribute value or list of values
+        :return: set of data id or None, if attribute has no index
+        """
+        if '__' in attr_name:
+            sorted_column = generation.sorted_columns.get(attr_name.split('__', 1)[0])
+            if sorted_column is None:
+                return None
+            return sorted_column.get_range(SpecificationFactory.constract_from_name_and_value(attr_name, value))
+
+        index = generation.indexes.get(attr_name)
+        if index is None:
+            return None
+        if isinstance(value, list):
+            return set().union(*(index.get(current_value, ()) for current_value in value))
+        return index.get(value, set())
+
+    def _intersect_postings(self, generation: DataGeneration, postings: List[Set[Hashable]]) -> List[Hashable]:
+        """
+        Return data id, which exist in all postings, in order of controller data.
+        :param generation: data generation
+        :param postings: sets of data id
+        :return:
+        """
+        postings = sorted(postings, key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            if not result:
+                break
+            result.intersection_update(posting)
+        return sorted(result, key=generation.positions.__getitem__)
+
+    def _get_by_id(self, generation: DataGeneration, data_id: int) -> BaseModel:
         """
         Return data from controller by id
+        :param generation: data generation
         :param data_id: data id
         :return:
         """
-        return self._data.get(data_id)
+        return generation.data.get(data_id)
 
-    def _get_by_random(self, random_count: int) -> List[BaseModel]:
+    def _get_by_random(
+            self, generation: DataGeneration, random_count: int, weight: str = None, data_filter: dict = None
+    ) -> List[BaseModel]:
         """
         Return random data from controller
+        :param generation: data generation
         :param random_count: count random data
+        :param weight: name of numeric attribute, which is used as weight of data
+        :param data_filter: filter for data, which are sampled
+        :return:
+        """
+        if data_filter:
+            items = self._get_by_filter(generation, data_filter)
+            if weight is None:
+                return random.sample(items, min(random_count, len(items)))
+            return self._get_weighted_sample(
+                items, list(accumulate(float(getattr(item, weight)) for item in items)), random_count
+            )
+
+        keys = generation.keys
+        if weight is None:
+            return [generation.data[keys[row]] for row in random.sample(range(len(keys)), min(random_count, len(keys)))]
+        rows = self._get_weighted_sample(range(len(keys)), generation.get_cumulative_weights(weight), random_count)
+        return [generation.data[keys[row]] for row in rows]
+
+    @staticmethod
+    def _get_weighted_sample(population: Sequence, cumulative_weights: Sequence[float], count: int) -> list:
+        """
+        Return weighted random sample without repeats. Every choice costs O(log n), repeated choices are skipped,
+        if choices are repeated too often, sample is filled by the first items, which are not chosen.
+        :param population: population
+        :param cumulative_weights: cumulative weights of population
+        :param count: count of items in sample
         :return:
         """
-        allow_data_keys = self._data.keys()
-        random_data_keys = set(random.sample(allow_data_keys, random_count))
-        return [key_data for key, key_data in self._data.items() if key in random_data_keys]
+        count = min(count, len(population))
+        if not count or cumulative_weights[-1] <= 0:
+            return random.sample(population, count)
+
+        chosen = dict()
+        attempts = 0
+        while len(chosen) < count and attempts < count * 20:
+            for position in random.choices(range(len(population)), cum_weights=cumulative_weights, k=count):
+                chosen.setdefault(position, None)
+            attempts += count
+        if len(chosen) < count:
+            # Choices are repeated, when few items have the most of weight, or items have zero weight:
+            # sample is filled by items in order of population, items with positive weight first
+            zero_positions = []
+            previous_weight = 0.0
+            for position, cumulative_weight in enumerate(cumulative_weights):
+                if len(chosen) == count:
+                    break
+                if position not in chosen:
+                    if cumulative_weight > previous_weight:
+                        chosen[position] = None
+                    else:
+                        zero_positions.append(position)
+                previous_weight = cumulative_weight
+            chosen.update(dict.fromkeys(zero_positions[:count - len(chosen)]))
+        positions = list(chosen)[:count]
+        return [population[position] for position in positions]
 
 
 class TourController(BaseController):
@@ -150,6 +1243,73 @@ class TourController(BaseController):
     def _get_base_model(self) -> Type[BaseModel]:
         return Tour
 
+    def _get_indexed_attributes(self) -> Tuple[str, ...]:
+        return 'departure', 'nights', 'country', 'stars'
+
+    def _get_range_indexed_attributes(self) -> Tuple[str, ...]:
+        return 'price', 'nights', 'date'
+
+    def _get_aggregate_dimensions(self) -> Tuple[str, ...]:
+        return 'departure', 'country', 'nights'
+
+    def _get_aggregated_attributes(self) -> Tuple[str, ...]:
+        return 'price', 'nights'
+
+    def _get_sort_keys(self) -> Dict[str, Callable]:
+        return {'price': float, 'nights': int, 'stars': int}
+
+    def _get_ordering_dimensions(self) -> Tuple[str, ...]:
+        return 'departure',
+
+    def _get_search_fields(self) -> Dict[str, int]:
+        return {'title': 2, 'country': 1, 'description': 1}
+
+    def _get_facet_attributes(self) -> Tuple[str, ...]:
+        return 'departure', 'country', 'stars', 'nights'
+
+
+class SnapshotTourController(TourController):
+    """
+    The class allows manipulating with tours data from catalog snapshot. Snapshot is mapped to memory read-only,
+    so worker processes share its pages, and tours are views, which read fields from snapshot on access.
+    """
+    def __init__(self, snapshot: CatalogSnapshot):
+        super().__init__()
+        self.load_snapshot(snapshot)
+
+    def load_snapshot(self, snapshot: CatalogSnapshot) -> int:
+        """
+        The method swaps current data generation with generation of catalog snapshot.
+        :param snapshot: catalog snapshot
+        :return: number of new generation
+        """
+        with self._load_lock:
+            self._publish(DataGeneration(
+                number=self._generation.number + 1,
+                data=SnapshotTours(snapshot),
+                keys=snapshot.ids,
+                positions=SnapshotPositions(snapshot),
+                indexes={attr_name: snapshot.get_index(attr_name) for attr_name in snapshot.indexes},
+                sorted_columns={
+                    attr_name: SortedColumn.construct_from_sorted(keys, ids)
+                    for attr_name, (keys, ids) in snapshot.sorted_columns.items()
+                },
+                aggregates={
+                    dimension: {
+                        value: {
+                            attr_name: AttrAggregate.construct_from_values(*values)
+                            for attr_name, values in value_aggregates.items()
+                        }
+                        for value, value_aggregates in dimension_aggregates.items()
+                    }
+                    for dimension, dimension_aggregates in snapshot.aggregates.items()
+                },
+            ))
+        return self.generation
+
+    def _add_data(self, generation: DataGeneration, data: Dict[Hashable, BaseModel]) -> None:
+        raise ReadOnlyCatalogError('Catalog snapshot is read-only, it is replaced by load_snapshot')
+
 
 class DepartureController(BaseController):
     """
@@ -159,13 +1319,417 @@ class DepartureController(BaseController):
         return Departure
 
     def _get_init_data(self, dict_data: dict) -> Dict[int, Tour]:
-        result = dict()
-        for data_id, current_data in dict_data.items():
-            result[data_id] = self._base_model.construct_from_dict(dict_data={
-                **{'id': data_id, 'city_departure': current_data}
-            })
+        return self._base_model.construct_many(
+            (data_id, current_data if isinstance(current_data, dict) else {'city_departure': current_data})
+            for data_id, current_data in dict_data.items()
+        )
+
+
+class ColumnarScan(PlanNode):
+    """
+    Vectorized check of all tours by columnar storage.
+    """
+    def execute(self, generation) -> Set[Hashable]:
+        return {tour.id for tour in generation.store.filter(self.spec)}
+
+
+class ColumnarTourController(TourController):
+    """
+    The class allows manipulating with tours data, which are filtered and aggregated by columnar storage.
+    """
+
+    def get_min_max_attr_for_data(
+            self, list_of_data: List[BaseModel], *attr_names: str, data_filter: dict = None
+    ) -> Optional[Dict[str, AttrMinMax]]:
+        if not data_filter or 'random' in data_filter or 'id' in data_filter:
+            return super().get_min_max_attr_for_data(list_of_data, *attr_names)
+        result = self._get_min_max_attr_from_aggregates(data_filter, *attr_names)
+        if result is not None:
+            return result
+
+        store = self._generation.store
+        mask = store.get_mask(SpecificationFactory.constract_from_filter(data_filter))
+        min_max_values = store.get_min_max(mask, *attr_names)
+        return {
+            attr_name: AttrMinMax(min_value, max_value) for attr_name, (min_value, max_value) in min_max_values.items()
+        }
+
+    def _create_generation(self, number: int) -> DataGeneration:
+        generation = super()._create_generation(number)
+        generation.store = ColumnarTourStore([])
+        return generation
+
+    def _add_data(self, generation: DataGeneration, data: Dict[Hashable, BaseModel]) -> None:
+        super()._add_data(generation, data)
+        generation.store.extend(data.values())
+
+    def _get_by_filter(self, generation: DataGeneration, data_filter: dict) -> List[BaseModel]:
+        return generation.store.filter(SpecificationFactory.constract_from_filter(data_filter))
+
+    def _get_by_specification(self, generation: DataGeneration, specification: Specification) -> List[BaseModel]:
+        return generation.store.filter(specification)
+
+    def _get_plan(self, generation: DataGeneration, specification: Specification) -> PlanNode:
+        return ColumnarScan(specification, len(generation.store) * specification.estimate_selectivity(),
+                            len(generation.store))
+
+
+class BitmapTourController(TourController):
+    """
+    The class allows manipulating with tours data, which inverted indexes keep postings as bitmaps over rows
+    of data. Filters and specifications are answered by AND, OR and NOT of bitmaps, and result rows are already
+    in order of controller data.
+    """
+    def _create_generation(self, number: int) -> DataGeneration:
+        generation = super()._create_generation(number)
+        generation.indexes = {attr_name: BitmapIndex(generation.keys) for attr_name in self._get_indexed_attributes()}
+        return generation
+
+    def _add_to_indexes(self, generation: DataGeneration, data: Dict[Hashable, BaseModel]) -> None:
+        positions = generation.positions
+        for attr_name, index in generation.indexes.items():
+            rows = defaultdict(list)
+            for data_id, current_data in data.items():
+                rows[getattr(current_data, attr_name)].append(positions[data_id])
+            for value, value_rows in rows.items():
+                index.add(value, Bitmap.construct_from_rows(value_rows))
+
+    def _get_by_filter(self, generation: DataGeneration, data_filter: dict) -> List[BaseModel]:
+        data, keys = generation.data, generation.keys
+        return [data[keys[row]] for row in self._get_filter_bitmap(generation, data_filter).get_rows()]
+
+    def _get_by_specification(self, generation: DataGeneration, specification: Specification) -> List[BaseModel]:
+        data = generation.data
+        return [data[data_id] for data_id in execute_bitmap_plan(generation, self._get_plan(generation, specification))]
+
+    def _count_facets(
+            self, generation: DataGeneration, data_filter: Optional[dict], facets: Tuple[str, ...]
+    ) -> Dict[str, Dict[Any, int]]:
+        if not data_filter:
+            return super()._count_facets(generation, data_filter, facets)
+
+        selected = self._get_filter_bitmap(generation, data_filter)
+        counters = {
+            facet: count_by_bitmaps(selected, generation.indexes[facet]) for facet in facets
+            if facet in generation.indexes
+        }
+        pass_facets = tuple(facet for facet in facets if facet not in counters)
+        if pass_facets:
+            data, keys = generation.data, generation.keys
+            counters.update(count_by_pass((data[keys[row]] for row in selected.get_rows()), pass_facets))
+        return {facet: dict(counters[facet].most_common()) for facet in facets}
+
+    def _get_filter_bitmap(self, generation: DataGeneration, data_filter: dict) -> Bitmap:
+        """
+        Return bitmap of rows of data, which are satisfied filter.
+        Filters with index are resolved by AND of bitmaps (the smallest bitmap first),
+        other filters are checked by specification only for rows, which remained after AND.
+        :param generation: data generation
+        :param data_filter: filter
+        :return:
+        """
+        bitmaps = []
+        not_indexed_filter = dict()
+        for name, value in data_filter.items():
+            bitmap = self._get_bitmap(generation, name, value)
+            if bitmap is not None:
+                bitmaps.append(bitmap)
+            else:
+                not_indexed_filter[name] = value
+
+        if bitmaps:
+            bitmaps.sort(key=len)
+            result = bitmaps[0]
+            for bitmap in bitmaps[1:]:
+                if not result:
+                    break
+                result &= bitmap
+        else:
+            result = Bitmap.construct_full(len(generation.keys))
+
+        specification = SpecificationFactory.constract_from_filter(not_indexed_filter)
+        if not specification or not result:
+            return result
+        data, keys = generation.data, generation.keys
+        predicate = compile_specification(specification)
+        return Bitmap.construct_from_rows([row for row in result.get_rows() if predicate(data[keys[row]])])
+
+    def _get_bitmap(self, generation: DataGeneration, attr_name: str, value) -> Optional[Bitmap]:
+        """
+        Return bitmap of rows for attribute value from bitmap index or for range lookup from sorted column.
+        :param generation: data generation
+        :param attr_name: attribute name or attribute name with range lookup (price__gte)
+        :param value: attribute value or list of values
+        :return: bitmap of rows or None, if attribute has no index
+        """
+        if '__' in attr_name:
+            sorted_column = generation.sorted_columns.get(attr_name.split('__', 1)[0])
+            if sorted_column is None:
+                return None
+            start, end = sorted_column.get_bounds(SpecificationFactory.constract_from_name_and_value(attr_name, value))
+            positions = generation.positions
+            return Bitmap.construct_from_rows([positions[data_id] for data_id in sorted_column.ids[start:end]])
+
+        index = generation.indexes.get(attr_name)
+        if index is None:
+            return None
+        if not isinstance(value, list):
+            return index.get_bitmap(value)
+        result = Bitmap()
+        for current_value in value:
+            result |= index.get_bitmap(current_value)
         return result
 
 
-TOUR_CONTROLLER = TourController(data.tours)
-DEPARTURE_CONTROLLER = DepartureController(data.departures)
+class DatabaseTourController(TourController):
+    """
+    The class allows manipulating with tours data, which are kept in table of database. Controller data are
+    read-through cache, which is loaded from database in background: until cache is loaded, filters,
+    specifications, pages, samples, min, max, aggregates and facets are answered by SQL queries over indexed
+    columns, requests without SQL translation (search, keyset pages, JSON fragments) wait for cache.
+    """
+    def __init__(self, dict_data: dict = None, store: DatabaseTourStore = None):
+        """
+        Initialisation controller
+        :param dict_data: data for cache, cache is loaded from database by load without data
+        :param store: tours table, table of default database by default
+        """
+        self.store = store or DatabaseTourStore()
+        super().__init__(dict_data)
+
+    @property
+    def is_cached(self) -> bool:
+        """
+        Flag, that requests are answered by cache of controller.
+        :return:
+        """
+        return self._is_cached(self._generation)
+
+    def get(self, data_filter: dict = None) -> Union[List[BaseModel], None]:
+        if data_filter is None and not self.is_cached:
+            return self.store.filter()
+        return super().get(data_filter)
+
+    def explain(self, specification: Specification) -> str:
+        if not self.is_cached:
+            return self.store.explain(specification)
+        return super().explain(specification)
+
+    def search(self, query: str, data_filter: dict = None, limit: int = 20) -> DataPage:
+        self._wait_cache()
+        return super().search(query, data_filter, limit)
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        self._wait_cache()
+        return super().complete(prefix, limit)
+
+    def get_many(self, data_ids: Iterable[Hashable]) -> List[BaseModel]:
+        if self.is_cached:
+            return super().get_many(data_ids)
+        data_ids = list(data_ids)
+        tours = self.store.get_many(data_ids)
+        return [tours[data_id] for data_id in data_ids if data_id in tours]
+
+    def get_page(
+            self, data_filter: dict = None, after: Hashable = None, limit: int = 20, order_by: str = None
+    ) -> DataPage:
+        self._wait_cache()
+        return super().get_page(data_filter, after, limit, order_by)
+
+    def get_page_by_number(
+            self, number: int, size: int, data_filter: dict = None, order_by: str = None
+    ) -> DataPage:
+        if self.is_cached:
+            return super().get_page_by_number(number, size, data_filter, order_by)
+        if order_by is not None:
+            self._get_sort_key(order_by)
+        start = max((number - 1) * size, 0)
+        tours, count = self.store.get_page(self._get_specification(data_filter), order_by, start, size)
+        return DataPage(None, tours, count, start + size < count, self._serialized_fields)
+
+    def get_json_fragments(self, data_ids: Iterable[Hashable] = None) -> List[bytes]:
+        self._wait_cache()
+        return super().get_json_fragments(data_ids)
+
+    def get_min_max_attr_for_data(
+            self, list_of_data: List[BaseModel], *attr_names: str, data_filter: dict = None
+    ) -> Optional[Dict[str, AttrMinMax]]:
+        if self.is_cached or data_filter is None or 'random' in data_filter or 'id' in data_filter:
+            return super().get_min_max_attr_for_data(list_of_data, *attr_names, data_filter=data_filter)
+        min_max_values = self.store.get_min_max(self._get_specification(data_filter), *attr_names)
+        return {
+            attr_name: AttrMinMax(min_value, max_value) for attr_name, (min_value, max_value) in min_max_values.items()
+        }
+
+    def get_aggregates(self, dimension: str, value) -> Optional[Dict[str, AttrAggregate]]:
+        if self.is_cached or dimension not in self._get_aggregate_dimensions():
+            return super().get_aggregates(dimension, value)
+        aggregates = self._get_database_aggregates(
+            dimension, SpecificationFactory.constract_from_name_and_value(dimension, value)
+        )
+        return aggregates.get(value) or {
+            attr_name: AttrAggregate() for attr_name in self._get_aggregated_attributes()
+        }
+
+    def get_dimension_aggregates(self, dimension: str) -> Optional[Dict[Any, Dict[str, AttrAggregate]]]:
+        if self.is_cached or dimension not in self._get_aggregate_dimensions():
+            return super().get_dimension_aggregates(dimension)
+        return self._get_database_aggregates(dimension)
+
+    def save_snapshot(self, path: Union[str, Path], departures: Dict[str, str]) -> None:
+        self._wait_cache()
+        super().save_snapshot(path, departures)
+
+    def _get_database_aggregates(
+            self, dimension: str, specification: Specification = None
+    ) -> Dict[Any, Dict[str, AttrAggregate]]:
+        """
+        Return aggregates of tours by values of dimension, which are computed by database.
+        :param dimension: name of aggregated dimension
+        :param specification: specification for tours or None for all tours
+        :return:
+        """
+        return {
+            value: {
+                attr_name: AttrAggregate.construct_from_values(*values)
+                for attr_name, values in value_aggregates.items()
+            }
+            for value, value_aggregates in self.store.get_aggregates(
+                dimension, self._get_aggregated_attributes(), specification
+            ).items()
+        }
+
+    def _count_facets(
+            self, generation: DataGeneration, data_filter: Optional[dict], facets: Tuple[str, ...]
+    ) -> Dict[str, Dict[Any, int]]:
+        if self._is_cached(generation):
+            return super()._count_facets(generation, data_filter, facets)
+        specification = self._get_specification(data_filter)
+        return {facet: self.store.count_by(specification, facet) for facet in facets}
+
+    def _get_by_filter(self, generation: DataGeneration, data_filter: dict) -> List[BaseModel]:
+        if self._is_cached(generation):
+            return super()._get_by_filter(generation, data_filter)
+        return self.store.filter(self._get_specification(data_filter))
+
+    def _get_by_specification(self, generation: DataGeneration, specification: Specification) -> List[BaseModel]:
+        if self._is_cached(generation):
+            return super()._get_by_specification(generation, specification)
+        return self.store.filter(specification)
+
+    def _get_by_id(self, generation: DataGeneration, data_id: int) -> BaseModel:
+        if self._is_cached(generation):
+            return super()._get_by_id(generation, data_id)
+        return self.store.get_many([data_id]).get(data_id)
+
+    def _get_by_random(
+            self, generation: DataGeneration, random_count: int, weight: str = None, data_filter: dict = None
+    ) -> List[BaseModel]:
+        if self._is_cached(generation):
+            return super()._get_by_random(generation, random_count, weight, data_filter)
+        if weight is not None:
+            # Weighted sample needs cumulative weights of cache
+            self._wait_cache()
+            return super()._get_by_random(self._generation, random_count, weight, data_filter)
+        return self.store.sample(self._get_specification(data_filter), random_count)
+
+    @staticmethod
+    def _is_cached(generation: DataGeneration) -> bool:
+        """
+        Return flag, that generation is loaded cache. Generation 0 is empty generation before the first load.
+        :param generation: data generation
+        :return:
+        """
+        return generation.number > 0
+
+    @staticmethod
+    def _get_specification(data_filter: Optional[dict]) -> Optional[Specification]:
+        return SpecificationFactory.constract_from_filter(data_filter) if data_filter else None
+
+    def _wait_cache(self) -> None:
+        """
+        Wait for cache of controller, loading of cache is started, if it is not started or failed.
+        :return:
+        :raises CatalogUnavailableError: if loading of cache failed or is not finished in timeout
+        """
+        if self.is_cached:
+            return
+        if not self.wait_loaded(DATABASE_CACHE_TIMEOUT):
+            reason = f'loading failed: {self.load_error}' if self.load_error is not None else 'loading is not finished'
+            raise CatalogUnavailableError(f'Cache of {type(self).__name__} is not loaded, {reason}')
+
+
+TOUR_CONTROLLERS = {
+    'memory': TourController,
+    'columnar': ColumnarTourController,
+    'bitmap': BitmapTourController,
+    'database': DatabaseTourController,
+}
+
+CATALOG_SOURCES = getattr(settings, 'TOURS_CATALOG_SOURCES', dict())
+CATALOG_SNAPSHOT = getattr(settings, 'TOURS_CATALOG_SNAPSHOT', None)
+
+
+def get_catalog_sources() -> Tuple[CatalogSource, CatalogSource]:
+    """
+    The function returns sources of tours and departures for controller backend from settings.
+    Controller with database backend reads catalog from database, other controllers read catalog files or data.py.
+    :return:
+    """
+    if getattr(settings, 'TOURS_CONTROLLER_BACKEND', 'memory') == 'database':
+        return get_tours_source(), get_departures_source()
+    return (
+        get_catalog_source(CATALOG_SOURCES.get('tours'), data.tours),
+        get_catalog_source(CATALOG_SOURCES.get('departures'), data.departures),
+    )
+
+
+def get_controllers_from_sources() -> Tuple[TourController, DepartureController]:
+    """
+    The function returns controllers for catalog sources from settings. Sources with deferred loading (database)
+    are not read here, they are loaded by start_catalog_loading or on the first wait for data.
+    :return:
+    """
+    tours_source, departures_source = get_catalog_sources()
+    tour_controller = TOUR_CONTROLLERS[getattr(settings, 'TOURS_CONTROLLER_BACKEND', 'memory')]()
+    departure_controller = DepartureController()
+    for controller, source in ((tour_controller, tours_source), (departure_controller, departures_source)):
+        if source.deferred_loading:
+            controller.defer_load(source)
+        else:
+            controller.load(source)
+    return tour_controller, departure_controller
+
+
+def start_catalog_loading() -> None:
+    """
+    The function starts loading of deferred catalog sources and building of search index in background.
+    It should be called in every worker process after application loading.
+    :return:
+    """
+    TOUR_CONTROLLER.start_loading()
+    DEPARTURE_CONTROLLER.start_loading()
+    threading.Thread(target=build_search_index, name='SearchIndexBuilder', daemon=True).start()
+
+
+def build_search_index() -> None:
+    """
+    The function builds full-text index of tours, when catalog is loaded.
+    :return:
+    """
+    if not TOUR_CONTROLLER.wait_loaded():
+        logger.warning('Search index is not built, catalog is not loaded')
+        return
+    try:
+        TOUR_CONTROLLER.build_search_index()
+    except Exception:
+        logger.exception('Search index is not built')
+
+
+# Snapshot is used, if it was built by build_catalog_snapshot command, else catalog is loaded from sources
+if CATALOG_SNAPSHOT and Path(CATALOG_SNAPSHOT).exists():
+    CATALOG = CatalogSnapshot(CATALOG_SNAPSHOT)
+    TOUR_CONTROLLER = SnapshotTourController(CATALOG)
+    DEPARTURE_CONTROLLER = DepartureController(CATALOG.departures)
+else:
+    TOUR_CONTROLLER, DEPARTURE_CONTROLLER = get_controllers_from_sources()
@@ -1,3 +1,1362 @@
-from django.test import TestCase
+"""
+Tests of tours services. Results of indexes, query plans and controller backends are compared with naive
+evaluation over all tours of synthetic catalog.
+"""
 
-# Create your tests here.
+__author__ = 'Artikov A.K.'
+
+import csv
+import json
+import math
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import SimpleTestCase, TestCase, RequestFactory
+from django.utils.html import escape
+
+from benchmarks.catalog import generate_tours, generate_departures
+from . import page_cache, views
+from .api_views import MAX_PAGE_SIZE
+from .data_models import CatalogValidationError, Tour, Departure
+from .services import bitmap, search
+from .services.api import get_tours_data
+from .services.columnar import is_columnar_available
+from .services.database import (
+    DatabaseTourStore, SqlTranslationError, get_query, get_tours_source, get_departures_source, import_tours,
+    import_departures
+)
+from .page_cache import CachedPage, PageCache, catalog_page_cache
+from .services.facets import UnknownFacetError
+from .services.instrumentation import REGISTRY, Histogram, MetricsRegistry, SamplingProfiler, stage
+from .services.pagination import InvalidCursorError, encode_cursor, decode_cursor
+from .services.planner import get_plan, execute_plan, push_down_not, merge_in
+from .services.search import SearchIndex, stem, tokenize, get_terms
+from .services.snapshot import CatalogSnapshot, SnapshotFormatError, TourView
+from .services.sources import CatalogSource, DictSource, JsonlSource, CsvSource, get_catalog_source
+from .services.specification import (
+    Specification, AndSpecification, OrSpecification, NotSpecification, SpecificationFactory, get_date_key
+)
+from .services.tour_services import (
+    TourController, BitmapTourController, ColumnarTourController, SnapshotTourController, DatabaseTourController,
+    DepartureController, ReadOnlyCatalogError, SortedColumn
+)
+
+CATALOG_SIZE = 2000
+SORT_VALUES = (None, 'price', '-price', 'nights', '-nights', 'stars', '-stars')
+SORT_KEYS = {'price': float, 'nights': int, 'stars': int}
+TOUR_FIELDS = ('id', 'title', 'description', 'departure', 'picture', 'price', 'stars', 'country', 'nights', 'date')
+
+
+def get_controller_types() -> list:
+    """
+    The function returns controller types, which keep whole catalog in memory: columnar controller needs NumPy.
+    :return:
+    """
+    controller_types = [TourController, BitmapTourController]
+    if is_columnar_available():
+        controller_types.append(ColumnarTourController)
+    return controller_types
+
+
+def get_filtered_ids(tours: list, data_filter: dict) -> list:
+    """
+    The function returns id of tours, which are satisfied filter, by check of every tour.
+    :param tours: tours in catalog order
+    :param data_filter: filter
+    :return:
+    """
+    specification = SpecificationFactory.constract_from_filter(data_filter)
+    return [tour.id for tour in tours if specification.is_satisfied(tour)]
+
+
+def get_sorted_ids(tours: list, order_by: str = None) -> list:
+    """
+    The function returns id of tours in order of sorting, tours with equal keys are in catalog order.
+    :param tours: tours in catalog order
+    :param order_by: attribute name with minus for descending order
+    :return:
+    """
+    if order_by is None:
+        return [tour.id for tour in tours]
+    attr_name = order_by.lstrip('-')
+    sign = -1 if order_by.startswith('-') else 1
+    positions = sorted(
+        range(len(tours)), key=lambda position: (sign * SORT_KEYS[attr_name](getattr(tours[position], attr_name)),
+                                                 position)
+    )
+    return [tours[position].id for position in positions]
+
+
+def get_random_leaf(generator: random.Random) -> Specification:
+    """
+    The function returns random value or range specification.
+    :param generator: random generator
+    :return:
+    """
+    spec = SpecificationFactory.constract_from_name_and_value
+    return generator.choice((
+        lambda: spec('departure', generator.choice(('msk', 'spb', 'kazan', ['nsk', 'ekb'], ['msk', 'kazan']))),
+        lambda: spec('country', generator.choice(('Куба', 'Индия', 'Мексика', ['Вьетнам', 'Пакистан']))),
+        lambda: spec('stars', generator.choice(('1', '3', '5', ['4', '5']))),
+        lambda: spec('nights', generator.choice((3, 7, 14, [5, 6]))),
+        lambda: spec('price__gte', generator.randrange(20000, 150000, 1000)),
+        lambda: spec('price__lt', generator.randrange(20000, 150000, 1000)),
+        lambda: spec('price__between', sorted(generator.sample(range(20000, 150000, 1000), 2))),
+        lambda: spec('nights__gt', generator.randint(3, 14)),
+        lambda: spec('nights__lte', generator.randint(3, 14)),
+        lambda: spec('date__between', ['1 марта', f'{generator.randint(1, 28)} июля']),
+    ))()
+
+
+def get_random_specification(generator: random.Random, depth: int) -> Specification:
+    """
+    The function returns random tree of AND, OR and NOT specifications.
+    :param generator: random generator
+    :param depth: max depth of tree
+    :return:
+    """
+    if depth == 0 or generator.random() < 0.25:
+        return get_random_leaf(generator)
+    kind = generator.choice(('and', 'or', 'not'))
+    if kind == 'not':
+        return NotSpecification(get_random_specification(generator, depth - 1))
+    children = [get_random_specification(generator, depth - 1) for _ in range(generator.randint(2, 3))]
+    return AndSpecification(*children) if kind == 'and' else OrSpecification(*children)
+
+
+FILTERS = (
+    {'departure': 'msk'},
+    {'departure': 'kazan', 'nights': 7},
+    {'departure': ['nsk', 'ekb'], 'country': 'Индия'},
+    {'country': ['Куба', 'Мексика'], 'stars': '5', 'nights': [3, 14]},
+    {'stars': ['1', '2'], 'departure': 'spb', 'country': 'Пакистан', 'nights': 10},
+    {'departure': 'unknown'},
+    {'departure': 'msk', 'country': 'unknown'},
+    {'departure': []},
+)
+
+
+class IndexedFilterTest(SimpleTestCase):
+    """
+    Filters, which are resolved by inverted indexes, return the same tours as check of every tour.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.controller = TourController(generate_tours(CATALOG_SIZE))
+        cls.tours = cls.controller.get()
+
+    def test_filters_match_naive_evaluation(self):
+        for data_filter in FILTERS:
+            with self.subTest(filter=data_filter):
+                self.assertEqual(
+                    [tour.id for tour in self.controller.get(data_filter)], get_filtered_ids(self.tours, data_filter)
+                )
+
+    def test_filter_by_id(self):
+        self.assertEqual([tour.id for tour in self.controller.get({'id': 5})], [5])
+        self.assertEqual(self.controller.get({'id': CATALOG_SIZE + 1}), [])
+        self.assertEqual(self.controller.find(7).id, 7)
+        self.assertEqual([tour.id for tour in self.controller.get_many([3, CATALOG_SIZE + 1, 1])], [3, 1])
+
+    def test_filter_without_conditions(self):
+        self.assertEqual([tour.id for tour in self.controller.get()], list(range(1, CATALOG_SIZE + 1)))
+
+
+RANGE_FILTERS = (
+    {'price__gte': 50000},
+    {'price__gt': 50000},
+    {'price__lt': 50000},
+    {'price__lte': 50000},
+    {'price__between': [40000, 41000]},
+    {'price__between': [41000, 40000]},
+    {'price__gt': 149000},
+    {'nights__between': [5, 7]},
+    {'nights__gt': 14},
+    {'date__between': ['28 января', '1 марта']},
+    {'date__lt': '2 января'},
+    {'departure': 'msk', 'price__lte': 30000, 'nights__gte': 12},
+)
+
+
+class RangeSpecificationTest(SimpleTestCase):
+    """
+    Range filters, which are resolved by sorted columns, return the same tours as check of every tour.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.dict_tours = generate_tours(CATALOG_SIZE)
+        cls.controller = TourController(cls.dict_tours)
+        cls.tours = cls.controller.get()
+
+    def test_range_filters_match_naive_evaluation(self):
+        for data_filter in RANGE_FILTERS:
+            with self.subTest(filter=data_filter):
+                self.assertEqual(
+                    [tour.id for tour in self.controller.get(data_filter)], get_filtered_ids(self.tours, data_filter)
+                )
+
+    def test_complement_range(self):
+        for data_filter in RANGE_FILTERS[:-1]:
+            specification = SpecificationFactory.constract_from_filter(data_filter)
+            with self.subTest(filter=data_filter):
+                self.assertEqual(
+                    [(~specification).is_satisfied(tour) for tour in self.tours],
+                    [not specification.is_satisfied(tour) for tour in self.tours]
+                )
+
+    def test_sorted_column_range(self):
+        sorted_column = self.controller._generation.sorted_columns['price']
+        for data_filter in RANGE_FILTERS[:7]:
+            specification = SpecificationFactory.constract_from_filter(data_filter)
+            with self.subTest(filter=data_filter):
+                self.assertEqual(
+                    sorted_column.get_range(specification),
+                    {tour.id for tour in self.tours if specification.is_satisfied(tour)}
+                )
+
+    def test_chunked_sorted_columns(self):
+        controller = TourController()
+        controller.load(DictSource(self.dict_tours), chunk_size=300, background=False)
+        for attr_name, sorted_column in self.controller._generation.sorted_columns.items():
+            chunked_column = controller._generation.sorted_columns[attr_name]
+            with self.subTest(attr_name=attr_name):
+                self.assertEqual(chunked_column.keys, sorted_column.keys)
+                self.assertEqual(chunked_column.ids, sorted_column.ids)
+
+    def test_sorted_column_extend(self):
+        sorted_column = SortedColumn([(3, 'c'), (1, 'a')])
+        sorted_column.extend(SortedColumn([(2, 'b'), (1, 'd')]))
+        sorted_column.sort()
+        self.assertEqual(sorted_column.keys, [1, 1, 2, 3])
+        self.assertEqual(sorted_column.ids, ['a', 'd', 'b', 'c'])
+
+
+def get_values(tours: list) -> list:
+    return [tuple(getattr(tour, field_name) for field_name in TOUR_FIELDS) for tour in tours]
+
+
+class ControllerBackendsTest(SimpleTestCase):
+    """
+    Memory, columnar, bitmap and snapshot controllers return the same results as memory controller.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        dict_tours = generate_tours(CATALOG_SIZE)
+        cls.expected = TourController(dict_tours)
+        snapshot_directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(snapshot_directory.cleanup)
+        snapshot_path = Path(snapshot_directory.name) / 'catalog.snapshot'
+        cls.expected.save_snapshot(snapshot_path, generate_departures())
+        cls.controllers = [controller_type(dict_tours) for controller_type in get_controller_types()]
+        cls.controllers.append(SnapshotTourController(CatalogSnapshot(snapshot_path)))
+
+    def assert_controllers(self, get_result):
+        expected = get_result(self.expected)
+        for controller in self.controllers:
+            with self.subTest(controller=type(controller).__name__):
+                self.assertEqual(get_result(controller), expected)
+
+    def test_filters(self):
+        for data_filter in (None, *FILTERS, *RANGE_FILTERS, {'id': 10}):
+            with self.subTest(filter=data_filter):
+                self.assert_controllers(lambda controller: get_values(controller.get(data_filter)))
+
+    def test_values_without_tours(self):
+        for data_filter in (
+                {'stars': 'many'}, {'stars': ['5', 'x']}, {'stars': '05'}, {'stars': '1000'}, {'stars': 5},
+                {'nights': 'many'}, {'nights': [7, 'x']}, {'nights': 7.0}, {'departure': 'msk', 'stars': ['4.5']},
+        ):
+            with self.subTest(filter=data_filter):
+                self.assert_controllers(lambda controller: [tour.id for tour in controller.get(data_filter)])
+
+    def test_specifications(self):
+        generator = random.Random(4)
+        for _ in range(50):
+            specification = get_random_specification(generator, 3)
+            with self.subTest(spec=str(specification)):
+                self.assert_controllers(
+                    lambda controller: [tour.id for tour in controller.get_by_specification(specification)]
+                )
+
+    def test_min_max(self):
+        for data_filter in ({'departure': 'msk'}, {'nights': 7}, {'departure': 'kazan', 'price__lt': 50000}):
+            with self.subTest(filter=data_filter):
+                self.assert_controllers(lambda controller: {
+                    attr_name: (min_max.min, min_max.max)
+                    for attr_name, min_max in controller.get_min_max_attr_for_data(
+                        controller.get(data_filter), 'price', 'nights', data_filter=data_filter
+                    ).items()
+                })
+
+    def test_aggregates(self):
+        for dimension in ('departure', 'country', 'nights'):
+            with self.subTest(dimension=dimension):
+                self.assert_controllers(lambda controller: {
+                    value: {
+                        attr_name: (aggregate.count, aggregate.sum, aggregate.min, aggregate.max)
+                        for attr_name, aggregate in value_aggregates.items()
+                    }
+                    for value, value_aggregates in controller.get_dimension_aggregates(dimension).items()
+                })
+
+    def test_pages(self):
+        for order_by in SORT_VALUES:
+            with self.subTest(sort=order_by):
+                self.assert_controllers(lambda controller: [
+                    (page.count, page.has_next, [tour.id for tour in page.items])
+                    for page in (controller.get_page_by_number(number, 30, {'departure': 'spb'}, order_by)
+                                 for number in (1, 2, 17))
+                ])
+
+    def test_lookups(self):
+        self.assert_controllers(lambda controller: get_values(controller.get_many([5, CATALOG_SIZE + 1, 3])))
+        self.assert_controllers(lambda controller: controller.get_json_fragments([1, 2]))
+
+    def test_samples(self):
+        for data_filter in (None, {'departure': 'kazan', 'nights': 7}):
+            expected_ids = set(tour.id for tour in self.expected.get(data_filter))
+            for controller in self.controllers:
+                with self.subTest(controller=type(controller).__name__, filter=data_filter):
+                    sample = controller.sample(6, data_filter=data_filter)
+                    self.assertEqual(len(sample), min(6, len(expected_ids)))
+                    self.assertEqual(len({tour.id for tour in sample}), len(sample))
+                    self.assertLessEqual({tour.id for tour in sample}, expected_ids)
+
+    def test_facets(self):
+        for data_filter in (None, {'departure': 'msk'}, {'price__between': [40000, 60000], 'stars': '5'}):
+            with self.subTest(filter=data_filter):
+                self.assert_controllers(lambda controller: controller.get_facets(data_filter))
+
+    def test_weighted_samples(self):
+        for data_filter in (None, {'departure': 'kazan', 'nights': 7}):
+            expected_ids = set(tour.id for tour in self.expected.get(data_filter))
+            for controller in (self.expected, *self.controllers):
+                with self.subTest(controller=type(controller).__name__, filter=data_filter):
+                    for _ in range(20):
+                        sample = controller.sample(6, weight='stars', data_filter=data_filter)
+                        self.assertEqual(len({tour.id for tour in sample}), min(6, len(expected_ids)))
+                        self.assertLessEqual({tour.id for tour in sample}, expected_ids)
+
+    def test_weighted_sample_with_repeated_choices(self):
+        dict_tours = generate_tours(8)
+        for tour_id, record in dict_tours.items():
+            record['stars'] = {1: '5', 8: '1'}.get(tour_id, '0')
+        controller = TourController(dict_tours)
+        for data_filter in (None, {'nights__gte': 0}):
+            with self.subTest(filter=data_filter):
+                for _ in range(20):
+                    sample_ids = [tour.id for tour in controller.sample(6, weight='stars', data_filter=data_filter)]
+                    self.assertEqual(len(set(sample_ids)), 6)
+                    self.assertEqual(set(sample_ids[:2]), {1, 8})
+                    self.assertEqual(sample_ids[2:], [2, 3, 4, 5])
+                self.assertEqual(len(controller.sample(10, weight='stars', data_filter=data_filter)), 8)
+
+
+class FailedSource(CatalogSource):
+    """
+    Source, which can not be read, as database without tables.
+    """
+    def iter_records(self):
+        raise RuntimeError('Catalog table does not exist')
+
+
+class DatabaseControllerTest(TestCase):
+    """
+    Database controller returns the same results by SQL queries before cache is loaded and by cache after
+    loading as memory controller.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        dict_tours = generate_tours(CATALOG_SIZE)
+        cls.expected = TourController(dict_tours)
+        import_tours(dict_tours.items(), batch_size=300)
+        import_departures(generate_departures().items())
+
+    def setUp(self):
+        self.controller = DatabaseTourController()
+
+    def assert_controller(self, get_result):
+        self.assertFalse(self.controller.is_cached)
+        self.assertEqual(get_result(self.controller), get_result(self.expected))
+
+    def test_filters(self):
+        for data_filter in (None, *FILTERS, *RANGE_FILTERS, {'id': 10}):
+            with self.subTest(filter=data_filter):
+                self.assert_controller(lambda controller: get_values(controller.get(data_filter)))
+
+    def test_specifications(self):
+        generator = random.Random(4)
+        for _ in range(50):
+            specification = get_random_specification(generator, 3)
+            with self.subTest(spec=str(specification)):
+                self.assert_controller(
+                    lambda controller: [tour.id for tour in controller.get_by_specification(specification)]
+                )
+
+    def test_pages(self):
+        for order_by in SORT_VALUES:
+            with self.subTest(sort=order_by):
+                self.assert_controller(lambda controller: [
+                    (page.count, page.has_next, get_values(page.items))
+                    for page in (controller.get_page_by_number(number, 30, {'departure': 'spb'}, order_by)
+                                 for number in (1, 2, 17))
+                ])
+
+    def test_facets(self):
+        for data_filter in (None, {'departure': 'msk'}, {'price__between': [40000, 60000], 'stars': '5'}):
+            with self.subTest(filter=data_filter):
+                self.assert_controller(lambda controller: controller.get_facets(data_filter))
+
+    def test_min_max_and_aggregates(self):
+        for data_filter in ({'departure': 'msk'}, {'nights': 7}, {'departure': 'kazan', 'price__lt': 50000}):
+            with self.subTest(filter=data_filter):
+                self.assert_controller(lambda controller: {
+                    attr_name: (min_max.min, min_max.max)
+                    for attr_name, min_max in controller.get_min_max_attr_for_data(
+                        controller.get(data_filter), 'price', 'nights', data_filter=data_filter
+                    ).items()
+                })
+        for dimension in ('departure', 'country', 'nights'):
+            with self.subTest(dimension=dimension):
+                self.assert_controller(lambda controller: {
+                    value: {
+                        attr_name: (aggregate.count, aggregate.sum, aggregate.min, aggregate.max)
+                        for attr_name, aggregate in value_aggregates.items()
+                    }
+                    for value, value_aggregates in controller.get_dimension_aggregates(dimension).items()
+                })
+
+    def test_lookups_and_samples(self):
+        self.assert_controller(lambda controller: get_values(controller.get_many([5, CATALOG_SIZE + 1, 3])))
+        self.assert_controller(lambda controller: get_values([controller.find(7)]))
+        for data_filter in (None, {'departure': 'kazan', 'nights': 7}):
+            expected_values = set(get_values(self.expected.get(data_filter)))
+            with self.subTest(filter=data_filter):
+                sample = get_values(self.controller.sample(6, data_filter=data_filter))
+                self.assertEqual(len(sample), min(6, len(expected_values)))
+                self.assertEqual(len(set(sample)), len(sample))
+                self.assertLessEqual(set(sample), expected_values)
+
+    def test_cache_is_loaded_from_database(self):
+        self.controller.load(get_tours_source(), chunk_size=300, background=False)
+        self.assertTrue(self.controller.is_cached)
+        self.assertEqual(get_values(self.controller.get()), get_values(self.expected.get()))
+        self.assertEqual(
+            self.controller.get_json_fragments([1, 2]), self.expected.get_json_fragments([1, 2])
+        )
+        departures = DepartureController()
+        departures.load(get_departures_source(), background=False)
+        self.assertEqual(
+            {departure.id: departure.city_departure for departure in departures.get()}, generate_departures()
+        )
+
+    def test_import_replaces_catalog(self):
+        self.assertEqual(import_tours(generate_tours(10, seed=1).items()), 10)
+        store = DatabaseTourStore()
+        self.assertEqual(store.count(), 10)
+        self.assertEqual(get_values(store.filter()), get_values(TourController(generate_tours(10, seed=1)).get()))
+
+    def test_query_translation(self):
+        spec = SpecificationFactory.constract_from_name_and_value
+        self.assertEqual(get_query(None), Q())
+        self.assertEqual(get_query(spec('departure', 'msk')), Q(departure='msk'))
+        self.assertEqual(get_query(spec('nights', [5, 6])), Q(nights__in=[5, 6]))
+        self.assertEqual(get_query(spec('price__between', [1000, 2000])), Q(price__gte=1000, price__lte=2000))
+        self.assertEqual(get_query(spec('date__lt', '2 марта')), Q(date_key__lt=get_date_key('2 марта')))
+        self.assertEqual(
+            get_query(~spec('departure', 'msk') | spec('nights__gt', 7)), ~Q(departure='msk') | Q(nights__gt=7)
+        )
+
+        class AnySpecification(Specification):
+            def is_satisfied(self, item) -> bool:
+                return True
+
+        with self.assertRaises(SqlTranslationError):
+            get_query(AndSpecification(spec('departure', 'msk'), AnySpecification()))
+
+    def test_failed_loading(self):
+        controller = DatabaseTourController()
+        controller.defer_load(FailedSource())
+        with mock.patch('tours.services.api.TOUR_CONTROLLER', controller), \
+                self.assertLogs('tours.services.tour_services', 'ERROR'):
+            for path in ('/api/search?q=отель', '/api/tours', '/api/tours/1'):
+                with self.subTest(path=path):
+                    response = self.client.get(path)
+                    self.assertEqual(response.status_code, 503, response.content)
+                    self.assertIn('Retry-After', response)
+        self.assertIsInstance(controller.load_error, RuntimeError)
+
+
+class QueryPlannerTest(SimpleTestCase):
+    """
+    Plans of specifications return the same tours as check of every tour by is_satisfied.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.dict_tours = generate_tours(CATALOG_SIZE)
+        cls.controllers = [controller_type(cls.dict_tours) for controller_type in get_controller_types()]
+        cls.tours = cls.controllers[0].get()
+
+    def get_expected_ids(self, spec: Specification) -> list:
+        return [tour.id for tour in self.tours if spec.is_satisfied(tour)]
+
+    def test_rewrites_keep_results(self):
+        generator = random.Random(1)
+        for _ in range(300):
+            spec = get_random_specification(generator, 4)
+            expected = [spec.is_satisfied(tour) for tour in self.tours]
+            for rewritten in (push_down_not(spec), merge_in(push_down_not(spec))):
+                with self.subTest(spec=str(spec), rewritten=str(rewritten)):
+                    self.assertEqual([rewritten.is_satisfied(tour) for tour in self.tours], expected)
+
+    def test_push_down_not_moves_not_to_leaves(self):
+        generator = random.Random(2)
+        for _ in range(100):
+            spec = push_down_not(get_random_specification(generator, 4))
+            stack = [spec]
+            while stack:
+                current = stack.pop()
+                if isinstance(current, NotSpecification):
+                    self.assertNotIsInstance(
+                        current.specification, (AndSpecification, OrSpecification, NotSpecification)
+                    )
+                elif isinstance(current, (AndSpecification, OrSpecification)):
+                    stack.extend(current.get_specifications())
+
+    def test_plans_match_naive_evaluation(self):
+        generator = random.Random(3)
+        for _ in range(300):
+            spec = get_random_specification(generator, 4)
+            expected = self.get_expected_ids(spec)
+            for controller in self.controllers:
+                with self.subTest(controller=type(controller).__name__, spec=str(spec)):
+                    generation = controller._generation
+                    self.assertEqual(execute_plan(generation, get_plan(generation, spec)), expected)
+                    self.assertEqual([tour.id for tour in controller.get_by_specification(spec)], expected)
+
+    def test_plan_nodes_match_naive_evaluation(self):
+        spec = SpecificationFactory.constract_from_name_and_value
+        specs = (
+            ~spec('departure', 'msk'),
+            spec('departure', 'kazan') & spec('price__between', [30000, 40000]),
+            spec('departure', ['kazan', 'ekb']) | spec('country', 'Мексика'),
+            ~(spec('departure', 'msk') | spec('nights__gte', 10)),
+            ~(spec('price__between', [50000, 60000]) & spec('stars', '5')),
+            spec('departure', 'kazan') & spec('departure', 'msk'),
+            spec('departure', ['kazan', 'msk']) & spec('departure', ['msk', 'spb']) & ~spec('nights', 7),
+        )
+        for current_spec in specs:
+            expected = self.get_expected_ids(current_spec)
+            for controller in self.controllers:
+                with self.subTest(controller=type(controller).__name__, spec=str(current_spec)):
+                    self.assertEqual([tour.id for tour in controller.get_by_specification(current_spec)], expected)
+
+    def test_explain(self):
+        spec = SpecificationFactory.constract_from_name_and_value
+        controller = self.controllers[0]
+        self.assertEqual(
+            controller.explain(
+                (spec('departure', ['kazan', 'ekb']) | spec('country', 'Мексика'))
+                & ~spec('nights__lt', 5) & ~spec('stars', '5')
+            ),
+            "Filter (NOT stars = '5' AND nights >= 5) (rows=160 cost=2014)\n"
+            "  Union (rows=399 cost=418)\n"
+            "    IndexLookup departure IN ('kazan', 'ekb') (rows=305 cost=306)\n"
+            "    IndexLookup country = 'Мексика' (rows=111 cost=112)"
+        )
+        self.assertEqual(
+            controller.explain(
+                spec('departure', 'kazan') & spec('departure', ['kazan', 'msk'])
+                & spec('price__between', [30000, 40000])
+            ),
+            "Intersect (rows=9 cost=285)\n"
+            "  IndexLookup departure = 'kazan' (rows=101 cost=102)\n"
+            "  RangeLookup 30000.0 <= price <= 40000.0 (rows=172 cost=183)"
+        )
+        self.assertEqual(
+            controller.explain(~(spec('departure', 'msk') | spec('nights__gte', 10))),
+            "Intersect (rows=588 cost=4185)\n"
+            "  Complement (rows=1001 cost=3000)\n"
+            "    IndexLookup departure = 'msk' (rows=999 cost=1000)\n"
+            "  RangeLookup nights < 10 (rows=1174 cost=1185)"
+        )
+
+
+class KeysetPaginationTest(SimpleTestCase):
+    """
+    Pages of controller, which are taken after the last id of previous page, contain every tour once.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.controllers = [controller_type(generate_tours(CATALOG_SIZE)) for controller_type in get_controller_types()]
+
+    def test_pages_contain_every_tour_once(self):
+        for controller in self.controllers:
+            for data_filter in ({'departure': 'kazan'}, {'departure': 'msk', 'nights__lte': 5}, None):
+                expected_tours = controller.get(data_filter)
+                for order_by in SORT_VALUES:
+                    with self.subTest(controller=type(controller).__name__, filter=data_filter, sort=order_by):
+                        ids, after, has_next = [], None, True
+                        while has_next:
+                            page = controller.get_page(data_filter, after, 37, order_by)
+                            self.assertEqual(page.count, len(expected_tours))
+                            ids.extend(item.id for item in page.items)
+                            after, has_next = page.last_id, page.has_next
+                        self.assertEqual(ids, get_sorted_ids(expected_tours, order_by))
+
+    def test_cursor_keys(self):
+        for keys in ([1], ['msk', 2], [1.5]):
+            with self.subTest(keys=keys):
+                self.assertEqual(decode_cursor(encode_cursor(keys)), keys)
+        for keys in ([[1]], [{'id': 1}], [None], [False], [1, [2]]):
+            with self.subTest(keys=keys), self.assertRaises(InvalidCursorError):
+                decode_cursor(encode_cursor(keys))
+
+    def test_page_after_unknown_id(self):
+        with self.assertRaises(KeyError):
+            self.controllers[0].get_page({'departure': 'kazan'}, after=CATALOG_SIZE + 1)
+
+
+class ToursApiTest(SimpleTestCase):
+    """
+    JSON API of tours with cursor pagination on catalog of settings.
+    """
+    def get_json(self, path: str, status: int = 200) -> dict:
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, status, response.content)
+        return json.loads(response.content)
+
+    def test_cursor_pages_contain_every_tour_once(self):
+        expected_tours = get_tours_data({'departure': 'msk'})
+        for order_by in SORT_VALUES:
+            with self.subTest(sort=order_by):
+                ids = []
+                path = '/api/tours?departure=msk&limit=2' + (f'&sort={order_by}' if order_by else '')
+                cursor = None
+                while True:
+                    content = self.get_json(path + (f'&cursor={cursor}' if cursor else ''))
+                    ids.extend(item['id'] for item in content['items'])
+                    cursor = content['next']
+                    if cursor is None:
+                        break
+                self.assertEqual(ids, get_sorted_ids(expected_tours, order_by))
+
+    def test_damaged_cursor(self):
+        for cursor in (
+                'damaged', encode_cursor([])[:-1], 'W10=', encode_cursor({'id': 1}), 'W1sxXV0=', encode_cursor([{}]),
+                encode_cursor([None]), encode_cursor([True]),
+        ):
+            with self.subTest(cursor=cursor):
+                self.assertIn('error', self.get_json(f'/api/tours?cursor={cursor}', status=400))
+
+    def test_cursor_of_unknown_tour(self):
+        self.assertIn('error', self.get_json(f'/api/tours?cursor={encode_cursor([10 ** 9])}', status=400))
+
+    def test_limit_bounds(self):
+        self.assertEqual(len(self.get_json('/api/tours?limit=1')['items']), 1)
+        self.assertLessEqual(len(self.get_json(f'/api/tours?limit={MAX_PAGE_SIZE}')['items']), MAX_PAGE_SIZE)
+        for limit in ('0', '-1', str(MAX_PAGE_SIZE + 1), 'many', ''):
+            with self.subTest(limit=limit):
+                self.assertIn('error', self.get_json(f'/api/tours?limit={limit}', status=400))
+
+    def test_wrong_sort(self):
+        self.assertIn('error', self.get_json('/api/tours?sort=title', status=400))
+
+    def test_date_filters(self):
+        expected_ids = [tour.id for tour in get_tours_data({'date__gte': '1 марта', 'date__lt': '10 марта'})]
+        content = self.get_json(f'/api/tours?date__gte=1 марта&date__lt=10 марта&limit={MAX_PAGE_SIZE}')
+        self.assertEqual([item['id'] for item in content['items']], expected_ids[:MAX_PAGE_SIZE])
+        for path in ('/api/tours?', '/api/facets?', '/api/search?q=отель&'):
+            for date_filter in ('date__gte=foo', 'date__lt=xx', 'date__lte=32 марта', 'date__gt=1 мартобря',
+                                'date__between=1 марта,2', 'date__gte=марта 1'):
+                with self.subTest(path=path, filter=date_filter):
+                    self.assertIn('error', self.get_json(path + date_filter, status=400))
+
+
+def get_naive_scores(documents: list, query: str, k1: float = 1.2, b: float = 0.75) -> dict:
+    """
+    The function returns BM25 scores of documents, which contain terms of query, by count of terms of every
+    document for every query term.
+    :param documents: documents as lists of field text and field weight
+    :param query: text of query
+    :param k1: parameter k1 of BM25
+    :param b: parameter b of BM25
+    :return: number of document -> score
+    """
+    frequencies = []
+    for fields in documents:
+        document_frequencies = dict()
+        for text, weight in fields:
+            for term in get_terms(text):
+                document_frequencies[term] = document_frequencies.get(term, 0) + weight
+        frequencies.append(document_frequencies)
+    lengths = [sum(document_frequencies.values()) for document_frequencies in frequencies]
+    average_length = sum(lengths) / len(lengths)
+    scores = dict()
+    for term in set(get_terms(query)):
+        found = [number for number, document_frequencies in enumerate(frequencies) if term in document_frequencies]
+        idf = math.log(1.0 + (len(documents) - len(found) + 0.5) / (len(found) + 0.5))
+        for number in found:
+            frequency = frequencies[number][term]
+            norm = k1 * (1.0 - b + b * lengths[number] / average_length)
+            scores[number] = scores.get(number, 0.0) + idf * frequency * (k1 + 1.0) / (frequency + norm)
+    return scores
+
+
+class SearchTest(SimpleTestCase):
+    """
+    Full-text search: stemming, BM25 ranking with and without candidates, autocomplete.
+    """
+    QUERIES = ('отель', 'пляж у моря', 'деревянные окна', 'красного соснового дерева', 'Hotel 17', 'неизвестное')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.controller = TourController(generate_tours(500))
+        cls.tours = cls.controller.get()
+        search_fields = cls.controller._get_search_fields().items()
+        cls.documents = [
+            [(getattr(tour, field_name), weight) for field_name, weight in search_fields] for tour in cls.tours
+        ]
+        cls.search_index = SearchIndex()
+        for fields in cls.documents:
+            cls.search_index.add(fields)
+
+    def assert_results(self, results: list, scores: dict, limit: int):
+        expected = sorted(scores.items(), key=lambda number_score: (-number_score[1], number_score[0]))[:limit]
+        self.assertEqual([number for number, _ in results], [number for number, _ in expected])
+        for (_, score), (_, expected_score) in zip(results, expected):
+            self.assertAlmostEqual(score, expected_score, places=9)
+
+    def test_stem(self):
+        for words in (('пляж', 'пляжи', 'пляжа', 'пляжем'), ('отель', 'отели', 'отелей'), ('окна', 'окно')):
+            with self.subTest(words=words):
+                self.assertEqual(len({stem(word) for word in words}), 1)
+        self.assertEqual(tokenize('Ёлка у МОРЯ, 5 звёзд!'), ['елка', 'у', 'моря', '5', 'звезд'])
+        self.assertEqual(get_terms('отель у моря'), [stem('отель'), stem('моря')])
+        self.assertEqual([stem(word) for word in ('hotel', '17', 'spa')], ['hotel', '17', 'spa'])
+
+    def test_index_is_built_after_load(self):
+        controller = TourController(generate_tours(100))
+        self.assertIsNone(controller._generation.search_index)
+        controller.build_search_index()
+        search_index = controller._generation.search_index
+        self.assertEqual(len(search_index), 100)
+        self.assertIs(controller.search('отель').generation.search_index, search_index)
+
+    def test_ranking(self):
+        # Scores are computed by NumPy for many documents and by Python without NumPy
+        for numpy_module in {search.np, None}:
+            for query in self.QUERIES:
+                for limit in (1, 20, 500):
+                    with self.subTest(numpy=numpy_module is not None, query=query, limit=limit), \
+                            mock.patch.object(search, 'np', numpy_module):
+                        self.assert_results(
+                            self.search_index.search(query, limit), get_naive_scores(self.documents, query), limit
+                        )
+
+    def test_ranked_postings_are_read_partly(self):
+        term = stem('отель')
+        self.assertEqual(self.search_index.rank_postings(min_count=len(self.documents) + 1), 0)
+        self.assertGreater(self.search_index.rank_postings(min_count=1), 0)
+        ranked_numbers, ranked_scores = self.search_index._get_ranked_posting(term)
+        self.assertEqual(sorted(ranked_numbers), list(self.search_index.postings[term][0]))
+        self.assertEqual(list(ranked_scores), sorted(ranked_scores, reverse=True))
+        with mock.patch.object(search, 'np', None), mock.patch.object(
+                self.search_index, '_get_scores', wraps=self.search_index._get_scores
+        ) as get_scores:
+            self.search_index.search('отель', 5)
+        scored_count = sum(len(call.args[1]) for call in get_scores.call_args_list)
+        self.assertLess(scored_count, len(ranked_numbers))
+
+    def test_ranking_of_candidates(self):
+        generator = random.Random(5)
+        # Small candidates are found in postings by bisect, large candidates are checked during scan of postings
+        for candidates_count in (0, 3, 30, 300, 500):
+            candidates = set(generator.sample(range(len(self.documents)), candidates_count))
+            for query in self.QUERIES:
+                scores = {
+                    number: score for number, score in get_naive_scores(self.documents, query).items()
+                    if number in candidates
+                }
+                for numpy_module in {search.np, None}:
+                    with self.subTest(numpy=numpy_module is not None, candidates=candidates_count, query=query), \
+                            mock.patch.object(search, 'np', numpy_module):
+                        self.assert_results(self.search_index.search(query, 10, candidates), scores, 10)
+
+    def test_search_with_filter(self):
+        data_filter = {'departure': 'kazan', 'nights__gte': 7}
+        filtered_ids = set(get_filtered_ids(self.tours, data_filter))
+        page = self.controller.search('пляж у моря', data_filter, limit=500)
+        scores = get_naive_scores(self.documents, 'пляж у моря')
+        expected_ids = [
+            self.tours[number].id
+            for number, _ in sorted(scores.items(), key=lambda number_score: (-number_score[1], number_score[0]))
+            if self.tours[number].id in filtered_ids
+        ]
+        self.assertEqual([tour.id for tour in page.items], expected_ids)
+        self.assertEqual(len(page.scores), len(page.items))
+
+    def test_complete(self):
+        words = self.controller.complete('деревянный отель у мо')
+        self.assertEqual(words, ['море'])
+        self.assertEqual(self.controller.complete('с'), sorted(
+            (word for word in self.search_index.word_counts if word.startswith('с')),
+            key=lambda word: (-self.search_index.word_counts[word], word)
+        )[:10])
+        self.assertEqual(self.controller.complete(''), [])
+
+    def test_search_api(self):
+        response = self.client.get('/api/search?q=отель&limit=3')
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content)
+        self.assertEqual(len(content['items']), len(content['scores']))
+        self.assertLessEqual(len(content['items']), 3)
+        self.assertEqual(content['scores'], sorted(content['scores'], reverse=True))
+
+
+class FacetsTest(SimpleTestCase):
+    """
+    Facet counts by postings, intersections, bitmaps and pass over tours are equal to counts of filtered tours.
+    """
+    FACETS = ('departure', 'country', 'stars', 'nights')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        dict_tours = generate_tours(CATALOG_SIZE)
+        cls.controllers = [controller_type(dict_tours) for controller_type in (TourController, BitmapTourController)]
+        cls.tours = cls.controllers[0].get()
+
+    def test_counts_match_naive_counts(self):
+        for data_filter in (None, *FILTERS, *RANGE_FILTERS):
+            filtered_ids = set(get_filtered_ids(self.tours, data_filter)) if data_filter else None
+            tours = [tour for tour in self.tours if filtered_ids is None or tour.id in filtered_ids]
+            for controller in self.controllers:
+                with self.subTest(controller=type(controller).__name__, filter=data_filter):
+                    facets = controller.get_facets(data_filter)
+                    self.assertEqual(tuple(facets), self.FACETS)
+                    for facet, counts in facets.items():
+                        self.assertEqual(counts, dict(Counter(getattr(tour, facet) for tour in tours)))
+                        self.assertEqual(list(counts.values()), sorted(counts.values(), reverse=True))
+
+    def test_selected_facets(self):
+        facets = self.controllers[0].get_facets({'departure': 'msk'}, ['stars', 'country'])
+        self.assertEqual(tuple(facets), ('stars', 'country'))
+        with self.assertRaises(UnknownFacetError):
+            self.controllers[0].get_facets(None, ['price'])
+
+    def test_cache_is_reset_by_reload(self):
+        controller = TourController(generate_tours(100))
+        counts = controller.get_facets({'departure': 'msk'})
+        self.assertIs(controller.get_facets({'departure': 'msk'}), counts)
+        controller.reload(DictSource(generate_tours(100, seed=1)))
+        self.assertEqual(controller.get_facets({'departure': 'msk'})['departure'], {
+            'msk': len(get_filtered_ids(controller.get(), {'departure': 'msk'}))
+        })
+
+    def test_facets_api(self):
+        response = self.client.get('/api/facets?departure=msk&facet=country&facet=stars')
+        self.assertEqual(response.status_code, 200)
+        facets = json.loads(response.content)['facets']
+        self.assertEqual(list(facets), ['country', 'stars'])
+        self.assertEqual(sum(facets['country'].values()), len(get_tours_data({'departure': 'msk'})))
+        self.assertEqual(self.client.get('/api/facets?facet=price').status_code, 400)
+
+
+def get_random_rows(generator: random.Random, size: int) -> set:
+    """
+    The function returns random rows from 0 to size: empty, sparse, dense or rows of the last part.
+    :param generator: random generator
+    :param size: count of rows
+    :return:
+    """
+    density = generator.choice((0.0, 0.01, 0.5, 0.99))
+    start = generator.choice((0, size // 2, size - 3))
+    return {row for row in range(start, size) if generator.random() < density}
+
+
+class BitmapTest(SimpleTestCase):
+    """
+    Bitmaps and bitmap indexes return the same rows as sets, bitmap controller keeps the same postings as memory
+    controller.
+    """
+    SIZE = 1000
+
+    def test_operations(self):
+        generator = random.Random(5)
+        for _ in range(100):
+            first_rows, second_rows = get_random_rows(generator, self.SIZE), get_random_rows(generator, self.SIZE)
+            first = bitmap.Bitmap.construct_from_rows(first_rows)
+            second = bitmap.Bitmap.construct_from_rows(iter(second_rows))
+            with self.subTest(first=len(first_rows), second=len(second_rows)):
+                self.assertEqual(len(first), len(first_rows))
+                self.assertEqual(bool(first), bool(first_rows))
+                self.assertEqual(list(first), sorted(first_rows))
+                self.assertEqual(set(first & second), first_rows & second_rows)
+                self.assertEqual(set(first | second), first_rows | second_rows)
+                self.assertEqual(set(first - second), first_rows - second_rows)
+                self.assertEqual(set(first.complement(self.SIZE)), set(range(self.SIZE)) - first_rows)
+                for row in (0, 7, 8, self.SIZE - 1, self.SIZE):
+                    self.assertEqual(row in first, row in first_rows)
+
+    def test_rows_without_numpy(self):
+        generator = random.Random(6)
+        for _ in range(20):
+            rows = get_random_rows(generator, self.SIZE)
+            current_bitmap = bitmap.Bitmap.construct_from_rows(rows)
+            with self.subTest(rows=len(rows)), mock.patch.object(bitmap, 'np', None):
+                self.assertEqual(current_bitmap.get_rows(), sorted(rows))
+
+    def test_construct(self):
+        self.assertEqual(bitmap.Bitmap.construct_from_rows([]), bitmap.EMPTY_BITMAP)
+        self.assertEqual(bitmap.Bitmap.construct_from_rows(iter(())).get_rows(), [])
+        self.assertEqual(bitmap.Bitmap.construct_from_rows(range(3, 10)).get_rows(), list(range(3, 10)))
+        self.assertEqual(bitmap.Bitmap.construct_from_rows([100003, 100001]).get_rows(), [100001, 100003])
+        self.assertEqual(bitmap.Bitmap.construct_from_rows([100001]).get_size_in_bytes(), 12501)
+        self.assertEqual(bitmap.Bitmap.construct_full(self.SIZE).get_rows(), list(range(self.SIZE)))
+        self.assertEqual(bitmap.Bitmap.construct_full(0), bitmap.EMPTY_BITMAP)
+
+    def test_index(self):
+        keys = [f'tour-{row}' for row in range(10)]
+        index = bitmap.BitmapIndex(keys)
+        index.add('msk', bitmap.Bitmap.construct_from_rows([0, 2]))
+        index.add('spb', bitmap.Bitmap.construct_from_rows([1]))
+        index.add('msk', bitmap.Bitmap.construct_from_rows([8, 9]))
+        self.assertEqual(dict(index), {'msk': {'tour-0', 'tour-2', 'tour-8', 'tour-9'}, 'spb': {'tour-1'}})
+        self.assertEqual(index.get_count('msk'), 4)
+        self.assertEqual(index.get_count('ekb'), 0)
+        self.assertIs(index.get_bitmap('ekb'), bitmap.EMPTY_BITMAP)
+        self.assertNotIn('ekb', index)
+        with self.assertRaises(KeyError):
+            index['ekb']
+
+    def test_controller_indexes(self):
+        dict_tours = generate_tours(CATALOG_SIZE)
+        expected = TourController(dict_tours)._generation.indexes
+        chunked_controller = BitmapTourController()
+        chunked_controller.load(DictSource(dict_tours), chunk_size=300, background=False)
+        for controller in (BitmapTourController(dict_tours), chunked_controller):
+            indexes = controller._generation.indexes
+            self.assertEqual(set(indexes), set(expected))
+            for attr_name, index in indexes.items():
+                with self.subTest(attr_name=attr_name):
+                    self.assertIsInstance(index, bitmap.BitmapIndex)
+                    self.assertEqual(dict(index), expected[attr_name])
+                    for value, ids in expected[attr_name].items():
+                        self.assertEqual(index.get_count(value), len(ids))
+
+
+class AsyncViewsTest(SimpleTestCase):
+    """
+    Async views render templates and cards in thread pool, not in thread of event loop.
+    """
+    def setUp(self):
+        self.render_threads = []
+        for patcher in (
+                mock.patch.dict(page_cache.PAGE_CACHE_SETTINGS, {'ENABLED': False}),
+                mock.patch('tours.views.render', side_effect=self.get_recorder(views.render)),
+                mock.patch('tours.views.render_to_string', side_effect=self.get_recorder(views.render_to_string)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_recorder(self, function):
+        def recorder(*args, **kwargs):
+            self.render_threads.append(threading.current_thread())
+            return function(*args, **kwargs)
+        return recorder
+
+    async def get_page(self, path: str, status: int = 200) -> str:
+        response = await self.async_client.get(path)
+        self.assertEqual(response.status_code, status)
+        self.assertTrue(self.render_threads)
+        self.assertNotIn(threading.current_thread(), self.render_threads)
+        return b''.join(response.streaming_content if response.streaming else [response.content]).decode()
+
+    async def test_main_view(self):
+        self.assertIn('</html>', await self.get_page('/'))
+
+    async def test_departure_view(self):
+        tours = get_tours_data({'departure': 'msk'})
+        content = await self.get_page('/departure/msk?sort=-price')
+        self.assertIn(escape(max(tours, key=lambda tour: tour.price).title), content)
+        self.assertIn('</html>', content)
+        await self.get_page('/departure/unknown', status=404)
+
+    async def test_tour_view(self):
+        tour = get_tours_data()[0]
+        self.assertIn(escape(tour.title), await self.get_page(f'/tour/{tour.id}'))
+        await self.get_page('/tour/1000000000', status=404)
+
+
+class PageCacheTest(SimpleTestCase):
+    """
+    Pages are cached by URL and catalog generations, evicted by count and size and validated by ETag.
+    """
+    def setUp(self):
+        self.controller = TourController(generate_tours(100))
+        self.calls = []
+        for patcher in (
+                mock.patch('tours.page_cache.PAGE_CACHE', PageCache(max_size=1024, max_entries=10)),
+                mock.patch('tours.services.api.TOUR_CONTROLLER', self.controller),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_response(self, view, path: str = '/page', **headers):
+        return view(RequestFactory().get(path, **headers))
+
+    def test_eviction(self):
+        cache = PageCache(max_size=10, max_entries=3)
+        for key in 'abc':
+            cache.set(key, CachedPage(b'123', 'text/html'))
+        self.assertIsNotNone(cache.get('a'))
+        cache.set('d', CachedPage(b'1', 'text/html'))
+        self.assertEqual(list(cache._pages), ['c', 'a', 'd'])
+        cache.set('e', CachedPage(b'12345', 'text/html'))
+        self.assertEqual(list(cache._pages), ['a', 'd', 'e'])
+        self.assertEqual(cache.size, 9)
+        cache.set('d', CachedPage(b'123', 'text/html'))
+        self.assertEqual(list(cache._pages), ['e', 'd'])
+        self.assertEqual(cache.size, 8)
+        cache.set('f', CachedPage(b'12345678901', 'text/html'))
+        self.assertIsNone(cache.get('f'))
+        cache.set_version(1)
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+    def test_not_modified(self):
+        @catalog_page_cache()
+        def view(request):
+            self.calls.append(request)
+            return HttpResponse(b'page')
+
+        etag = self.get_response(view)['ETag']
+        for if_none_match, status in (
+                (etag, 304), (f'W/{etag}', 304), (f'"other", {etag}', 304), ('*', 304), ('"other"', 200),
+                ('W/"other"', 200),
+        ):
+            with self.subTest(if_none_match=if_none_match):
+                response = self.get_response(view, HTTP_IF_NONE_MATCH=if_none_match)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_reload_invalidates_pages(self):
+        @catalog_page_cache()
+        def view(request):
+            self.calls.append(request)
+            return HttpResponse(str(len(self.calls)))
+
+        self.assertEqual(self.get_response(view).content, b'1')
+        self.assertEqual(self.get_response(view).content, b'1')
+        self.assertEqual(self.get_response(view, '/page?sort=price').content, b'2')
+        self.controller.reload(DictSource(generate_tours(100, seed=1)))
+        self.assertEqual(self.get_response(view).content, b'3')
+        self.assertEqual(self.get_response(view).content, b'3')
+
+    def test_streamed_response_is_cached_after_consuming(self):
+        @catalog_page_cache()
+        def view(request):
+            self.calls.append(request)
+            return StreamingHttpResponse(iter(['head', 'cards', 'tail']))
+
+        response = self.get_response(view)
+        self.assertTrue(response.streaming)
+        self.assertTrue(self.get_response(view).streaming)
+        self.assertEqual(b''.join(response.streaming_content), b'headcardstail')
+        response = self.get_response(view)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content, b'headcardstail')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_errors_are_not_cached(self):
+        @catalog_page_cache()
+        def view(request):
+            self.calls.append(request)
+            return HttpResponse(status=404)
+
+        self.assertEqual(self.get_response(view).status_code, 404)
+        self.assertEqual(self.get_response(view).status_code, 404)
+        self.assertEqual(len(self.calls), 2)
+
+
+def spin(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def get_sample_count(stacks: str) -> int:
+    return sum(int(line.rsplit(' ', 1)[1]) for line in stacks.splitlines())
+
+
+class InstrumentationTest(SimpleTestCase):
+    """
+    Histograms, metrics endpoint, timings of requests and profiler.
+    """
+    METRIC_LINE = re.compile(r'^[a-z_]+\{([a-z_]+="[^"]*",?)*\} [0-9.e+-]+$')
+
+    def test_histogram_buckets(self):
+        histogram = Histogram((1, 5, 10))
+        for value in (0.5, 1, 3, 10, 11):
+            histogram.observe(value)
+        self.assertEqual(histogram.get_cumulative_counts(), [('1', 2), ('5', 3), ('10', 4), ('+Inf', 5)])
+        self.assertEqual((histogram.sum, histogram.count), (25.5, 5))
+
+    def test_render(self):
+        registry = MetricsRegistry()
+        registry.register('test_seconds', 'Duration.', (0.5, 1.0))
+        registry.observe('test_seconds', 0.25, view='a"b')
+        registry.observe('test_seconds', 2, view='a"b')
+        self.assertEqual(registry.render(), '\n'.join((
+            '# HELP test_seconds Duration.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{view="a\\"b",le="0.5"} 1',
+            'test_seconds_bucket{view="a\\"b",le="1.0"} 1',
+            'test_seconds_bucket{view="a\\"b",le="+Inf"} 2',
+            'test_seconds_sum{view="a\\"b"} 2.25',
+            'test_seconds_count{view="a\\"b"} 2',
+        )) + '\n')
+
+    def test_metrics_endpoint(self):
+        self.assertIn('Server-Timing', self.client.get('/api/tours?departure=msk'))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        self.assertIn('# TYPE tours_request_seconds histogram', lines)
+        self.assertTrue(any(line.startswith('tours_request_seconds_count{view="tours_api"}') for line in lines))
+        for line in lines:
+            if not line.startswith('#'):
+                with self.subTest(line=line):
+                    self.assertRegex(line, self.METRIC_LINE)
+
+    def test_metrics_are_restricted(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='::1').status_code, 200)
+        with mock.patch('tours.api_views.METRICS_ENABLED', False):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_stage(self):
+        with stage('test_stage') as current_stage:
+            current_stage.returned = 3
+        self.assertIn('tours_stage_returned_items_count{stage="test_stage"} 1', REGISTRY.render())
+
+    def test_profiler(self):
+        with SamplingProfiler(0.001, str(Path(__file__).parent), threading.get_ident()) as profiler:
+            spin(0.05)
+        stacks = profiler.get_folded_stacks()
+        self.assertIn('spin (', stacks)
+        self.assertEqual(get_sample_count(stacks), sum(profiler.samples.values()))
+        self.assertGreater(get_sample_count(stacks), 0)
+
+    def test_profiled_requests(self):
+        self.assertEqual(self.client.get('/api/tours', HTTP_X_TOURS_PROFILE='1')['Content-Type'], 'application/json')
+        with mock.patch('tours.middleware.PROFILE_ENABLED', True):
+            for path in ('/api/tours?departure=msk', '/departure/msk'):
+                with self.subTest(path=path):
+                    response = self.client.get(path, HTTP_X_TOURS_PROFILE='1')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertTrue(response['Content-Type'].startswith('text/plain'))
+                    self.assertEqual(response['X-Tours-Profile-Status'], '200')
+                    self.assertEqual(
+                        int(response['X-Tours-Profile-Samples']), get_sample_count(response.content.decode())
+                    )
+
+
+class SnapshotTest(SimpleTestCase):
+    """
+    Tours are read back from catalog snapshot by views of records.
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'catalog.snapshot'
+        self.controller = TourController(generate_tours(300))
+        self.controller.save_snapshot(self.path, generate_departures())
+
+    def test_tour_views(self):
+        snapshot = CatalogSnapshot(self.path)
+        controller = SnapshotTourController(snapshot)
+        self.assertEqual(snapshot.departures, generate_departures())
+        tours = controller.get()
+        self.assertEqual(len(tours), 300)
+        for view, tour in zip(tours, self.controller.get()):
+            self.assertIsInstance(view, TourView)
+            self.assertEqual(tuple(getattr(view, field_name) for field_name in TOUR_FIELDS), get_values([tour])[0])
+            self.assertEqual(type(view.price), type(tour.price))
+            self.assertEqual(view.materialize(), tour)
+            self.assertEqual(view.as_dict(), tour.as_dict())
+        self.assertEqual(controller.find(7), tours[6])
+        self.assertEqual(len({*tours, *controller.get_many([1, 2])}), 300)
+        self.assertIsNone(controller.find(301))
+
+    def test_snapshot_is_read_only(self):
+        controller = SnapshotTourController(CatalogSnapshot(self.path))
+        with self.assertRaises(ReadOnlyCatalogError):
+            controller.reload(DictSource(generate_tours(10)))
+        self.assertEqual(len(controller.get()), 300)
+        self.assertEqual(controller.load_snapshot(CatalogSnapshot(self.path)), controller.generation)
+
+    def test_wrong_file(self):
+        self.path.write_bytes(b'not a snapshot' * 10)
+        with self.assertRaises(SnapshotFormatError):
+            CatalogSnapshot(self.path)
+
+
+class DataModelsTest(SimpleTestCase):
+    """
+    Data models are constructed from catalog records by bulk constructors.
+    """
+    def test_invalid_records(self):
+        records = generate_tours(5)
+        del records[2]['price']
+        records[3]['nights'] = '7'
+        records[4]['stars'] = 5
+        del records[5]['country']
+        del records[5]['date']
+        with self.assertRaises(CatalogValidationError) as context:
+            Tour.construct_many(records.items())
+        self.assertEqual(context.exception.errors, [
+            'Tour 2: missing field "price"',
+            'Tour 3: wrong value type for field "nights": str',
+            'Tour 4: wrong value type for field "stars": int',
+            'Tour 5: missing field "country"',
+            'Tour 5: missing field "date"',
+        ])
+        self.assertIn('5 invalid records', str(context.exception))
+        with self.assertRaises(CatalogValidationError):
+            TourController(records)
+        self.assertEqual(len(Tour.construct_many(generate_tours(5).items())), 5)
+
+    def test_interned_fields(self):
+        def copy(value: str) -> str:
+            # Equal string, which is not the same object
+            return ''.join(list(value))
+
+        records = generate_tours(2)
+        for record in records.values():
+            record.update({
+                'departure': copy('msk'), 'stars': copy('5'), 'country': copy('Куба'), 'date': copy('1 марта'),
+                'title': copy('Отель'),
+            })
+        self.assertIsNot(records[1]['departure'], records[2]['departure'])
+        first, second = Tour.construct_many(records.items()).values()
+        for field_name in Tour.interned_fields:
+            with self.subTest(field=field_name):
+                self.assertIs(getattr(first, field_name), getattr(second, field_name))
+        self.assertIsNot(first.title, second.title)
+        first = Tour.construct_from_dict(dict(records[1], id=1))
+        self.assertIs(first.departure, second.departure)
+        departure, = Departure.construct_many([(copy('msk'), {'city_departure': 'Из Москвы'})]).values()
+        self.assertIs(departure.id, second.departure)
+        self.assertFalse(hasattr(second, '__dict__'))
+
+
+def write_catalog(directory: Path, name: str, dict_data: dict, field_names: tuple) -> tuple:
+    """
+    The function writes catalog to JSON lines and CSV files.
+    :param directory: directory of files
+    :param name: name of files without extension
+    :param dict_data: catalog in format of data.py, records are dicts or strings of field_names[1]
+    :param field_names: fields of records, the first field is id
+    :return: paths of JSON lines and CSV files
+    """
+    rows = [
+        dict(record, id=data_id) if isinstance(record, dict) else {field_names[0]: data_id, field_names[1]: record}
+        for data_id, record in dict_data.items()
+    ]
+    jsonl_path, csv_path = directory / f'{name}.jsonl', directory / f'{name}.csv'
+    with jsonl_path.open('w', encoding='utf-8') as file:
+        file.writelines(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+    with csv_path.open('w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, field_names)
+        writer.writeheader()
+        writer.writerows(rows)
+    return jsonl_path, csv_path
+
+
+class CatalogSourcesTest(SimpleTestCase):
+    """
+    Catalog from JSON lines and CSV files is the same as catalog from dict.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        cls.dict_tours = generate_tours(CATALOG_SIZE)
+        # Prices are int in data.py, fractional prices are float
+        cls.dict_tours[1]['price'] = 49999.5
+        cls.tour_paths = write_catalog(Path(directory.name), 'tours', cls.dict_tours, TOUR_FIELDS)
+        cls.departure_paths = write_catalog(
+            Path(directory.name), 'departures', generate_departures(), ('id', 'city_departure')
+        )
+        cls.expected = TourController()
+        cls.expected.load(DictSource(cls.dict_tours), background=False)
+
+    def get_controllers(self) -> list:
+        controllers = []
+        for path in self.tour_paths:
+            controller = TourController()
+            controller.load(get_catalog_source(path, dict()), chunk_size=300, background=False)
+            controllers.append(controller)
+        return controllers
+
+    def test_sources_of_files(self):
+        self.assertIsInstance(get_catalog_source(self.tour_paths[0], dict()), JsonlSource)
+        self.assertIsInstance(get_catalog_source(self.tour_paths[1], dict()), CsvSource)
+        self.assertIsInstance(get_catalog_source(None, self.dict_tours), DictSource)
+
+    def test_records(self):
+        expected = list(DictSource(self.dict_tours).iter_records())
+        for source in (JsonlSource(self.tour_paths[0]), CsvSource(self.tour_paths[1])):
+            with self.subTest(source=type(source).__name__):
+                records = list(source.iter_records())
+                self.assertEqual(records, expected)
+                self.assertEqual(
+                    [(type(data_id), *(type(record[name]) for name in ('price', 'nights', 'stars')))
+                     for data_id, record in records],
+                    [(type(data_id), *(type(record[name]) for name in ('price', 'nights', 'stars')))
+                     for data_id, record in expected]
+                )
+
+    def test_controllers(self):
+        for path, controller in zip(self.tour_paths, self.get_controllers()):
+            with self.subTest(path=path.name):
+                self.assertEqual(get_values(controller.get()), get_values(self.expected.get()))
+                self.assertEqual(
+                    [(type(tour.price), type(tour.nights), type(tour.stars)) for tour in controller.get()],
+                    [(type(tour.price), type(tour.nights), type(tour.stars)) for tour in self.expected.get()]
+                )
+                for data_filter in (*FILTERS, *RANGE_FILTERS):
+                    self.assertEqual(
+                        [tour.id for tour in controller.get(data_filter)],
+                        [tour.id for tour in self.expected.get(data_filter)]
+                    )
+                self.assertEqual(
+                    controller.get_json_fragments([1, 2, 3]), self.expected.get_json_fragments([1, 2, 3])
+                )
+
+    def test_departures(self):
+        for path in self.departure_paths:
+            controller = DepartureController()
+            controller.load(get_catalog_source(path, dict()), background=False)
+            with self.subTest(path=path.name):
+                self.assertEqual(
+                    {departure.id: departure.city_departure for departure in controller.get()}, generate_departures()
+                )
@@ -1,66 +1,175 @@
+import asyncio
+from math import ceil
+from typing import List
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 
+from .cards import get_cards
+from .navigation import get_navigation, aget_navigation
+from .page_cache import catalog_page_cache
 from .services.api import (
-    is_tour_exists, is_departure_exists, get_main_data,
-    get_tours_data, get_departures_data, get_min_max_attr_for_tours
+    afind_tour, afind_departure, aget_main_data, aget_tours_data, aget_tours_page, aget_min_max_attr_for_tours,
+    run_in_thread_pool
+)
+from .services.instrumentation import stage
+from .services.pagination import InvalidOrderingError
+
+DEPARTURE_PAGE_SIZE = getattr(settings, 'TOURS_DEPARTURE_PAGE_SIZE', 30)
+# Cards are rendered by chunks, every chunk is sent to client as soon as it is rendered
+STREAMING_CHUNK_SIZE = 10
+CARDS_PLACEHOLDER = mark_safe('<!-- STREAMED CARDS -->')
+SORT_OPTIONS = (
+    (None, 'По умолчанию'),
+    ('price', 'Сначала дешевые'),
+    ('-price', 'Сначала дорогие'),
+    ('nights', 'Меньше ночей'),
+    ('-nights', 'Больше ночей'),
+    ('-stars', 'Больше звезд'),
 )
 
 
-def main_view(request):
+@catalog_page_cache(variants=getattr(settings, 'TOURS_PAGE_CACHE', dict()).get('MAIN_PAGE_VARIANTS', 1))
+async def main_view(request):
+    navigation, main_info, tours = await asyncio.gather(
+        aget_navigation(), aget_main_data(), aget_tours_data({'random': 6})
+    )
     context = dict(
-        departures=get_departures_data(),
-        main_info=get_main_data(),
-        tours=get_tours_data({'random': 6})
+        navigation=navigation,
+        main_info=main_info,
+        cards=await run_in_thread_pool(get_cards)(tours)
     )
-    return render(request, 'tours/index.html', context=context)
+    return await run_in_thread_pool(render_page)(request, 'tours/index.html', context)
 
 
-def departure_view(request, departure: str):
-    if not is_departure_exists(departure):
-        return handler404_view(request)
-
-    departures = get_departures_data()
-    current_departure = get_departures_data({'id': departure})[-1]
-    tours = get_tours_data({'departure': departure})
-    min_max_attributes = get_min_max_attr_for_tours(tours, 'price', 'nights')
+@catalog_page_cache()
+async def departure_view(request, departure: str):
+    order_by = request.GET.get('sort') or None
+    tours_filter = {'departure': departure}
+    try:
+        page_number = int(request.GET.get('page', 1))
+        # Count and min, max are taken for all tours of departure by filter, not for tours on page
+        current_departure, navigation, page, min_max_attributes = await asyncio.gather(
+            afind_departure(departure),
+            aget_navigation(departure),
+            aget_tours_page(page_number, DEPARTURE_PAGE_SIZE, tours_filter, order_by),
+            aget_min_max_attr_for_tours([], 'price', 'nights', tours_filter=tours_filter),
+        )
+    except (ValueError, InvalidOrderingError):
+        return await ahandler404_view(request)
+    if current_departure is None:
+        return await ahandler404_view(request)
+    num_pages = max(ceil(page.count / DEPARTURE_PAGE_SIZE), 1)
+    if not 0 < page_number <= num_pages:
+        return await ahandler404_view(request)
 
     context = dict(
-        departures=departures,
+        navigation=navigation,
         city_departure=current_departure.city_departure,
-        count_tours=len(tours),
-        tours=tours,
-        min_max_attributes=min_max_attributes
+        count_tours=page.count,
+        min_max_attributes=min_max_attributes,
+        sort_links=[
+            dict(title=title, url=get_page_url(request.path, sort, 1), active=sort == order_by)
+            for sort, title in SORT_OPTIONS
+        ],
+        page_number=page_number,
+        num_pages=num_pages,
+        previous_url=get_page_url(request.path, order_by, page_number - 1) if page_number > 1 else None,
+        next_url=get_page_url(request.path, order_by, page_number + 1) if page.has_next else None,
     )
 
-    return render(request, 'tours/departure.html', context=context)
+    parts = await run_in_thread_pool(render_cards_page)(request, 'tours/departure.html', context, page.items)
+    return StreamingHttpResponse(parts)
 
 
-def tour_view(request, tour_id: int):
-    if not is_tour_exists(tour_id):
-        return handler404_view(request)
+@catalog_page_cache()
+async def tour_view(request, tour_id: int):
+    tour = await afind_tour(tour_id)
+    if tour is None:
+        return await ahandler404_view(request)
 
-    departures = get_departures_data()
-    tour = get_tours_data({'id': tour_id})[-1]
-    departure = get_departures_data({'id': tour.departure})[-1]
+    departure, navigation = await asyncio.gather(afind_departure(tour.departure), aget_navigation(tour.departure))
 
     context = dict(
-        departures=departures,
+        navigation=navigation,
         tour=tour,
         departure=departure
     )
 
-    return render(request, 'tours/tour.html', context=context)
+    return await run_in_thread_pool(render_page)(request, 'tours/tour.html', context)
+
+
+def get_page_url(path: str, order_by: str, page_number: int) -> str:
+    """
+    The function returns URL of page of listing.
+    :param path: path of listing
+    :param order_by: sorting of listing
+    :param page_number: page number
+    :return:
+    """
+    query = dict()
+    if order_by:
+        query['sort'] = order_by
+    if page_number > 1:
+        query['page'] = page_number
+    return f'{path}?{urlencode(query)}' if query else path
+
+
+def render_page(request, template_name: str, context: dict) -> HttpResponse:
+    """
+    The function renders page. Async views render pages in thread pool, so event loop is not blocked by templates.
+    :param request: request
+    :param template_name: template of page
+    :param context: context of page
+    :return:
+    """
+    with stage('render'):
+        return render(request, template_name, context=context)
+
+
+def render_cards_page(request, template_name: str, context: dict, tours: List['Tour']) -> List[str]:
+    """
+    The function renders page with tour cards by parts: page without cards, which is sent before cards,
+    cached cards, which are joined by chunks, and end of page. Parts are rendered at once (in thread pool
+    by async view), so response is streamed by event loop without rendering.
+    :param request: request
+    :param template_name: template of page, which has cards placeholder
+    :param context: context of page
+    :param tours: tours for cards
+    :return:
+    """
+    with stage('render'):
+        page = render_to_string(template_name, context=dict(context, cards=CARDS_PLACEHOLDER), request=request)
+    head, tail = page.split(CARDS_PLACEHOLDER, 1)
+    parts = [head]
+    with stage('render_cards'):
+        for start in range(0, len(tours), STREAMING_CHUNK_SIZE):
+            parts.append(get_cards(tours[start:start + STREAMING_CHUNK_SIZE]))
+    parts.append(tail)
+    return parts
 
 
 def handler404_view(request, *args, **kwargs):
-    departures = get_departures_data()
-    response = render(
-        request,
-        'tours/404.html',
-        context={
-            'information': 'Страница не найдена :(',
-            'departures': departures
-        }
-    )
+    navigation = get_navigation()
+    with stage('render'):
+        response = render(
+            request,
+            'tours/404.html',
+            context={
+                'information': 'Страница не найдена :(',
+                'navigation': navigation
+            }
+        )
     response.status_code = 404
     return response
+
+
+async def ahandler404_view(request, *args, **kwargs):
+    """
+    Async version of handler404_view for async views.
+    """
+    return await run_in_thread_pool(handler404_view)(request, *args, **kwargs)